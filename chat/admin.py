@@ -1,9 +1,31 @@
+from django import forms
 from django.contrib import admin
-from .models import Conversa, Mensagem
+from .busca import fts_disponivel, ids_correspondentes
+from .models import CaixaEntrada, Conversa, Mensagem
+
+
+class ConversaAdminForm(forms.ModelForm):
+    class Meta:
+        model = Conversa
+        fields = "__all__"
+
+    def clean(self):
+        dados = super().clean()
+        participantes = dados.get("participantes")
+        if participantes is not None and len(participantes) == 2:
+            # Mesmo par de outra conversa: a restrição única recusaria o par canônico
+            menor_id, maior_id = sorted(p.pk for p in participantes)
+            existente = Conversa.objects.filter(
+                usuario_menor_id=menor_id, usuario_maior_id=maior_id
+            ).exclude(pk=self.instance.pk)
+            if existente.exists():
+                raise forms.ValidationError("Já existe uma conversa entre esses dois usuários.")
+        return dados
 
 
 @admin.register(Conversa)
 class ConversaAdmin(admin.ModelAdmin):
+    form = ConversaAdminForm
     list_display = [
         "id",
         "get_participantes",
@@ -15,7 +37,7 @@ class ConversaAdmin(admin.ModelAdmin):
     search_fields = ["participantes__username", "participantes__email"]
     date_hierarchy = "data_criacao"
     filter_horizontal = ["participantes"]
-    readonly_fields = ["data_criacao", "ultima_atualizacao"]
+    readonly_fields = ["data_criacao", "ultima_atualizacao", "usuario_menor", "usuario_maior"]
 
     def get_participantes(self, obj):
         return ", ".join([p.username for p in obj.participantes.all()])
@@ -31,15 +53,48 @@ class MensagemAdmin(admin.ModelAdmin):
         "remetente",
         "conteudo_resumido",
         "data_envio",
-        "lida",
     ]
-    list_filter = ["lida", "data_envio"]
+    list_filter = ["data_envio"]
     search_fields = ["remetente__username", "conteudo"]
     date_hierarchy = "data_envio"
     readonly_fields = ["data_envio"]
     list_select_related = ["conversa", "remetente"]
 
+    def get_search_results(self, request, queryset, search_term):
+        # Conteúdo buscado pelo índice FTS5 em vez de icontains (varredura completa)
+        if not search_term or not fts_disponivel():
+            return super().get_search_results(request, queryset, search_term)
+        por_texto = queryset.filter(id__in=ids_correspondentes(search_term))
+        por_remetente = queryset.filter(remetente__username__icontains=search_term)
+        return por_texto | por_remetente, False
+
     def conteudo_resumido(self, obj):
         return obj.conteudo[:50] + "..." if len(obj.conteudo) > 50 else obj.conteudo
 
     conteudo_resumido.short_description = "Conteúdo"
+
+
+@admin.register(CaixaEntrada)
+class CaixaEntradaAdmin(admin.ModelAdmin):
+    list_display = [
+        "usuario",
+        "conversa",
+        "outra_parte",
+        "trecho",
+        "nao_lidas",
+        "ultima_lida",
+        "data_atividade",
+    ]
+    search_fields = ["usuario__username", "outra_parte__username"]
+    readonly_fields = [
+        "usuario",
+        "conversa",
+        "outra_parte",
+        "ultima_mensagem",
+        "trecho",
+        "ultima_e_minha",
+        "data_atividade",
+        "ultima_lida",
+        "nao_lidas",
+    ]
+    list_select_related = ["usuario", "conversa", "outra_parte"]
@@ -5,3 +5,6 @@ class ChatConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "chat"
     verbose_name = "Chat e Mensagens"
+
+    def ready(self):
+        import chat.signals
@@ -0,0 +1,60 @@
+"""
+Broker publish/subscribe em memória para entrega de mensagens do chat.
+
+Cada requisição de long-poll assina uma conversa e aguarda um aviso de que
+há mensagens novas. O aviso não carrega a mensagem: quem acorda consulta o
+banco, que continua sendo a fonte da verdade.
+
+O broker vive no processo. Em implantações com vários processos, um assinante
+só é acordado por mensagens gravadas no mesmo processo; nos demais casos a
+espera termina pelo timeout e o cliente continua coberto pelo polling.
+"""
+
+import asyncio
+import threading
+from collections import defaultdict
+
+
+class BrokerMensagens:
+    """Registro de assinantes por conversa, seguro entre threads e event loops"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._assinantes = defaultdict(set)
+
+    def assinar(self, conversa_id):
+        """Registra um assinante no event loop atual e retorna seu evento"""
+        evento = asyncio.Event()
+        assinatura = (asyncio.get_running_loop(), evento)
+        with self._lock:
+            self._assinantes[conversa_id].add(assinatura)
+        return assinatura
+
+    def cancelar(self, conversa_id, assinatura):
+        with self._lock:
+            assinantes = self._assinantes.get(conversa_id)
+            if assinantes is None:
+                return
+            assinantes.discard(assinatura)
+            if not assinantes:
+                del self._assinantes[conversa_id]
+
+    def publicar(self, conversa_id):
+        """Acorda todos os assinantes da conversa (pode ser chamado de qualquer thread)"""
+        with self._lock:
+            assinantes = list(self._assinantes.get(conversa_id, ()))
+        for loop, evento in assinantes:
+            try:
+                loop.call_soon_threadsafe(evento.set)
+            except RuntimeError:
+                # Event loop já encerrado: a assinatura será removida pelo dono
+                pass
+
+    def total_assinantes(self, conversa_id=None):
+        with self._lock:
+            if conversa_id is not None:
+                return len(self._assinantes.get(conversa_id, ()))
+            return sum(len(a) for a in self._assinantes.values())
+
+
+broker = BrokerMensagens()
@@ -0,0 +1,202 @@
+"""
+Busca textual nas mensagens do chat.
+
+No SQLite usa uma tabela virtual FTS5 (chat_mensagem_fts) com conteúdo externo
+apontando para chat_mensagem. Triggers mantêm o índice sincronizado em
+inserções, edições e exclusões, inclusive as feitas por bulk_create e
+QuerySet.delete. O tokenizador unicode61 com remove_diacritics ignora acentos
+e maiúsculas ("tratôr" encontra "TRATOR"); cada termo é buscado por prefixo
+("trator" encontra "tratores"), já que o FTS5 não traz stemmer em português.
+
+Em outros bancos a busca cai para icontains, sem ranking.
+"""
+
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+
+TABELA_FTS = "chat_mensagem_fts"
+
+# Marcadores de destaque devolvidos pelo snippet(); trocados por <mark> após escapar o HTML
+_INICIO_DESTAQUE = "\x02"
+_FIM_DESTAQUE = "\x03"
+
+_SQL_CRIACAO = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA_FTS} USING fts5(
+        conteudo,
+        content='chat_mensagem',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_ai AFTER INSERT ON chat_mensagem BEGIN
+        INSERT INTO {TABELA_FTS}(rowid, conteudo) VALUES (new.id, new.conteudo);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_ad AFTER DELETE ON chat_mensagem BEGIN
+        INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, conteudo)
+        VALUES ('delete', old.id, old.conteudo);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_au AFTER UPDATE OF conteudo ON chat_mensagem BEGIN
+        INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, conteudo)
+        VALUES ('delete', old.id, old.conteudo);
+        INSERT INTO {TABELA_FTS}(rowid, conteudo) VALUES (new.id, new.conteudo);
+    END
+    """,
+]
+
+_SQL_REMOCAO = [
+    f"DROP TRIGGER IF EXISTS {TABELA_FTS}_ai",
+    f"DROP TRIGGER IF EXISTS {TABELA_FTS}_ad",
+    f"DROP TRIGGER IF EXISTS {TABELA_FTS}_au",
+    f"DROP TABLE IF EXISTS {TABELA_FTS}",
+]
+
+
+def fts_disponivel(conexao=None):
+    return (conexao or connection).vendor == "sqlite"
+
+
+def criar_indice_busca(conexao=None):
+    """Cria a tabela FTS5 e os triggers, se ainda não existirem (idempotente)
+
+    As alterações de schema do Django no SQLite recriam a tabela chat_mensagem
+    e descartam seus triggers; por isso isto também roda no post_migrate.
+    """
+    conexao = conexao or connection
+    if not fts_disponivel(conexao):
+        return False
+    with conexao.cursor() as cursor:
+        for sql in _SQL_CRIACAO:
+            cursor.execute(sql)
+    return True
+
+
+def remover_indice_busca(conexao=None):
+    conexao = conexao or connection
+    if not fts_disponivel(conexao):
+        return
+    with conexao.cursor() as cursor:
+        for sql in _SQL_REMOCAO:
+            cursor.execute(sql)
+
+
+def reconstruir_indice_busca(conexao=None):
+    """Reindexa todas as mensagens existentes"""
+    conexao = conexao or connection
+    if not criar_indice_busca(conexao):
+        return False
+    with conexao.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABELA_FTS}({TABELA_FTS}) VALUES ('rebuild')")
+    return True
+
+
+def montar_consulta_fts(termo):
+    """Converte o texto digitado em uma consulta FTS5: todos os termos, por prefixo"""
+    palavras = re.findall(r"\w+", termo or "")
+    return " ".join(f'"{palavra}"*' for palavra in palavras)
+
+
+def ids_correspondentes(termo):
+    """Subconsulta com os ids das mensagens que casam com o termo (para filter(id__in=...))"""
+    return RawSQL(
+        f"SELECT rowid FROM {TABELA_FTS} WHERE {TABELA_FTS} MATCH %s",
+        [montar_consulta_fts(termo)],
+    )
+
+
+def _destacar(trecho):
+    return (
+        escape(trecho)
+        .replace(_INICIO_DESTAQUE, "<mark>")
+        .replace(_FIM_DESTAQUE, "</mark>")
+    )
+
+
+def buscar_mensagens(usuario, termo, limite=50):
+    """Busca nas conversas do usuário; retorna dicts ordenados por relevância
+
+    Cada resultado traz o trecho com os termos destacados em <mark> (HTML já
+    escapado), o remetente e a outra parte da conversa.
+    """
+    consulta = montar_consulta_fts(termo)
+    if not consulta:
+        return []
+    if not fts_disponivel():
+        return _buscar_mensagens_sem_fts(usuario, termo, limite)
+
+    sql = f"""
+        SELECT m.id, m.conversa_id, m.data_envio, m.remetente_id,
+               remetente.username, outra.username,
+               snippet({TABELA_FTS}, 0, %s, %s, '…', 16) AS trecho
+        FROM {TABELA_FTS}
+        JOIN chat_mensagem m ON m.id = {TABELA_FTS}.rowid
+        JOIN chat_caixaentrada caixa
+             ON caixa.conversa_id = m.conversa_id AND caixa.usuario_id = %s
+        JOIN core_user remetente ON remetente.id = m.remetente_id
+        LEFT JOIN core_user outra ON outra.id = caixa.outra_parte_id
+        WHERE {TABELA_FTS} MATCH %s
+        ORDER BY bm25({TABELA_FTS}), m.data_envio DESC
+        LIMIT %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            sql, [_INICIO_DESTAQUE, _FIM_DESTAQUE, usuario.id, consulta, limite]
+        )
+        linhas = cursor.fetchall()
+
+    converter_data = connection.ops.convert_datetimefield_value
+    return [
+        {
+            "id": mensagem_id,
+            "conversa_id": conversa_id,
+            "data_envio": converter_data(data_envio, None, connection),
+            "e_minha": remetente_id == usuario.id,
+            "remetente": remetente,
+            "outra_parte": outra_parte,
+            "trecho": _destacar(trecho),
+        }
+        for (
+            mensagem_id,
+            conversa_id,
+            data_envio,
+            remetente_id,
+            remetente,
+            outra_parte,
+            trecho,
+        ) in linhas
+    ]
+
+
+def _buscar_mensagens_sem_fts(usuario, termo, limite):
+    from .models import Mensagem
+
+    mensagens = (
+        Mensagem.objects.filter(
+            conversa__caixas_entrada__usuario=usuario, conteudo__icontains=termo
+        )
+        .select_related("remetente")
+        .order_by("-data_envio")[:limite]
+    )
+    destaque = re.compile(re.escape(escape(termo)), re.IGNORECASE)
+    return [
+        {
+            "id": mensagem.id,
+            "conversa_id": mensagem.conversa_id,
+            "data_envio": mensagem.data_envio,
+            "e_minha": mensagem.remetente_id == usuario.id,
+            "remetente": mensagem.remetente.username,
+            "outra_parte": None,
+            "trecho": destaque.sub(
+                lambda m: f"<mark>{m.group(0)}</mark>", escape(mensagem.conteudo)
+            ),
+        }
+        for mensagem in mensagens
+    ]
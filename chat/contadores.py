@@ -0,0 +1,52 @@
+"""
+Total de mensagens não lidas por usuário, para o badge da navbar.
+
+O valor fica no cache do Django em chat:nao_lidas:<id do usuário>. Envio e
+leitura ajustam a chave com incr/decr depois do commit; se ela não existe, o
+ajuste é ignorado e a próxima leitura refaz o total com um Sum sobre
+CaixaEntrada. Com vários processos o cache precisa ser compartilhado
+(Redis/Memcached); CHAT_NAO_LIDAS_TIMEOUT limita por quanto tempo um valor
+defasado pode sobreviver.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+
+
+def chave(usuario_id):
+    return f"chat:nao_lidas:{usuario_id}"
+
+
+def total_nao_lidas(usuario_id):
+    """Total em cache; numa falta, soma as linhas de CaixaEntrada do usuário"""
+    total = cache.get(chave(usuario_id))
+    if total is None:
+        from .models import CaixaEntrada
+
+        total = (
+            CaixaEntrada.objects.filter(usuario_id=usuario_id).aggregate(
+                total=Sum("nao_lidas")
+            )["total"]
+            or 0
+        )
+        cache.set(chave(usuario_id), total, settings.CHAT_NAO_LIDAS_TIMEOUT)
+    return total
+
+
+def ajustar(deltas):
+    """Soma ``deltas`` ({usuario_id: variação}) aos totais que estão em cache"""
+    for usuario_id, delta in deltas.items():
+        if not delta:
+            continue
+        try:
+            total = cache.incr(chave(usuario_id), delta)
+        except ValueError:
+            # Fora do cache: será recalculado na próxima leitura
+            continue
+        if total < 0:
+            cache.delete(chave(usuario_id))
+
+
+def invalidar(usuarios_ids):
+    cache.delete_many([chave(usuario_id) for usuario_id in usuarios_ids])
@@ -0,0 +1,13 @@
+from .contadores import total_nao_lidas
+
+
+def mensagens_nao_lidas(request):
+    """Expõe chat_nao_lidas aos templates; só é calculado se o template usar"""
+
+    def chat_nao_lidas():
+        usuario = getattr(request, "user", None)
+        if usuario is None or not usuario.is_authenticated:
+            return 0
+        return total_nao_lidas(usuario.id)
+
+    return {"chat_nao_lidas": chat_nao_lidas}
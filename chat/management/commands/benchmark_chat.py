@@ -0,0 +1,386 @@
+import http.cookiejar
+import json
+import math
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.models import CaixaEntrada, Conversa, Mensagem
+
+User = get_user_model()
+
+PREFIXO = "bench_chat_"
+SENHA = "bench-chat-senha"
+ENDPOINTS = ("envio", "novas", "inbox")
+AVISO_SEM_CONSULTAS = (
+    "O servidor não enviou X-Consultas-BD: consultas ao banco não foram medidas. "
+    "Ative CONTAR_CONSULTAS_BD e sirva por WSGI (runserver); sob ASGI o "
+    "ContadorConsultasMiddleware não conta consultas."
+)
+
+
+class _SemRedirecionamento(urllib.request.HTTPRedirectHandler):
+    """Devolve o 302 ao chamador em vez de segui-lo (o tempo medido é só da requisição)"""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class ClienteHTTP:
+    """Sessão HTTP de um usuário: cookies, CSRF e ETags, como um navegador"""
+
+    def __init__(self, url_base, timeout):
+        self.url_base = url_base.rstrip("/")
+        self.timeout = timeout
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies), _SemRedirecionamento
+        )
+        self.etags = {}
+
+    def _cookie(self, nome):
+        for cookie in self.cookies:
+            if cookie.name == nome:
+                return cookie.value
+        return None
+
+    def requisitar(self, caminho, dados=None, condicional=False):
+        """Retorna (status, cabeçalhos, corpo)"""
+        url = self.url_base + caminho
+        cabecalhos = {}
+        corpo = None
+        if dados is not None:
+            dados = dict(dados, csrfmiddlewaretoken=self._cookie("csrftoken") or "")
+            corpo = urllib.parse.urlencode(dados).encode()
+            cabecalhos["Referer"] = url
+        elif condicional and caminho in self.etags:
+            cabecalhos["If-None-Match"] = self.etags[caminho]
+
+        requisicao = urllib.request.Request(url, data=corpo, headers=cabecalhos)
+        try:
+            with self.opener.open(requisicao, timeout=self.timeout) as resposta:
+                status, headers, conteudo = resposta.status, resposta.headers, resposta.read()
+        except urllib.error.HTTPError as erro:
+            status, headers, conteudo = erro.code, erro.headers, erro.read()
+
+        if condicional and status == 200 and headers.get("ETag"):
+            self.etags[caminho] = headers["ETag"]
+        return status, headers, conteudo
+
+    def login(self, username, senha):
+        self.requisitar("/login/")
+        status, _, _ = self.requisitar(
+            "/login/", {"username": username, "password": senha}
+        )
+        return status == 302 and self._cookie("sessionid") is not None
+
+
+class Command(BaseCommand):
+    help = (
+        "Teste de carga do chat: cria usuários e conversas em massa e simula "
+        "clientes concorrentes (envio, polling de novas/ e inbox) contra um "
+        "servidor em execução (sob WSGI e com CONTAR_CONSULTAS_BD = True para contar consultas). "
+        "Gera um relatório JSON com vazão, latências "
+        "p50/p95/p99 e consultas ao banco por endpoint (cabeçalho X-Consultas-BD)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000", help="Servidor a ser testado")
+        parser.add_argument("--usuarios", type=int, default=200)
+        parser.add_argument("--conversas", type=int, default=500)
+        parser.add_argument(
+            "--mensagens-iniciais", type=int, default=20, help="Mensagens criadas por conversa"
+        )
+        parser.add_argument("--clientes", type=int, default=20, help="Clientes simultâneos")
+        parser.add_argument("--duracao", type=float, default=30.0, help="Segundos de medição")
+        parser.add_argument(
+            "--pausa", type=float, default=0.0, help="Pausa de cada cliente entre ações (s)"
+        )
+        parser.add_argument(
+            "--mix",
+            default="envio=1,novas=8,inbox=1",
+            help="Peso de cada ação, ex.: envio=1,novas=8,inbox=1",
+        )
+        parser.add_argument("--timeout", type=float, default=30.0, help="Timeout HTTP (s)")
+        parser.add_argument("--seed", type=int, default=None, help="Semente do sorteio de ações")
+        parser.add_argument("--saida", help="Grava o relatório JSON neste arquivo")
+        parser.add_argument(
+            "--manter-dados", action="store_true", help="Não apaga os dados criados ao final"
+        )
+
+    def handle(self, *args, **options):
+        pesos = self.ler_mix(options["mix"])
+        conversas_por_usuario = self.semear(
+            options["usuarios"], options["conversas"], options["mensagens_iniciais"]
+        )
+        try:
+            relatorio = self.executar(conversas_por_usuario, pesos, options)
+        finally:
+            if not options["manter_dados"]:
+                self.limpar_dados()
+
+        if "aviso" in relatorio:
+            self.stderr.write(self.style.WARNING(relatorio["aviso"]))
+        saida = json.dumps(relatorio, indent=2, ensure_ascii=False)
+        if options["saida"]:
+            with open(options["saida"], "w", encoding="utf-8") as arquivo:
+                arquivo.write(saida + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Relatório gravado em {options['saida']}"))
+        else:
+            self.stdout.write(saida)
+
+    def ler_mix(self, texto):
+        pesos = {}
+        for item in texto.split(","):
+            nome, _, peso = item.partition("=")
+            nome = nome.strip()
+            if nome not in ENDPOINTS:
+                raise CommandError(f"Ação desconhecida em --mix: {nome!r}")
+            try:
+                pesos[nome] = float(peso)
+            except ValueError:
+                raise CommandError(f"Peso inválido em --mix: {item!r}")
+        if not any(pesos.values()):
+            raise CommandError("--mix precisa de ao menos um peso positivo")
+        return pesos
+
+    # --- Dados ---------------------------------------------------------------
+
+    def semear(self, quantidade_usuarios, quantidade_conversas, mensagens_iniciais):
+        """Cria usuários, conversas, caixas de entrada e mensagens com bulk_create"""
+        if quantidade_usuarios < 2:
+            raise CommandError("--usuarios precisa ser pelo menos 2")
+        maximo = quantidade_usuarios * (quantidade_usuarios - 1) // 2
+        if quantidade_conversas > maximo:
+            raise CommandError(f"Com {quantidade_usuarios} usuários cabem no máximo {maximo} conversas")
+
+        self.limpar_dados()
+        inicio = time.monotonic()
+        senha = make_password(SENHA)
+        usuarios = User.objects.bulk_create(
+            [
+                User(
+                    username=f"{PREFIXO}{i}",
+                    password=senha,
+                    role="contratante" if i % 2 == 0 else "trabalhador",
+                )
+                for i in range(quantidade_usuarios)
+            ],
+            batch_size=500,
+        )
+
+        pares = [
+            sorted((usuarios[a].pk, usuarios[b].pk))
+            for a, b in self.pares(quantidade_usuarios, quantidade_conversas)
+        ]
+        conversas = Conversa.objects.bulk_create(
+            [Conversa(usuario_menor_id=menor, usuario_maior_id=maior) for menor, maior in pares],
+            batch_size=500,
+        )
+
+        Participante = Conversa.participantes.through
+        participantes = []
+        caixas = []
+        conversas_por_usuario = defaultdict(list)
+        for conversa in conversas:
+            par = (conversa.usuario_menor_id, conversa.usuario_maior_id)
+            for usuario_id, outro_id in (par, par[::-1]):
+                participantes.append(Participante(conversa_id=conversa.pk, user_id=usuario_id))
+                caixas.append(
+                    CaixaEntrada(
+                        usuario_id=usuario_id,
+                        conversa_id=conversa.pk,
+                        outra_parte_id=outro_id,
+                        data_atividade=conversa.data_criacao,
+                    )
+                )
+                conversas_por_usuario[usuario_id].append(conversa.pk)
+        Participante.objects.bulk_create(participantes, batch_size=1000)
+        CaixaEntrada.objects.bulk_create(caixas, batch_size=1000)
+
+        Mensagem.objects.enviar_em_lote(
+            (
+                Mensagem(
+                    conversa_id=conversa.pk,
+                    remetente_id=conversa.usuario_menor_id if i % 2 == 0 else conversa.usuario_maior_id,
+                    conteudo=f"mensagem inicial {i}",
+                )
+                for conversa in conversas
+                for i in range(mensagens_iniciais)
+            ),
+            batch_size=1000,
+        )
+
+        self.stdout.write(
+            f"Dados criados em {time.monotonic() - inicio:.1f}s: {len(usuarios)} usuários, "
+            f"{len(conversas)} conversas, {len(conversas) * mensagens_iniciais} mensagens"
+        )
+        return {
+            usuario.username: conversas_por_usuario[usuario.pk]
+            for usuario in usuarios
+            if conversas_por_usuario[usuario.pk]
+        }
+
+    @staticmethod
+    def pares(quantidade_usuarios, quantidade_conversas):
+        """Pares distintos (i, j) espalhados entre todos os usuários"""
+        vistos = set()
+        for deslocamento in range(1, quantidade_usuarios):
+            for i in range(quantidade_usuarios):
+                par = tuple(sorted((i, (i + deslocamento) % quantidade_usuarios)))
+                if par in vistos:
+                    continue
+                vistos.add(par)
+                yield par
+                if len(vistos) == quantidade_conversas:
+                    return
+
+    def limpar_dados(self):
+        Conversa.objects.filter(usuario_menor__username__startswith=PREFIXO).delete()
+        User.objects.filter(username__startswith=PREFIXO).delete()
+
+    # --- Carga ---------------------------------------------------------------
+
+    def executar(self, conversas_por_usuario, pesos, options):
+        usernames = list(conversas_por_usuario)
+
+        def conectar(indice):
+            username = usernames[indice % len(usernames)]
+            cliente = ClienteHTTP(options["url"], options["timeout"])
+            if not cliente.login(username, SENHA):
+                raise CommandError(f"Falha no login de {username} em {options['url']}")
+            return cliente, conversas_por_usuario[username]
+
+        try:
+            with ThreadPoolExecutor(max_workers=options["clientes"]) as executor:
+                clientes = list(executor.map(conectar, range(options["clientes"])))
+        except OSError as erro:
+            raise CommandError(f"Servidor inacessível em {options['url']}: {erro}")
+
+        acoes = list(pesos)
+        pesos_acoes = [pesos[acao] for acao in acoes]
+        fim = time.monotonic() + options["duracao"]
+        semente = options["seed"]
+        amostras = []
+        trava = threading.Lock()
+
+        def simular(indice):
+            cliente, conversas = clientes[indice]
+            sorteio = random.Random(None if semente is None else semente + indice)
+            ultima_id = defaultdict(int)
+            locais = []
+            while time.monotonic() < fim:
+                acao = sorteio.choices(acoes, pesos_acoes)[0]
+                conversa_id = sorteio.choice(conversas)
+                inicio = time.perf_counter()
+                try:
+                    if acao == "envio":
+                        status, headers, _ = cliente.requisitar(
+                            f"/chat/{conversa_id}/", {"conteudo": f"bench {indice} {time.time()}"}
+                        )
+                        ok = status == 302
+                    elif acao == "novas":
+                        status, headers, corpo = cliente.requisitar(
+                            f"/chat/{conversa_id}/novas/?ultima_id={ultima_id[conversa_id]}",
+                            condicional=True,
+                        )
+                        ok = status in (200, 304)
+                        if status == 200:
+                            mensagens = json.loads(corpo)["mensagens"]
+                            if mensagens:
+                                ultima_id[conversa_id] = mensagens[-1]["id"]
+                    else:
+                        status, headers, _ = cliente.requisitar("/chat/", condicional=True)
+                        ok = status in (200, 304)
+                except OSError:
+                    status, headers, ok = None, {}, False
+                decorrido = time.perf_counter() - inicio
+
+                consultas = headers.get("X-Consultas-BD")
+                locais.append(
+                    (acao, decorrido, status, ok, int(consultas) if consultas is not None else None)
+                )
+                if options["pausa"]:
+                    time.sleep(options["pausa"])
+            with trava:
+                amostras.extend(locais)
+
+        inicio = time.monotonic()
+        with ThreadPoolExecutor(max_workers=len(clientes)) as executor:
+            list(executor.map(simular, range(len(clientes))))
+        decorrido = time.monotonic() - inicio
+
+        return self.montar_relatorio(amostras, decorrido, options)
+
+    # --- Relatório -----------------------------------------------------------
+
+    @staticmethod
+    def percentil(valores_ordenados, p):
+        """Percentil pelo método nearest-rank"""
+        if not valores_ordenados:
+            return None
+        posicao = max(0, math.ceil(p / 100 * len(valores_ordenados)) - 1)
+        return valores_ordenados[posicao]
+
+    def montar_relatorio(self, amostras, decorrido, options):
+        por_endpoint = defaultdict(list)
+        for amostra in amostras:
+            por_endpoint[amostra[0]].append(amostra)
+
+        endpoints = {}
+        for endpoint, lista in sorted(por_endpoint.items()):
+            sucesso = [a for a in lista if a[3]]
+            latencias = sorted(a[1] * 1000 for a in sucesso)
+            consultas = [a[4] for a in sucesso if a[4] is not None]
+            status = defaultdict(int)
+            for a in lista:
+                status[str(a[2]) if a[2] is not None else "erro_conexao"] += 1
+            endpoints[endpoint] = {
+                "requisicoes": len(lista),
+                "por_segundo": round(len(lista) / decorrido, 2),
+                "erros": len(lista) - len(sucesso),
+                "status": dict(status),
+                "latencia_ms": {
+                    "p50": self._arredondar(self.percentil(latencias, 50)),
+                    "p95": self._arredondar(self.percentil(latencias, 95)),
+                    "p99": self._arredondar(self.percentil(latencias, 99)),
+                    "media": self._arredondar(sum(latencias) / len(latencias) if latencias else None),
+                    "max": self._arredondar(latencias[-1] if latencias else None),
+                },
+            }
+            if consultas:
+                endpoints[endpoint]["consultas_bd"] = {
+                    "media": round(sum(consultas) / len(consultas), 2),
+                    "max": max(consultas),
+                }
+
+        relatorio = {
+            "configuracao": {
+                chave: options[chave]
+                for chave in (
+                    "url", "usuarios", "conversas", "mensagens_iniciais",
+                    "clientes", "duracao", "pausa", "mix",
+                )
+            },
+            "duracao_s": round(decorrido, 2),
+            "requisicoes": len(amostras),
+            "requisicoes_por_segundo": round(len(amostras) / decorrido, 2),
+            "erros": sum(e["erros"] for e in endpoints.values()),
+            "endpoints": endpoints,
+        }
+        if amostras and not any("consultas_bd" in e for e in endpoints.values()):
+            relatorio["aviso"] = AVISO_SEM_CONSULTAS
+        return relatorio
+
+    @staticmethod
+    def _arredondar(valor):
+        return round(valor, 2) if valor is not None else None
@@ -0,0 +1,135 @@
+import json
+import resource
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from chat.broker import broker
+from chat.models import Conversa, Mensagem
+
+User = get_user_model()
+
+PREFIXO = "bench_entrega_"
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara a entrega de mensagens por polling (novas/) e por long-poll "
+        "(aguardar/): requisições por segundo e CPU do processo"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clientes", type=int, default=50, help="Abas de chat simuladas")
+        parser.add_argument("--duracao", type=float, default=30.0, help="Segundos por modo")
+        parser.add_argument("--intervalo", type=float, default=3.0, help="Intervalo do polling (s)")
+        parser.add_argument("--timeout", type=float, default=25.0, help="Timeout do long-poll (s)")
+        parser.add_argument(
+            "--mensagens-por-minuto",
+            type=float,
+            default=0.0,
+            help="Mensagens enviadas durante a medição (0 = conversa ociosa)",
+        )
+
+    def handle(self, *args, **options):
+        remetente, clientes = self.preparar_dados(options["clientes"])
+        try:
+            resultados = {
+                modo: self.medir(modo, remetente, clientes, options)
+                for modo in ("polling", "push")
+            }
+        finally:
+            self.limpar_dados()
+
+        self.stdout.write(json.dumps(resultados, indent=2, ensure_ascii=False))
+
+    def preparar_dados(self, quantidade):
+        self.limpar_dados()
+        remetente = User.objects.create(username=f"{PREFIXO}remetente", role="contratante")
+        clientes = []
+        for i in range(quantidade):
+            usuario = User.objects.create(username=f"{PREFIXO}{i}", role="trabalhador")
+            conversa, _ = Conversa.objects.entre(remetente, usuario)
+            client = Client(HTTP_HOST="localhost")
+            client.force_login(usuario)
+            clientes.append((client, conversa.id))
+        return remetente, clientes
+
+    def limpar_dados(self):
+        Conversa.objects.filter(participantes__username__startswith=PREFIXO).delete()
+        User.objects.filter(username__startswith=PREFIXO).delete()
+
+    def medir(self, modo, remetente, clientes, options):
+        parar = threading.Event()
+        requisicoes = [0] * len(clientes)
+        entregues = [0] * len(clientes)
+
+        def cliente_polling(indice, client, conversa_id):
+            ultima_id = 0
+            while not parar.is_set():
+                resposta = client.get(f"/chat/{conversa_id}/novas/?ultima_id={ultima_id}").json()
+                requisicoes[indice] += 1
+                entregues[indice] += resposta["count"]
+                if resposta["count"]:
+                    ultima_id = resposta["mensagens"][-1]["id"]
+                parar.wait(options["intervalo"])
+
+        def cliente_push(indice, client, conversa_id):
+            ultima_id = 0
+            while not parar.is_set():
+                resposta = client.get(
+                    f"/chat/{conversa_id}/aguardar/?ultima_id={ultima_id}&timeout={options['timeout']}"
+                ).json()
+                requisicoes[indice] += 1
+                entregues[indice] += resposta["count"]
+                if resposta["count"]:
+                    ultima_id = resposta["mensagens"][-1]["id"]
+
+        def enviar_mensagens():
+            intervalo = 60.0 / options["mensagens_por_minuto"]
+            i = 0
+            while not parar.wait(intervalo):
+                _, conversa_id = clientes[i % len(clientes)]
+                Mensagem.objects.create(
+                    conversa_id=conversa_id, remetente=remetente, conteudo=f"bench {i}"
+                )
+                i += 1
+
+        alvo = cliente_polling if modo == "polling" else cliente_push
+        threads = [
+            threading.Thread(target=alvo, args=(i, client, conversa_id), daemon=True)
+            for i, (client, conversa_id) in enumerate(clientes)
+        ]
+        if options["mensagens_por_minuto"] > 0:
+            threads.append(threading.Thread(target=enviar_mensagens, daemon=True))
+
+        uso_inicial = resource.getrusage(resource.RUSAGE_SELF)
+        inicio = time.monotonic()
+        for thread in threads:
+            thread.start()
+        time.sleep(options["duracao"])
+        parar.set()
+        # Libera quem está preso no long-poll para encerrar a medição
+        for _, conversa_id in clientes:
+            broker.publicar(conversa_id)
+        for thread in threads:
+            thread.join()
+        decorrido = time.monotonic() - inicio
+        uso_final = resource.getrusage(resource.RUSAGE_SELF)
+
+        cpu = (uso_final.ru_utime - uso_inicial.ru_utime) + (
+            uso_final.ru_stime - uso_inicial.ru_stime
+        )
+        total = sum(requisicoes)
+        self.stdout.write(f"{modo}: {total} requisições em {decorrido:.1f}s")
+        return {
+            "clientes": len(clientes),
+            "duracao_s": round(decorrido, 2),
+            "requisicoes": total,
+            "requisicoes_por_segundo": round(total / decorrido, 2),
+            "mensagens_entregues": sum(entregues),
+            "cpu_s": round(cpu, 3),
+            "cpu_percentual": round(100 * cpu / decorrido, 2),
+        }
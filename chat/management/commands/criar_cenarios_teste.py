@@ -272,26 +272,13 @@ class Command(BaseCommand):
         self.stdout.write(f"✅ {Mensagem.objects.count()} mensagens criadas")
 
     def criar_conversa(self, participantes):
-        # Verificar se já existe conversa entre esses usuários
-        conversa_existente = (
-            Conversa.objects.filter(participantes=participantes[0])
-            .filter(participantes=participantes[1])
-            .first()
-        )
-
-        if conversa_existente:
-            return conversa_existente, False
-
-        # Criar nova conversa
-        conversa = Conversa.objects.create()
-        conversa.participantes.add(*participantes)
-        return conversa, True
+        return Conversa.objects.entre(*participantes)
 
     def criar_mensagens_conversa(self, conversa, mensagens_data):
-        for remetente, conteudo in mensagens_data:
-            Mensagem.objects.create(
-                conversa=conversa, remetente=remetente, conteudo=conteudo
-            )
+        Mensagem.objects.enviar_em_lote(
+            Mensagem(conversa=conversa, remetente=remetente, conteudo=conteudo)
+            for remetente, conteudo in mensagens_data
+        )
 
     def mostrar_resumo(self):
         self.stdout.write("\n=== RESUMO DOS DADOS CRIADOS ===")
@@ -42,35 +42,29 @@ class Command(BaseCommand):
         else:
             self.stdout.write(f'INFO Trabalhador ja existe: {trabalhador.username}')
 
-        conversa = Conversa.objects.filter(
-            participantes=contratante
-        ).filter(
-            participantes=trabalhador
-        ).first()
+        conversa, created = Conversa.objects.entre(contratante, trabalhador)
 
-        if not conversa:
-            conversa = Conversa.objects.create()
-            conversa.participantes.add(contratante, trabalhador)
+        if created:
             self.stdout.write(self.style.SUCCESS(f'OK Conversa criada'))
             
-            Mensagem.objects.create(
-                conversa=conversa,
-                remetente=contratante,
-                conteudo="Ola Maria! Preciso de um trabalhador para colheita de cafe."
-            )
-            
-            Mensagem.objects.create(
-                conversa=conversa,
-                remetente=trabalhador,
-                conteudo="Oi Joao! Sim, tenho disponibilidade. Quando seria?"
-            )
-            
-            Mensagem.objects.create(
-                conversa=conversa,
-                remetente=contratante,
-                conteudo="Seria na proxima semana. Voce cobra quanto por dia?"
-            )
-            
+            Mensagem.objects.enviar_em_lote([
+                Mensagem(
+                    conversa=conversa,
+                    remetente=contratante,
+                    conteudo="Ola Maria! Preciso de um trabalhador para colheita de cafe."
+                ),
+                Mensagem(
+                    conversa=conversa,
+                    remetente=trabalhador,
+                    conteudo="Oi Joao! Sim, tenho disponibilidade. Quando seria?"
+                ),
+                Mensagem(
+                    conversa=conversa,
+                    remetente=contratante,
+                    conteudo="Seria na proxima semana. Voce cobra quanto por dia?"
+                ),
+            ])
+
             self.stdout.write(self.style.SUCCESS(f'OK {conversa.mensagens.count()} mensagens criadas'))
         else:
             self.stdout.write(f'INFO Conversa ja existe (ID: {conversa.id})')
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.busca import reconstruir_indice_busca
+from chat.models import Mensagem
+
+
+class Command(BaseCommand):
+    help = "Recria o índice de busca textual (FTS5) das mensagens do chat"
+
+    def handle(self, *args, **options):
+        if not reconstruir_indice_busca():
+            raise CommandError("A busca textual com FTS5 só está disponível no SQLite.")
+        self.stdout.write(
+            self.style.SUCCESS(f"Índice reconstruído: {Mensagem.objects.count()} mensagens")
+        )
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-18 04:26
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CaixaEntrada',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trecho', models.CharField(blank=True, max_length=120, verbose_name='Trecho da Última Mensagem')),
+                ('ultima_e_minha', models.BooleanField(default=False, verbose_name='Última Mensagem Enviada pelo Usuário')),
+                ('data_atividade', models.DateTimeField(default=django.utils.timezone.now, help_text='Data da última mensagem ou, sem mensagens, da criação da conversa', verbose_name='Última Atividade')),
+                ('nao_lidas', models.PositiveIntegerField(default=0, verbose_name='Não Lidas')),
+                ('conversa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='caixas_entrada', to='chat.conversa', verbose_name='Conversa')),
+                ('outra_parte', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Outra Parte')),
+                ('ultima_mensagem', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chat.mensagem', verbose_name='Última Mensagem')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='caixa_entrada', to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Caixa de Entrada',
+                'verbose_name_plural': 'Caixas de Entrada',
+                'ordering': ['-data_atividade'],
+                'indexes': [models.Index(fields=['usuario', '-data_atividade'], name='chat_caixa_usuario_ativ_idx')],
+                'unique_together': {('usuario', 'conversa')},
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+from django.db import migrations
+
+
+def popular_caixas_entrada(apps, schema_editor):
+    Conversa = apps.get_model("chat", "Conversa")
+    Mensagem = apps.get_model("chat", "Mensagem")
+    CaixaEntrada = apps.get_model("chat", "CaixaEntrada")
+
+    caixas = []
+    for conversa in Conversa.objects.prefetch_related("participantes").iterator(chunk_size=500):
+        participantes_ids = [p.id for p in conversa.participantes.all()]
+        ultima = (
+            Mensagem.objects.filter(conversa=conversa).order_by("-data_envio", "-id").first()
+        )
+        for usuario_id in participantes_ids:
+            outros = [pid for pid in participantes_ids if pid != usuario_id]
+            nao_lidas = (
+                Mensagem.objects.filter(conversa=conversa, lida=False)
+                .exclude(remetente_id=usuario_id)
+                .count()
+            )
+            caixas.append(
+                CaixaEntrada(
+                    usuario_id=usuario_id,
+                    conversa=conversa,
+                    outra_parte_id=outros[0] if len(outros) == 1 else None,
+                    ultima_mensagem=ultima,
+                    trecho=ultima.conteudo[:120] if ultima else "",
+                    ultima_e_minha=bool(ultima and ultima.remetente_id == usuario_id),
+                    data_atividade=ultima.data_envio if ultima else conversa.data_criacao,
+                    nao_lidas=nao_lidas,
+                )
+            )
+    CaixaEntrada.objects.bulk_create(caixas, batch_size=500, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0002_caixaentrada"),
+    ]
+
+    operations = [
+        migrations.RunPython(popular_caixas_entrada, migrations.RunPython.noop),
+    ]
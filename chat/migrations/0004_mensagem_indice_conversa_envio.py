@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-18 04:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_popular_caixaentrada'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mensagem',
+            index=models.Index(fields=['conversa', 'data_envio', 'id'], name='chat_msg_conversa_envio_idx'),
+        ),
+    ]
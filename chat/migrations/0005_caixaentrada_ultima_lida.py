@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 04:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_mensagem_indice_conversa_envio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='caixaentrada',
+            name='ultima_lida',
+            field=models.BigIntegerField(default=0, help_text='ID da última mensagem da conversa já lida pelo usuário', verbose_name='Marca de Leitura'),
+        ),
+        migrations.AlterField(
+            model_name='mensagem',
+            name='lida',
+            field=models.BooleanField(default=False, help_text='Legado: a leitura é controlada por CaixaEntrada.ultima_lida', verbose_name='Lida'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+from django.db import migrations
+from django.db.models import Max, Min
+
+
+def derivar_marcas_de_leitura(apps, schema_editor):
+    """Deriva ultima_lida dos flags Mensagem.lida existentes
+
+    A marca fica logo antes da primeira mensagem recebida ainda não lida; sem
+    pendências, na última mensagem da conversa.
+    """
+    Mensagem = apps.get_model("chat", "Mensagem")
+    CaixaEntrada = apps.get_model("chat", "CaixaEntrada")
+
+    caixas = list(CaixaEntrada.objects.all())
+    for caixa in caixas:
+        recebidas = Mensagem.objects.filter(conversa_id=caixa.conversa_id).exclude(
+            remetente_id=caixa.usuario_id
+        )
+        primeira_nao_lida = recebidas.filter(lida=False).aggregate(m=Min("id"))["m"]
+        if primeira_nao_lida is not None:
+            caixa.ultima_lida = primeira_nao_lida - 1
+        else:
+            caixa.ultima_lida = (
+                Mensagem.objects.filter(conversa_id=caixa.conversa_id).aggregate(
+                    m=Max("id")
+                )["m"]
+                or 0
+            )
+        caixa.nao_lidas = recebidas.filter(id__gt=caixa.ultima_lida).count()
+    CaixaEntrada.objects.bulk_update(caixas, ["ultima_lida", "nao_lidas"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0005_caixaentrada_ultima_lida"),
+    ]
+
+    operations = [
+        migrations.RunPython(derivar_marcas_de_leitura, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-18 04:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_popular_ultima_lida'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversa',
+            name='usuario_maior',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Participante (maior id)'),
+        ),
+        migrations.AddField(
+            model_name='conversa',
+            name='usuario_menor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Participante (menor id)'),
+        ),
+        migrations.AddConstraint(
+            model_name='conversa',
+            constraint=models.UniqueConstraint(fields=('usuario_menor', 'usuario_maior'), name='chat_conversa_par_unico'),
+        ),
+        migrations.AddConstraint(
+            model_name='conversa',
+            constraint=models.CheckConstraint(condition=models.Q(('usuario_menor__lt', models.F('usuario_maior'))), name='chat_conversa_par_ordenado'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+
+def popular_par_canonico(apps, schema_editor):
+    """Preenche a chave do par nas conversas existentes entre duas pessoas
+
+    Se já houver conversas duplicadas para o mesmo par, só a mais antiga
+    recebe a chave; as demais continuam acessíveis pelo M2M.
+    """
+    Conversa = apps.get_model("chat", "Conversa")
+
+    vistos = set()
+    atualizadas = []
+    for conversa in Conversa.objects.prefetch_related("participantes").order_by("id"):
+        ids = sorted(p.id for p in conversa.participantes.all())
+        if len(ids) != 2 or tuple(ids) in vistos:
+            continue
+        vistos.add(tuple(ids))
+        conversa.usuario_menor_id, conversa.usuario_maior_id = ids
+        atualizadas.append(conversa)
+    Conversa.objects.bulk_update(
+        atualizadas, ["usuario_menor", "usuario_maior"], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0007_conversa_par_canonico"),
+    ]
+
+    operations = [
+        migrations.RunPython(popular_par_canonico, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def criar_indice(apps, schema_editor):
+    from chat.busca import reconstruir_indice_busca
+
+    reconstruir_indice_busca(schema_editor.connection)
+
+
+def remover_indice(apps, schema_editor):
+    from chat.busca import remover_indice_busca
+
+    remover_indice_busca(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0008_popular_par_canonico"),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indice, remover_indice),
+    ]
@@ -1,7 +1,31 @@
-from django.db import models
+from collections import Counter, defaultdict
+
+from django.db import models, transaction
+from django.db.models import Case, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Greatest
 from django.conf import settings
 from django.utils import timezone
 
+from . import contadores
+from .broker import broker
+
+
+class ConversaManager(models.Manager):
+    def entre(self, usuario_a, usuario_b):
+        """Busca ou cria a conversa entre dois usuários pela chave canônica do par
+
+        Retorna (conversa, criada). A restrição única sobre (usuario_menor,
+        usuario_maior) impede duplicatas mesmo com cliques simultâneos.
+        """
+        menor_id, maior_id = sorted([usuario_a.pk, usuario_b.pk])
+        with transaction.atomic():
+            conversa, criada = self.get_or_create(
+                usuario_menor_id=menor_id, usuario_maior_id=maior_id
+            )
+            if criada:
+                conversa.participantes.add(menor_id, maior_id)
+        return conversa, criada
+
 
 class Conversa(models.Model):
     """Representa uma conversa entre dois usuários"""
@@ -24,28 +48,207 @@ class Conversa(models.Model):
     ultima_atualizacao = models.DateTimeField(
         auto_now=True, verbose_name="Última Atualização"
     )
+    # Chave canônica das conversas entre duas pessoas (menor id, maior id).
+    # Fica vazia em conversas com outro número de participantes.
+    usuario_menor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name="Participante (menor id)",
+    )
+    usuario_maior = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name="Participante (maior id)",
+    )
+
+    objects = ConversaManager()
 
     class Meta:
         verbose_name = "Conversa"
         verbose_name_plural = "Conversas"
         ordering = ["-ultima_atualizacao"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["usuario_menor", "usuario_maior"], name="chat_conversa_par_unico"
+            ),
+            models.CheckConstraint(
+                condition=Q(usuario_menor__lt=F("usuario_maior")),
+                name="chat_conversa_par_ordenado",
+            ),
+        ]
 
     def __str__(self):
         participantes_nomes = ", ".join([p.username for p in self.participantes.all()])
         return f"Conversa: {participantes_nomes}"
 
+    @property
+    def e_par(self):
+        return self.usuario_menor_id is not None
+
+    def tem_participante(self, usuario):
+        """Verifica participação pela chave do par, sem consultar o M2M quando possível"""
+        if self.e_par:
+            return usuario.id in (self.usuario_menor_id, self.usuario_maior_id)
+        return self.participantes.filter(id=usuario.id).exists()
+
     def get_outra_parte(self, usuario):
         """Retorna o outro participante da conversa (não o usuário atual)"""
+        if self.e_par:
+            if usuario.id == self.usuario_menor_id:
+                return self.usuario_maior
+            return self.usuario_menor
         return self.participantes.exclude(id=usuario.id).first()
 
     def mensagens_nao_lidas(self, usuario):
-        """Retorna quantidade de mensagens não lidas para o usuário"""
-        return self.mensagens.filter(lida=False).exclude(remetente=usuario).count()
+        """Retorna quantidade de mensagens não lidas para o usuário (pela marca de leitura)"""
+        ultima_lida = (
+            self.caixas_entrada.filter(usuario=usuario)
+            .values_list("ultima_lida", flat=True)
+            .first()
+        )
+        return (
+            self.mensagens.filter(id__gt=ultima_lida or 0)
+            .exclude(remetente=usuario)
+            .count()
+        )
 
     def ultima_mensagem(self):
         """Retorna a última mensagem da conversa"""
         return self.mensagens.order_by("-data_envio").first()
 
+    def marcar_como_lidas(self, usuario):
+        """Avança a marca de leitura do usuário até a última mensagem da conversa
+
+        Não toca nas linhas de Mensagem: é um SELECT na CaixaEntrada e, só se
+        havia algo não lido, um UPDATE dessa mesma linha. Retorna quantas
+        mensagens foram marcadas como lidas.
+        """
+        # Maior id da conversa, não o da última mensagem: histórico importado
+        # (enviar_em_lote) pode ter ids maiores que a mensagem mais recente
+        maior_id = Mensagem.objects.filter(conversa_id=OuterRef("conversa_id")).order_by("-id")
+        caixa = (
+            CaixaEntrada.objects.filter(conversa=self, usuario=usuario)
+            .annotate(maior_id=Subquery(maior_id.values("id")[:1]))
+            .values("id", "nao_lidas", "maior_id")
+            .first()
+        )
+        if not caixa or not caixa["nao_lidas"]:
+            return 0
+
+        # Usa os valores lidos: uma mensagem que chegue entre o SELECT e o
+        # UPDATE continua acima da marca e é contada como não lida
+        CaixaEntrada.objects.filter(id=caixa["id"]).update(
+            ultima_lida=Greatest(F("ultima_lida"), Value(caixa["maior_id"] or 0)),
+            nao_lidas=F("nao_lidas") - caixa["nao_lidas"],
+        )
+        deltas = {usuario.pk: -caixa["nao_lidas"]}
+        transaction.on_commit(lambda: contadores.ajustar(deltas))
+        return caixa["nao_lidas"]
+
+    def sincronizar_par(self, participantes_ids):
+        """Mantém a chave canônica (usuario_menor, usuario_maior) igual aos participantes
+
+        Conversas criadas pelo admin ou por participantes.add() recebem o par
+        ao chegar a dois participantes, e entre() passa a encontrá-las. Se o par
+        já tem outra conversa, a restrição única levanta IntegrityError.
+        """
+        par = tuple(sorted(participantes_ids)) if len(participantes_ids) == 2 else (None, None)
+        if par != (self.usuario_menor_id, self.usuario_maior_id):
+            Conversa.objects.filter(pk=self.pk).update(
+                usuario_menor_id=par[0], usuario_maior_id=par[1]
+            )
+            self.usuario_menor_id, self.usuario_maior_id = par
+
+    def sincronizar_caixas_entrada(self):
+        """Garante uma linha de CaixaEntrada por participante, com a outra parte preenchida
+
+        Também acerta o par canônico (sincronizar_par) com os mesmos ids.
+        """
+        participantes_ids = list(self.participantes.values_list("id", flat=True))
+        self.sincronizar_par(participantes_ids)
+        CaixaEntrada.objects.filter(conversa=self).exclude(
+            usuario_id__in=participantes_ids
+        ).delete()
+
+        caixas = []
+        for usuario_id in participantes_ids:
+            outros = [pid for pid in participantes_ids if pid != usuario_id]
+            caixas.append(
+                CaixaEntrada(
+                    usuario_id=usuario_id,
+                    conversa=self,
+                    outra_parte_id=outros[0] if len(outros) == 1 else None,
+                    data_atividade=self.data_criacao,
+                )
+            )
+        CaixaEntrada.objects.bulk_create(
+            caixas,
+            update_conflicts=True,
+            unique_fields=["usuario", "conversa"],
+            update_fields=["outra_parte"],
+        )
+
+
+class MensagemManager(models.Manager):
+    def enviar_em_lote(self, mensagens, batch_size=500):
+        """Insere mensagens em lotes e atualiza cada conversa afetada uma única vez
+
+        Para seeds, importações e cargas em massa. Equivale a salvar cada
+        mensagem (conversa, caixas de entrada e long-poll são atualizados), mas
+        com um INSERT por lote e dois UPDATEs por conversa.
+        """
+        mensagens = list(mensagens)
+        if not mensagens:
+            return []
+
+        with transaction.atomic():
+            criadas = self.bulk_create(mensagens, batch_size=batch_size)
+
+            por_conversa = defaultdict(list)
+            for mensagem in criadas:
+                por_conversa[mensagem.conversa_id].append(mensagem)
+
+            for conversa_id, lote in por_conversa.items():
+                ultima = max(lote, key=lambda m: (m.data_envio, m.pk))
+                self.registrar_envio(
+                    ultima, Counter(m.remetente_id for m in lote), total=len(lote)
+                )
+        return criadas
+
+    def registrar_envio(self, ultima, por_remetente, total):
+        """Propaga novas mensagens de uma conversa para a conversa e as caixas de entrada
+
+        ``ultima`` é a mensagem mais recente; ``por_remetente`` conta quantas
+        das ``total`` mensagens novas cada participante enviou.
+        """
+        Conversa.objects.filter(pk=ultima.conversa_id).update(
+            ultima_atualizacao=timezone.now()
+        )
+        CaixaEntrada.objects.registrar_envio(ultima, por_remetente, total)
+
+        deltas = {
+            usuario_id: total - por_remetente.get(usuario_id, 0)
+            for usuario_id in self._participantes(ultima)
+        }
+        # Acorda os clientes em long-poll e ajusta os badges só depois do commit
+        conversa_id = ultima.conversa_id
+        transaction.on_commit(lambda: broker.publicar(conversa_id))
+        transaction.on_commit(lambda: contadores.ajustar(deltas))
+
+    def _participantes(self, mensagem):
+        # Conversa já carregada com o par canônico: evita uma consulta por envio
+        if Mensagem.conversa.is_cached(mensagem) and mensagem.conversa.e_par:
+            return (mensagem.conversa.usuario_menor_id, mensagem.conversa.usuario_maior_id)
+        return CaixaEntrada.objects.filter(conversa_id=mensagem.conversa_id).values_list(
+            "usuario_id", flat=True
+        )
+
 
 class Mensagem(models.Model):
     """Representa uma mensagem dentro de uma conversa"""
@@ -66,18 +269,150 @@ class Mensagem(models.Model):
     data_envio = models.DateTimeField(
         default=timezone.now, verbose_name="Data de Envio"
     )
-    lida = models.BooleanField(default=False, verbose_name="Lida")
+    lida = models.BooleanField(
+        default=False,
+        verbose_name="Lida",
+        help_text="Legado: a leitura é controlada por CaixaEntrada.ultima_lida",
+    )
+
+    objects = MensagemManager()
 
     class Meta:
         verbose_name = "Mensagem"
         verbose_name_plural = "Mensagens"
         ordering = ["data_envio"]
+        indexes = [
+            models.Index(
+                fields=["conversa", "data_envio", "id"], name="chat_msg_conversa_envio_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.remetente.username}: {self.conteudo[:50]}..."
 
     def save(self, *args, **kwargs):
-        """Ao salvar mensagem, atualiza a última atualização da conversa"""
-        super().save(*args, **kwargs)
-        self.conversa.ultima_atualizacao = timezone.now()
-        self.conversa.save()
+        """Ao salvar mensagem, atualiza a última atualização da conversa
+
+        Tudo na mesma transação: o INSERT da mensagem e UPDATEs pontuais da
+        conversa (só ultima_atualizacao) e das caixas de entrada.
+        """
+        nova = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if nova:
+                Mensagem.objects.registrar_envio(self, {self.remetente_id: 1}, total=1)
+            else:
+                Conversa.objects.filter(pk=self.conversa_id).update(
+                    ultima_atualizacao=timezone.now()
+                )
+
+
+class CaixaEntradaManager(models.Manager):
+    def registrar_envio(self, ultima, por_remetente, total):
+        """Atualiza o resumo de todos os participantes com um único UPDATE
+
+        Cada participante recebe ``total`` não lidas a mais, descontadas as
+        que ele mesmo enviou (``por_remetente``). Última mensagem, trecho e
+        atividade só mudam se ``ultima`` não for mais antiga que a atual: a
+        importação de histórico não faz a conversa voltar na lista.
+        """
+        mais_recente = Q(ultima_mensagem__isnull=True) | Q(data_atividade__lte=ultima.data_envio)
+
+        def se_mais_recente(valor, campo):
+            return Case(
+                When(mais_recente, then=valor),
+                default=F(campo),
+                output_field=CaixaEntrada._meta.get_field(campo),
+            )
+
+        return self.filter(conversa_id=ultima.conversa_id).update(
+            ultima_mensagem=se_mais_recente(Value(ultima.pk), "ultima_mensagem"),
+            trecho=se_mais_recente(Value(ultima.conteudo[: CaixaEntrada.TAMANHO_TRECHO]), "trecho"),
+            ultima_e_minha=Case(
+                When(mais_recente & Q(usuario_id=ultima.remetente_id), then=Value(True)),
+                When(mais_recente, then=Value(False)),
+                default=F("ultima_e_minha"),
+            ),
+            data_atividade=se_mais_recente(Value(ultima.data_envio), "data_atividade"),
+            nao_lidas=Case(
+                *[
+                    When(usuario_id=remetente_id, then=F("nao_lidas") + (total - enviadas))
+                    for remetente_id, enviadas in por_remetente.items()
+                ],
+                default=F("nao_lidas") + total,
+            ),
+        )
+
+
+class CaixaEntrada(models.Model):
+    """Resumo desnormalizado de uma conversa na caixa de entrada de um participante
+
+    Mantido incrementalmente no envio (Mensagem.save) e na leitura
+    (Conversa.marcar_como_lidas), para que a lista de conversas custe uma
+    única consulta indexada. ``ultima_lida`` é a marca de leitura do
+    participante: mensagens de outros com id acima dela são não lidas.
+    """
+
+    TAMANHO_TRECHO = 120
+
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="caixa_entrada",
+        verbose_name="Usuário",
+    )
+    conversa = models.ForeignKey(
+        Conversa,
+        on_delete=models.CASCADE,
+        related_name="caixas_entrada",
+        verbose_name="Conversa",
+    )
+    outra_parte = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name="Outra Parte",
+    )
+    ultima_mensagem = models.ForeignKey(
+        Mensagem,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name="Última Mensagem",
+    )
+    trecho = models.CharField(
+        max_length=TAMANHO_TRECHO, blank=True, verbose_name="Trecho da Última Mensagem"
+    )
+    ultima_e_minha = models.BooleanField(
+        default=False, verbose_name="Última Mensagem Enviada pelo Usuário"
+    )
+    data_atividade = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="Última Atividade",
+        help_text="Data da última mensagem ou, sem mensagens, da criação da conversa",
+    )
+    ultima_lida = models.BigIntegerField(
+        default=0,
+        verbose_name="Marca de Leitura",
+        help_text="ID da última mensagem da conversa já lida pelo usuário",
+    )
+    nao_lidas = models.PositiveIntegerField(default=0, verbose_name="Não Lidas")
+
+    objects = CaixaEntradaManager()
+
+    class Meta:
+        verbose_name = "Caixa de Entrada"
+        verbose_name_plural = "Caixas de Entrada"
+        ordering = ["-data_atividade"]
+        unique_together = ["usuario", "conversa"]
+        indexes = [
+            models.Index(
+                fields=["usuario", "-data_atividade"], name="chat_caixa_usuario_ativ_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Caixa de {self.usuario_id} - Conversa {self.conversa_id}"
@@ -0,0 +1,39 @@
+"""
+Paginação por cursor (keyset) do histórico de mensagens.
+
+A ordem é (data_envio, id), coberta pelo índice chat_msg_conversa_envio_idx.
+O cursor aponta para a mensagem mais antiga já exibida; a próxima página traz
+as mensagens estritamente anteriores a ela, sem OFFSET.
+"""
+
+from datetime import datetime
+
+from django.db.models import Q
+
+SEPARADOR = "_"
+
+
+def codificar_cursor(mensagem):
+    return f"{mensagem.data_envio.isoformat()}{SEPARADOR}{mensagem.id}"
+
+
+def decodificar_cursor(cursor):
+    """Retorna (data_envio, id) ou levanta ValueError para cursores inválidos"""
+    data_texto, _, id_texto = cursor.rpartition(SEPARADOR)
+    return datetime.fromisoformat(data_texto), int(id_texto)
+
+
+def pagina_anterior(mensagens, limite, cursor=None):
+    """Retorna (mensagens em ordem cronológica, tem_mais) anteriores ao cursor"""
+    consulta = mensagens.order_by("-data_envio", "-id")
+    if cursor:
+        data_envio, mensagem_id = decodificar_cursor(cursor)
+        consulta = consulta.filter(
+            Q(data_envio__lt=data_envio) | Q(data_envio=data_envio, id__lt=mensagem_id)
+        )
+
+    pagina = list(consulta[: limite + 1])
+    tem_mais = len(pagina) > limite
+    pagina = pagina[:limite]
+    pagina.reverse()
+    return pagina, tem_mais
@@ -0,0 +1,37 @@
+from django.db import connections, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_migrate
+from django.dispatch import receiver
+from . import contadores
+from .models import CaixaEntrada, Conversa
+
+
+@receiver(m2m_changed, sender=Conversa.participantes.through)
+def sincronizar_caixas_entrada(sender, instance, action, reverse, **kwargs):
+    """Cria/remove as linhas de CaixaEntrada e acerta o par canônico quando os participantes mudam"""
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if reverse:
+        # Alteração feita a partir do usuário (user.conversas.add(...))
+        for conversa in Conversa.objects.filter(pk__in=kwargs.get("pk_set") or ()):
+            conversa.sincronizar_caixas_entrada()
+        if action == "post_clear":
+            instance.caixa_entrada.all().delete()
+        return
+    instance.sincronizar_caixas_entrada()
+
+
+@receiver(post_delete, sender=CaixaEntrada)
+def invalidar_total_nao_lidas(sender, instance, **kwargs):
+    """Conversa excluída ou participante removido: o total em cache deixa de valer"""
+    usuario_id = instance.usuario_id
+    transaction.on_commit(lambda: contadores.invalidar([usuario_id]))
+
+
+@receiver(post_migrate)
+def garantir_indice_busca(sender, using, **kwargs):
+    """Recria os triggers da busca caso uma migração tenha recriado chat_mensagem"""
+    if sender.name != "chat":
+        return
+    from .busca import criar_indice_busca
+
+    criar_indice_busca(connections[using])
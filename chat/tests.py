@@ -0,0 +1,433 @@
+import asyncio
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import User
+
+from . import contadores
+from .busca import buscar_mensagens
+from .broker import broker
+from .admin import ConversaAdminForm
+from .models import CaixaEntrada, Conversa, Mensagem
+
+
+class LongPollTest(TestCase):
+    """aguardar/: responde na hora se já há mensagem, senão espera o aviso do broker"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = User.objects.create(username="ana", role="contratante")
+        cls.bruno = User.objects.create(username="bruno", role="trabalhador")
+        cls.conversa, _ = Conversa.objects.entre(cls.ana, cls.bruno)
+        cls.mensagem = Mensagem.objects.create(conversa=cls.conversa, remetente=cls.ana, conteudo="Oi")
+
+    def setUp(self):
+        self.url = reverse("chat:aguardar", args=[self.conversa.id])
+
+    def test_mensagem_pendente_responde_sem_esperar(self):
+        self.client.force_login(self.bruno)
+        # Sessão, usuário, conversa e as mensagens novas; nenhuma espera
+        with self.assertNumQueries(4):
+            dados = self.client.get(self.url, {"ultima_id": 0}).json()
+        self.assertEqual([m["conteudo"] for m in dados["mensagens"]], ["Oi"])
+        self.assertEqual(broker.total_assinantes(self.conversa.id), 0)
+
+    def test_timeout_sem_mensagem(self):
+        self.client.force_login(self.bruno)
+        dados = self.client.get(self.url, {"ultima_id": self.mensagem.id, "timeout": "0.05"}).json()
+        self.assertEqual(dados["count"], 0)
+        self.assertEqual(broker.total_assinantes(self.conversa.id), 0)
+
+    async def test_mensagem_gravada_acorda_quem_espera(self):
+        await self.async_client.aforce_login(self.bruno)
+        espera = asyncio.create_task(
+            self.async_client.get(self.url, {"ultima_id": self.mensagem.id, "timeout": "5"})
+        )
+        while not broker.total_assinantes(self.conversa.id):
+            await asyncio.sleep(0.01)
+
+        def enviar():
+            # O aviso ao broker sai no on_commit de Mensagem.save
+            with self.captureOnCommitCallbacks(execute=True):
+                Mensagem.objects.create(conversa=self.conversa, remetente=self.ana, conteudo="Chegou")
+
+        await sync_to_async(enviar)()
+        resposta = await asyncio.wait_for(espera, 2)
+        self.assertEqual([m["conteudo"] for m in resposta.json()["mensagens"]], ["Chegou"])
+        self.assertEqual(broker.total_assinantes(self.conversa.id), 0)
+
+
+class CaixaEntradaTest(TestCase):
+    """A lista de conversas lê o resumo desnormalizado: consultas fixas, qualquer que seja a inbox"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = User.objects.create(username="ana", role="contratante")
+
+    def setUp(self):
+        cache.clear()
+
+    def conversar(self, quantidade, mensagens=3):
+        for _ in range(quantidade):
+            outro = User.objects.create(username=f"trabalhador{User.objects.count()}", role="trabalhador")
+            conversa, _ = Conversa.objects.entre(self.ana, outro)
+            for i in range(mensagens):
+                Mensagem.objects.create(conversa=conversa, remetente=outro, conteudo=f"Mensagem {i}")
+
+    def consultas_da_lista(self):
+        url = reverse("chat:lista_conversas")
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(url)
+        return resposta, len(consultas)
+
+    def test_numero_de_consultas_nao_depende_das_conversas(self):
+        self.client.force_login(self.ana)
+        self.conversar(1)
+        _, com_uma = self.consultas_da_lista()
+        self.conversar(10)
+        resposta, com_onze = self.consultas_da_lista()
+        self.assertEqual(com_uma, com_onze)
+
+        caixas = resposta.context["conversas_data"]
+        self.assertEqual(len(caixas), 11)
+        self.assertEqual(resposta.context["total_nao_lidas"], 33)
+        self.assertEqual((caixas[0].trecho, caixas[0].nao_lidas), ("Mensagem 2", 3))
+        self.assertEqual(caixas[0].outra_parte.username, "trabalhador11")
+
+
+@override_settings(CHAT_MENSAGENS_POR_PAGINA=2)
+class HistoricoPaginadoTest(TestCase):
+    """Histórico por cursor (data_envio, id): a tela traz só a última página"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = User.objects.create(username="ana", role="contratante")
+        cls.bruno = User.objects.create(username="bruno", role="trabalhador")
+        cls.conversa, _ = Conversa.objects.entre(cls.ana, cls.bruno)
+        inicio = timezone.now() - timedelta(hours=1)
+        # Duas mensagens no mesmo instante: o id desempata o cursor
+        momentos = [inicio, inicio + timedelta(minutes=1), inicio + timedelta(minutes=1),
+                    inicio + timedelta(minutes=2), inicio + timedelta(minutes=3)]
+        cls.mensagens = Mensagem.objects.enviar_em_lote([
+            Mensagem(conversa=cls.conversa, remetente=cls.ana, conteudo=f"m{i}", data_envio=momento)
+            for i, momento in enumerate(momentos)
+        ])
+
+    def anteriores(self, cursor):
+        return self.client.get(
+            reverse("chat:mensagens_anteriores", args=[self.conversa.id]), {"cursor": cursor}
+        )
+
+    def test_primeira_pagina_e_paginas_anteriores(self):
+        self.client.force_login(self.bruno)
+        resposta = self.client.get(reverse("chat:chat", args=[self.conversa.id]))
+        self.assertEqual([m.conteudo for m in resposta.context["mensagens"]], ["m3", "m4"])
+        self.assertTrue(resposta.context["tem_anteriores"])
+
+        dados = self.anteriores(resposta.context["cursor_anteriores"]).json()
+        self.assertEqual([m["conteudo"] for m in dados["mensagens"]], ["m1", "m2"])
+        self.assertTrue(dados["tem_mais"])
+        self.assertFalse(dados["mensagens"][0]["e_minha"])
+
+        dados = self.anteriores(dados["cursor"]).json()
+        self.assertEqual([m["conteudo"] for m in dados["mensagens"]], ["m0"])
+        self.assertFalse(dados["tem_mais"])
+
+    def test_cursor_invalido(self):
+        self.client.force_login(self.bruno)
+        self.assertEqual(self.anteriores("ontem_x").status_code, 400)
+
+    def test_quem_nao_participa_recebe_403(self):
+        self.client.force_login(User.objects.create(username="carla", role="trabalhador"))
+        self.assertEqual(self.anteriores("").status_code, 403)
+
+
+class MarcaLeituraTest(TestCase):
+    """Leitura por marca (CaixaEntrada.ultima_lida), sem UPDATE nas mensagens"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = User.objects.create(username="ana", role="contratante")
+        cls.bruno = User.objects.create(username="bruno", role="trabalhador")
+        cls.conversa, _ = Conversa.objects.entre(cls.ana, cls.bruno)
+
+    def setUp(self):
+        cache.clear()
+
+    def enviar(self, remetente, conteudo):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Mensagem.objects.create(conversa=self.conversa, remetente=remetente, conteudo=conteudo)
+
+    def test_nao_lidas_apos_leitura_e_nova_mensagem(self):
+        self.enviar(self.ana, "Bom dia")
+        self.enviar(self.ana, "Pode amanhã?")
+        self.enviar(self.bruno, "Posso")
+        self.assertEqual(self.conversa.mensagens_nao_lidas(self.bruno), 2)
+        self.assertEqual(contadores.total_nao_lidas(self.bruno.id), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.conversa.marcar_como_lidas(self.bruno), 2)
+        self.assertEqual(self.conversa.mensagens_nao_lidas(self.bruno), 0)
+        self.assertEqual(contadores.total_nao_lidas(self.bruno.id), 0)
+        # A leitura não toca nas linhas de Mensagem
+        self.assertFalse(Mensagem.objects.filter(lida=True).exists())
+
+        self.enviar(self.ana, "Combinado")
+        self.assertEqual(self.conversa.mensagens_nao_lidas(self.bruno), 1)
+        self.assertEqual(CaixaEntrada.objects.get(usuario=self.bruno).nao_lidas, 1)
+        self.assertEqual(contadores.total_nao_lidas(self.bruno.id), 1)
+        # "Posso" continua não lida para quem não abriu a conversa
+        self.assertEqual(self.conversa.mensagens_nao_lidas(self.ana), 1)
+
+
+class ParCanonicoTest(TestCase):
+    """Uma única conversa por par de usuários, em qualquer ordem"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = User.objects.create(username="ana", role="contratante")
+        cls.bruno = User.objects.create(username="bruno", role="trabalhador")
+
+    def test_entre_reaproveita_a_conversa_do_par(self):
+        conversa, criada = Conversa.objects.entre(self.bruno, self.ana)
+        self.assertTrue(criada)
+        self.assertEqual((conversa.usuario_menor_id, conversa.usuario_maior_id), (self.ana.id, self.bruno.id))
+        self.assertEqual(Conversa.objects.entre(self.ana, self.bruno), (conversa, False))
+        self.assertEqual(Conversa.objects.count(), 1)
+        self.assertEqual(CaixaEntrada.objects.filter(conversa=conversa).count(), 2)
+
+    def test_restricao_impede_par_duplicado(self):
+        Conversa.objects.entre(self.ana, self.bruno)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Conversa.objects.create(usuario_menor=self.ana, usuario_maior=self.bruno)
+        # O par é sempre gravado em ordem (menor id, maior id)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Conversa.objects.create(usuario_menor=self.bruno, usuario_maior=self.ana)
+
+    def test_participantes_add_preenche_o_par(self):
+        # Caminho do admin / scripts: conversa criada sem o par e participantes adicionados
+        conversa = Conversa.objects.create()
+        conversa.participantes.add(self.bruno, self.ana)
+        conversa.refresh_from_db()
+        self.assertEqual((conversa.usuario_menor_id, conversa.usuario_maior_id), (self.ana.id, self.bruno.id))
+        self.assertEqual(Conversa.objects.entre(self.ana, self.bruno), (conversa, False))
+
+        # Um terceiro participante desfaz o par; voltar a dois o refaz
+        carla = User.objects.create(username="carla", role="trabalhador")
+        conversa.participantes.add(carla)
+        conversa.refresh_from_db()
+        self.assertFalse(conversa.e_par)
+        conversa.participantes.remove(carla)
+        conversa.refresh_from_db()
+        self.assertTrue(conversa.e_par)
+
+    def test_segunda_conversa_do_par_e_recusada(self):
+        Conversa.objects.entre(self.ana, self.bruno)
+        outra = Conversa.objects.create()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            outra.participantes.add(self.ana, self.bruno)
+
+        # No admin a duplicata vira erro de formulário, antes de gravar
+        form = ConversaAdminForm({"participantes": [self.ana.id, self.bruno.id]}, instance=outra)
+        self.assertFalse(form.is_valid())
+
+
+class BuscaMensagensTest(TestCase):
+    """Índice FTS5 das mensagens: sem acentos, por prefixo, só nas conversas do usuário"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = User.objects.create(username="ana", role="contratante")
+        cls.bruno = User.objects.create(username="bruno", role="trabalhador")
+        cls.carla = User.objects.create(username="carla", role="trabalhador")
+        cls.conversa, _ = Conversa.objects.entre(cls.ana, cls.bruno)
+        outra, _ = Conversa.objects.entre(cls.ana, cls.carla)
+        cls.preco = Mensagem.objects.create(
+            conversa=cls.conversa, remetente=cls.ana, conteudo="Qual o preço do TRATOR <novo>?"
+        )
+        Mensagem.objects.create(conversa=outra, remetente=cls.carla, conteudo="Tenho tratores usados")
+
+    def ids(self, usuario, termo):
+        return [r["id"] for r in buscar_mensagens(usuario, termo)]
+
+    def test_sem_acentos_por_prefixo_e_so_nas_proprias_conversas(self):
+        with self.assertNumQueries(1):
+            resultados = buscar_mensagens(self.bruno, "tratôr preco")
+        self.assertEqual([r["id"] for r in resultados], [self.preco.id])
+        # Destaque em <mark>, com o resto do conteúdo escapado
+        self.assertIn("<mark>TRATOR</mark>", resultados[0]["trecho"])
+        self.assertIn("&lt;novo&gt;", resultados[0]["trecho"])
+        self.assertEqual(resultados[0]["outra_parte"], "ana")
+
+        self.assertEqual(len(self.ids(self.ana, "trator")), 2)
+        self.assertEqual(len(self.ids(self.carla, "trator")), 1)
+
+    def test_indice_acompanha_edicao_e_exclusao(self):
+        self.preco.conteudo = "Qual o preço da colheitadeira?"
+        self.preco.save()
+        self.assertEqual(self.ids(self.bruno, "trator"), [])
+        self.assertEqual(self.ids(self.bruno, "colheit"), [self.preco.id])
+
+        Mensagem.objects.filter(pk=self.preco.pk).delete()
+        self.assertEqual(self.ids(self.bruno, "colheit"), [])
+
+    def test_view_de_busca(self):
+        self.client.force_login(self.bruno)
+        resposta = self.client.get(reverse("chat:buscar_mensagens"), {"q": "preco"})
+        self.assertContains(resposta, "<mark>preço</mark>", html=False)
+
+
+class EnvioEmLoteTest(TestCase):
+    """enviar_em_lote: um UPDATE por conversa, sem recuar o resumo da inbox"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = User.objects.create(username="ana", role="contratante")
+        cls.bruno = User.objects.create(username="bruno", role="trabalhador")
+        cls.conversa, _ = Conversa.objects.entre(cls.ana, cls.bruno)
+
+    def test_lote_atualiza_resumo_e_nao_lidas(self):
+        agora = timezone.now()
+        Mensagem.objects.enviar_em_lote([
+            Mensagem(conversa=self.conversa, remetente=self.ana, conteudo="um", data_envio=agora - timedelta(minutes=2)),
+            Mensagem(conversa=self.conversa, remetente=self.bruno, conteudo="dois", data_envio=agora - timedelta(minutes=1)),
+            Mensagem(conversa=self.conversa, remetente=self.ana, conteudo="três", data_envio=agora),
+        ])
+        caixa = CaixaEntrada.objects.select_related("ultima_mensagem").get(usuario=self.bruno)
+        self.assertEqual((caixa.ultima_mensagem.conteudo, caixa.trecho, caixa.ultima_e_minha), ("três", "três", False))
+        self.assertEqual(caixa.data_atividade, agora)
+        self.assertEqual(caixa.nao_lidas, 2)
+        self.assertEqual(CaixaEntrada.objects.get(usuario=self.ana).nao_lidas, 1)
+
+    def test_historico_antigo_nao_recua_a_ultima_mensagem(self):
+        recente = Mensagem.objects.create(conversa=self.conversa, remetente=self.ana, conteudo="recente")
+        Mensagem.objects.enviar_em_lote([
+            Mensagem(
+                conversa=self.conversa, remetente=self.bruno, conteudo="antiga",
+                data_envio=recente.data_envio - timedelta(days=30),
+            ),
+        ])
+        for caixa in CaixaEntrada.objects.filter(conversa=self.conversa):
+            self.assertEqual(caixa.ultima_mensagem_id, recente.pk)
+            self.assertEqual(caixa.trecho, "recente")
+            self.assertEqual(caixa.data_atividade, recente.data_envio)
+            self.assertEqual(caixa.ultima_e_minha, caixa.usuario_id == self.ana.id)
+
+        # Lida a conversa, a mensagem importada (id maior) também fica abaixo da marca
+        self.assertEqual(self.conversa.mensagens_nao_lidas(self.ana), 1)
+        self.conversa.marcar_como_lidas(self.ana)
+        self.assertEqual(self.conversa.mensagens_nao_lidas(self.ana), 0)
+
+
+class PollingCondicionalTest(TestCase):
+    """Endpoints de polling respondem 304 enquanto nada mudou"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = User.objects.create(username="ana", role="contratante")
+        cls.bruno = User.objects.create(username="bruno", role="trabalhador")
+        cls.conversa, _ = Conversa.objects.entre(cls.ana, cls.bruno)
+        cls.mensagem = Mensagem.objects.create(conversa=cls.conversa, remetente=cls.ana, conteudo="Oi")
+
+    def test_novas_mensagens_304_ate_chegar_mensagem(self):
+        self.client.force_login(self.bruno)
+        url = reverse("chat:buscar_novas", args=[self.conversa.id])
+        parametros = {"ultima_id": self.mensagem.id}
+        resposta = self.client.get(url, parametros)
+        self.assertEqual(resposta.json()["count"], 0)
+
+        # Sessão, usuário e a consulta da versão; a view não roda
+        with self.assertNumQueries(3):
+            resposta = self.client.get(url, parametros, HTTP_IF_NONE_MATCH=resposta["ETag"])
+        self.assertEqual(resposta.status_code, 304)
+
+        Mensagem.objects.create(conversa=self.conversa, remetente=self.ana, conteudo="Tudo bem?")
+        resposta = self.client.get(url, parametros, HTTP_IF_NONE_MATCH=resposta["ETag"])
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()["count"], 1)
+
+    def test_mensagem_importada_com_data_antiga_chega_ao_polling(self):
+        self.client.force_login(self.bruno)
+        url = reverse("chat:buscar_novas", args=[self.conversa.id])
+        parametros = {"ultima_id": self.mensagem.id}
+        etag = self.client.get(url, parametros)["ETag"]
+
+        # Id maior, data anterior: a última mensagem da inbox não muda
+        importada, = Mensagem.objects.enviar_em_lote([
+            Mensagem(
+                conversa=self.conversa, remetente=self.ana, conteudo="Histórico",
+                data_envio=self.mensagem.data_envio - timedelta(days=1),
+            ),
+        ])
+        self.assertGreater(importada.id, self.mensagem.id)
+        self.assertEqual(CaixaEntrada.objects.get(usuario=self.bruno).ultima_mensagem_id, self.mensagem.id)
+
+        resposta = self.client.get(url, parametros, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual([m["id"] for m in resposta.json()["mensagens"]], [importada.id])
+
+    def test_lista_conversas_304(self):
+        self.client.force_login(self.bruno)
+        url = reverse("chat:lista_conversas")
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.conversa.marcar_como_lidas(self.bruno)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ContadorNaoLidasTest(TestCase):
+    """Badge da navbar: total em cache, ajustado no envio e na leitura, refeito numa falta"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = User.objects.create(username="ana", role="contratante")
+        cls.bruno = User.objects.create(username="bruno", role="trabalhador")
+        cls.conversa, _ = Conversa.objects.entre(cls.ana, cls.bruno)
+        Mensagem.objects.create(conversa=cls.conversa, remetente=cls.ana, conteudo="Oi")
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cache_ajustado_sem_consultas(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(contadores.total_nao_lidas(self.bruno.id), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(contadores.total_nao_lidas(self.bruno.id), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Mensagem.objects.create(conversa=self.conversa, remetente=self.ana, conteudo="Amanhã?")
+        with self.assertNumQueries(0):
+            self.assertEqual(contadores.total_nao_lidas(self.bruno.id), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.conversa.marcar_como_lidas(self.bruno)
+        with self.assertNumQueries(0):
+            self.assertEqual(contadores.total_nao_lidas(self.bruno.id), 0)
+
+    def test_sem_cache_o_ajuste_e_ignorado_e_o_total_refeito(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Mensagem.objects.create(conversa=self.conversa, remetente=self.ana, conteudo="Amanhã?")
+        self.assertIsNone(cache.get(contadores.chave(self.bruno.id)))
+        self.assertEqual(contadores.total_nao_lidas(self.bruno.id), 2)
+
+    def test_conversa_excluida_invalida_o_total(self):
+        contadores.total_nao_lidas(self.bruno.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.conversa.delete()
+        self.assertIsNone(cache.get(contadores.chave(self.bruno.id)))
+        self.assertEqual(contadores.total_nao_lidas(self.bruno.id), 0)
+
+    def test_badge_na_navbar(self):
+        self.client.force_login(self.bruno)
+        resposta = self.client.get(reverse("chat:lista_conversas"))
+        self.assertEqual(resposta.context["chat_nao_lidas"](), 1)
+        self.assertContains(resposta, 'id="badge-mensagens"')
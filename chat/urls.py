@@ -5,8 +5,15 @@ app_name = "chat"
 
 urlpatterns = [
     path("", views.lista_conversas, name="lista_conversas"),
+    path("buscar/", views.buscar_mensagens, name="buscar_mensagens"),
     path("<int:conversa_id>/", views.chat_view, name="chat"),
     path("<int:conversa_id>/marcar-lidas/", views.marcar_lidas, name="marcar_lidas"),
     path("iniciar/<int:user_id>/", views.criar_conversa, name="criar_conversa"),
     path("<int:conversa_id>/novas/", views.buscar_novas_mensagens, name="buscar_novas"),
+    path("<int:conversa_id>/aguardar/", views.aguardar_mensagens, name="aguardar"),
+    path(
+        "<int:conversa_id>/anteriores/",
+        views.mensagens_anteriores,
+        name="mensagens_anteriores",
+    ),
 ]
@@ -1,64 +1,83 @@
+import asyncio
+import hashlib
+
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
-from django.db.models import Q, Max
+from django.http import Http404, JsonResponse
+from django.db.models import Count, Max, OuterRef, Q, Subquery, Sum
 from django.views.decorators.http import require_POST
 from django.contrib import messages
-from .models import Conversa, Mensagem
+from core.decorators import versionado
+from .broker import broker
+from .busca import buscar_mensagens as buscar_mensagens_texto
+from .models import CaixaEntrada, Conversa, Mensagem
+from .paginacao import codificar_cursor, pagina_anterior
 from core.models import User
 
 
+def versao_lista_conversas(request):
+    """Versão da inbox: um agregado sobre as linhas de CaixaEntrada do usuário"""
+    # Avisos pendentes (messages framework) e o token CSRF também vão no HTML
+    if len(messages.get_messages(request)):
+        return None
+    versao = CaixaEntrada.objects.filter(usuario=request.user).aggregate(
+        total=Count("id"),
+        atividade=Max("data_atividade"),
+        nao_lidas=Sum("nao_lidas"),
+    )
+    atividade = versao["atividade"].timestamp() if versao["atividade"] else 0
+    csrf = hashlib.sha256(request.META.get("CSRF_COOKIE", "").encode()).hexdigest()[:12]
+    return (
+        f"inbox-{request.user.id}-{versao['total']}-{atividade}-"
+        f"{versao['nao_lidas'] or 0}-{csrf}"
+    )
+
+
 @login_required
+@versionado(versao_lista_conversas, "lista_conversas")
 def lista_conversas(request):
     """Exibe inbox com todas as conversas do usuário"""
-    conversas = (
-        Conversa.objects.filter(participantes=request.user)
-        .prefetch_related("participantes", "mensagens")
-        .annotate(ultima_msg_data=Max("mensagens__data_envio"))
-        .order_by("-ultima_msg_data")
+    # Uma única consulta indexada sobre o resumo desnormalizado (CaixaEntrada)
+    conversas_data = list(
+        CaixaEntrada.objects.filter(usuario=request.user)
+        .select_related("conversa", "outra_parte")
+        .order_by("-data_atividade")
     )
 
-    # Adicionar informações extras para cada conversa
-    conversas_data = []
-    for conversa in conversas:
-        outra_parte = conversa.get_outra_parte(request.user)
-        ultima_msg = conversa.ultima_mensagem()
-        nao_lidas = conversa.mensagens_nao_lidas(request.user)
-
-        conversas_data.append(
-            {
-                "conversa": conversa,
-                "outra_parte": outra_parte,
-                "ultima_mensagem": ultima_msg,
-                "nao_lidas": nao_lidas,
-            }
-        )
-
     context = {
         "conversas_data": conversas_data,
-        "total_nao_lidas": sum(c["nao_lidas"] for c in conversas_data),
+        "total_nao_lidas": sum(c.nao_lidas for c in conversas_data),
     }
 
     return render(request, "chat/lista_conversas.html", context)
 
 
+@login_required
+def buscar_mensagens(request):
+    """Busca textual nas conversas do usuário, com trechos destacados"""
+    termo = request.GET.get("q", "").strip()
+    resultados = buscar_mensagens_texto(request.user, termo) if termo else []
+
+    context = {"termo": termo, "resultados": resultados}
+    return render(request, "chat/buscar.html", context)
+
+
 @login_required
 def chat_view(request, conversa_id):
     """Exibe a tela de conversa e permite enviar mensagens"""
     conversa = get_object_or_404(
-        Conversa.objects.prefetch_related("participantes", "mensagens__remetente"),
+        Conversa.objects.select_related("usuario_menor", "usuario_maior"),
         id=conversa_id,
     )
 
     # Verificar se o usuário faz parte da conversa
-    if request.user not in conversa.participantes.all():
+    if not conversa.tem_participante(request.user):
         messages.error(request, "Você não tem permissão para acessar esta conversa.")
         return redirect("chat:lista_conversas")
 
     # Marcar mensagens como lidas
-    conversa.mensagens.filter(lida=False).exclude(remetente=request.user).update(
-        lida=True
-    )
+    conversa.marcar_como_lidas(request.user)
 
     # Processar envio de mensagem
     if request.method == "POST":
@@ -70,33 +89,72 @@ def chat_view(request, conversa_id):
             messages.success(request, "Mensagem enviada!")
             return redirect("chat:chat", conversa_id=conversa.id)
 
-    # Buscar todas as mensagens da conversa
-    mensagens_list = conversa.mensagens.select_related("remetente").all()
+    # Apenas a página mais recente; as anteriores vêm de mensagens_anteriores
+    mensagens_list, tem_anteriores = pagina_anterior(
+        conversa.mensagens.select_related("remetente"),
+        settings.CHAT_MENSAGENS_POR_PAGINA,
+    )
     outra_parte = conversa.get_outra_parte(request.user)
 
     context = {
         "conversa": conversa,
         "mensagens": mensagens_list,
         "outra_parte": outra_parte,
+        "tem_anteriores": tem_anteriores,
+        "cursor_anteriores": codificar_cursor(mensagens_list[0]) if mensagens_list else "",
+        "ultima_mensagem_id": mensagens_list[-1].id if mensagens_list else 0,
     }
 
     return render(request, "chat/chat.html", context)
 
 
+@login_required
+def mensagens_anteriores(request, conversa_id):
+    """Endpoint AJAX - página de mensagens anteriores ao cursor (keyset)"""
+    conversa = get_object_or_404(Conversa, id=conversa_id)
+
+    if not conversa.tem_participante(request.user):
+        return JsonResponse({"error": "Permissão negada"}, status=403)
+
+    try:
+        mensagens_list, tem_mais = pagina_anterior(
+            conversa.mensagens.select_related("remetente"),
+            settings.CHAT_MENSAGENS_POR_PAGINA,
+            cursor=request.GET.get("cursor", ""),
+        )
+    except ValueError:
+        return JsonResponse({"error": "Cursor inválido"}, status=400)
+
+    return JsonResponse(
+        {
+            "mensagens": [
+                {
+                    "id": msg.id,
+                    "remetente__username": msg.remetente.username,
+                    "remetente__id": msg.remetente_id,
+                    "conteudo": msg.conteudo,
+                    "data_envio": msg.data_envio.strftime("%d/%m/%Y %H:%M"),
+                    "e_minha": msg.remetente_id == request.user.id,
+                }
+                for msg in mensagens_list
+            ],
+            "count": len(mensagens_list),
+            "tem_mais": tem_mais,
+            "cursor": codificar_cursor(mensagens_list[0]) if mensagens_list else None,
+        }
+    )
+
+
 @login_required
 @require_POST
 def marcar_lidas(request, conversa_id):
     """Marca mensagens como lidas via AJAX"""
     conversa = get_object_or_404(Conversa, id=conversa_id)
 
-    if request.user not in conversa.participantes.all():
+    if not conversa.tem_participante(request.user):
         return JsonResponse({"success": False, "error": "Permissão negada"}, status=403)
 
-    count = (
-        conversa.mensagens.filter(lida=False)
-        .exclude(remetente=request.user)
-        .update(lida=True)
-    )
+    count = conversa.marcar_como_lidas(request.user)
 
     return JsonResponse({"success": True, "marcadas": count})
 
@@ -114,48 +172,119 @@ def criar_conversa(request, user_id):
             else "core:painel_trabalhador"
         )
 
-    # Verificar se já existe uma conversa entre os dois usuários
-    conversa_existente = (
-        Conversa.objects.filter(participantes=request.user)
-        .filter(participantes=outro_usuario)
-        .first()
+    # Busca ou cria a conversa pela chave canônica do par (uma consulta indexada)
+    conversa, criada = Conversa.objects.entre(request.user, outro_usuario)
+
+    if criada:
+        messages.success(request, f"Conversa iniciada com {outro_usuario.username}!")
+    return redirect("chat:chat", conversa_id=conversa.id)
+
+
+def _consulta_novas_mensagens(conversa_id, ultima_id):
+    return (
+        Mensagem.objects.filter(conversa_id=conversa_id, id__gt=ultima_id)
+        .select_related("remetente")
+        .values("id", "remetente__username", "conteudo", "data_envio", "remetente__id")
     )
 
-    if conversa_existente:
-        return redirect("chat:chat", conversa_id=conversa_existente.id)
 
-    # Criar nova conversa
-    conversa = Conversa.objects.create()
-    conversa.participantes.add(request.user, outro_usuario)
+def _formatar_mensagens(mensagens_list, usuario_id):
+    """Formata mensagens do .values() para o JSON consumido pelo chat.html"""
+    for msg in mensagens_list:
+        msg["data_envio"] = msg["data_envio"].strftime("%d/%m/%Y %H:%M")
+        msg["e_minha"] = msg["remetente__id"] == usuario_id
+    return mensagens_list
 
-    messages.success(request, f"Conversa iniciada com {outro_usuario.username}!")
-    return redirect("chat:chat", conversa_id=conversa.id)
+
+def _ler_ultima_id(request):
+    try:
+        return int(request.GET.get("ultima_id", 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def versao_novas_mensagens(request, conversa_id):
+    """Versão da conversa para o usuário: maior id de mensagem da conversa
+
+    A view filtra por id__gt, então a versão usa a mesma chave: mensagens
+    importadas com data antiga (enviar_em_lote) têm id maior mas não movem
+    CaixaEntrada.ultima_mensagem. A linha da inbox só confirma a participação.
+    """
+    maior_id = Mensagem.objects.filter(conversa_id=OuterRef("conversa_id")).order_by("-id")
+    linha = (
+        CaixaEntrada.objects.filter(usuario=request.user, conversa_id=conversa_id)
+        .annotate(maior_id=Subquery(maior_id.values("id")[:1]))
+        .values_list("maior_id")
+        .first()
+    )
+    # Sem linha na inbox a view faz a verificação completa (e devolve o 403)
+    if linha is None:
+        return None
+    maior_id = linha[0] or 0
+    return f"novas-{conversa_id}-{request.user.id}-{_ler_ultima_id(request)}-{maior_id}"
 
 
 @login_required
+@versionado(versao_novas_mensagens, "novas_mensagens")
 def buscar_novas_mensagens(request, conversa_id):
     """Endpoint AJAX para polling - retorna novas mensagens desde uma data"""
     conversa = get_object_or_404(Conversa, id=conversa_id)
 
-    if request.user not in conversa.participantes.all():
+    if not conversa.tem_participante(request.user):
         return JsonResponse({"error": "Permissão negada"}, status=403)
 
     # Pegar timestamp da última mensagem conhecida pelo cliente
-    ultima_id = request.GET.get("ultima_id", 0)
+    ultima_id = _ler_ultima_id(request)
 
     # Buscar mensagens novas
-    novas_mensagens = (
-        conversa.mensagens.filter(id__gt=ultima_id)
-        .select_related("remetente")
-        .values("id", "remetente__username", "conteudo", "data_envio", "remetente__id")
+    mensagens_list = _formatar_mensagens(
+        list(_consulta_novas_mensagens(conversa.id, ultima_id)), request.user.id
     )
 
-    # Converter QuerySet para lista
-    mensagens_list = list(novas_mensagens)
+    return JsonResponse({"mensagens": mensagens_list, "count": len(mensagens_list)})
 
-    # Formatar data_envio para string
-    for msg in mensagens_list:
-        msg["data_envio"] = msg["data_envio"].strftime("%d/%m/%Y %H:%M")
-        msg["e_minha"] = msg["remetente__id"] == request.user.id
 
+@login_required
+async def aguardar_mensagens(request, conversa_id):
+    """Endpoint de long-poll - responde assim que chegar mensagem nova ou no timeout
+
+    Usa o mesmo formato de resposta de buscar_novas_mensagens. A espera é feita
+    no broker em memória, sem consultas ao banco enquanto a conversa está parada.
+    """
+    usuario = await request.auser()
+    conversa = await Conversa.objects.filter(id=conversa_id).afirst()
+    if conversa is None:
+        raise Http404("Conversa não encontrada")
+
+    if conversa.e_par:
+        permitido = usuario.id in (conversa.usuario_menor_id, conversa.usuario_maior_id)
+    else:
+        permitido = await conversa.participantes.filter(id=usuario.id).aexists()
+    if not permitido:
+        return JsonResponse({"error": "Permissão negada"}, status=403)
+
+    ultima_id = _ler_ultima_id(request)
+    timeout_maximo = settings.CHAT_LONG_POLL_TIMEOUT
+    try:
+        timeout = min(float(request.GET.get("timeout", timeout_maximo)), timeout_maximo)
+    except (TypeError, ValueError):
+        timeout = timeout_maximo
+
+    # Assina antes de consultar para não perder mensagens gravadas no intervalo
+    assinatura = broker.assinar(conversa.id)
+    try:
+        consulta = _consulta_novas_mensagens(conversa.id, ultima_id)
+        mensagens_list = [msg async for msg in consulta]
+        if not mensagens_list:
+            _, evento = assinatura
+            try:
+                await asyncio.wait_for(evento.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            else:
+                mensagens_list = [msg async for msg in consulta.all()]
+    finally:
+        broker.cancelar(conversa.id, assinatura)
+
+    mensagens_list = _formatar_mensagens(mensagens_list, usuario.id)
     return JsonResponse({"mensagens": mensagens_list, "count": len(mensagens_list)})
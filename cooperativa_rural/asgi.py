@@ -5,6 +5,11 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+O long-poll do chat (chat.views.aguardar_mensagens) é uma view assíncrona:
+servido por um servidor ASGI (ex.: ``uvicorn cooperativa_rural.asgi:application``)
+cada cliente aguardando não ocupa uma thread. Sob WSGI ele continua funcionando,
+mas cada espera prende um worker até o timeout.
 """
 
 import os
@@ -52,6 +52,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "core.middleware.ContadorConsultasMiddleware",
 ]
 
 ROOT_URLCONF = "cooperativa_rural.urls"
@@ -66,6 +67,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "chat.context_processors.mensagens_nao_lidas",
             ],
         },
     },
@@ -132,6 +134,26 @@ STATIC_URL = "static/"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Chat: tempo máximo (segundos) que uma requisição de long-poll fica aguardando
+# mensagens novas antes de responder vazia. O cliente reconecta em seguida.
+CHAT_LONG_POLL_TIMEOUT = 25
+
+# Chat: mensagens exibidas ao abrir a conversa e por página de "carregar anteriores"
+CHAT_MENSAGENS_POR_PAGINA = 50
+
+# Chat: validade (segundos) do total de não lidas em cache usado no badge da navbar
+CHAT_NAO_LIDAS_TIMEOUT = 60 * 60
+
+# Painéis: validade (segundos) dos totais de serviços por status em cache
+PAINEL_CACHE_TIMEOUT = 5 * 60
+
+# Marketplace: validade (segundos) das contagens de facetas em cache
+MARKETPLACE_FACETAS_TIMEOUT = 10 * 60
+
+# Cabeçalho X-Consultas-BD em cada resposta (core.middleware), usado pelo benchmark_chat.
+# Ligue só para medir: envolve todas as conexões a cada requisição
+CONTAR_CONSULTAS_BD = False
+
 # Admin customization
 ADMIN_SITE_HEADER = "Administração - Cooperativa Rural"
 ADMIN_SITE_TITLE = "Cooperativa Rural"
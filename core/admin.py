@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.html import format_html
-from .models import User, Servico, Avaliacao, ControleJornada, Mensagem
+from .models import User, Servico, Avaliacao, ControleJornada, EventoJornada, Mensagem, Notificacao
 
 # Register your models here.
 
@@ -13,9 +13,14 @@ class UserAdmin(BaseUserAdmin):
     
     fieldsets = BaseUserAdmin.fieldsets + (
         ('Informações Adicionais', {
-            'fields': ('role', 'telefone', 'valor_diario', 'avaliacao_media')
+            'fields': ('role', 'telefone', 'valor_diario')
+        }),
+        ('Avaliações e Ranking', {
+            'fields': ('avaliacao_media', 'avaliacoes_total', 'ranking_score')
         }),
     )
+    # Agregados mantidos por core.avaliacoes e core.ranking: editar à mão os dessincroniza
+    readonly_fields = ['avaliacao_media', 'avaliacoes_total', 'ranking_score']
     
     add_fieldsets = BaseUserAdmin.add_fieldsets + (
         ('Informações Adicionais', {
@@ -75,13 +80,26 @@ class AvaliacaoAdmin(admin.ModelAdmin):
     nota_display.short_description = 'Nota'
 
 
+class EventoJornadaInline(admin.TabularInline):
+    model = EventoJornada
+    fields = ['tipo', 'registrado_em', 'criado_em']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(ControleJornada)
 class ControleJornadaAdmin(admin.ModelAdmin):
     list_display = ['servico', 'data', 'hora_inicio', 'hora_pausa', 'hora_retorno', 'hora_fim', 'total_horas_display', 'status_display']
     list_filter = ['data']
     search_fields = ['servico__contratante__username', 'servico__trabalhador__username']
     date_hierarchy = 'data'
-    readonly_fields = ['total_horas']
+    # Colunas hora_* e totais são projeção das batidas (EventoJornada)
+    readonly_fields = ['hora_inicio', 'hora_pausa', 'hora_retorno', 'hora_fim', 'total_horas']
+    inlines = [EventoJornadaInline]
     
     def total_horas_display(self, obj):
         if obj.total_horas >= 8:
@@ -110,6 +128,13 @@ class ControleJornadaAdmin(admin.ModelAdmin):
     status_display.short_description = 'Status da Jornada'
 
 
+@admin.register(Notificacao)
+class NotificacaoAdmin(admin.ModelAdmin):
+    list_display = ['usuario', 'tipo', 'servico', 'lida', 'criada_em']
+    list_filter = ['tipo', 'lida', 'criada_em']
+    search_fields = ['usuario__username', 'mensagem']
+
+
 @admin.register(Mensagem)
 class MensagemAdmin(admin.ModelAdmin):
     list_display = ['servico', 'remetente', 'conteudo_resumido', 'data_envio', 'lida']
@@ -0,0 +1,58 @@
+"""
+Alerta de 8 horas de jornada, gerado no servidor.
+
+O comando verificar_jornadas (agendado a cada poucos minutos, por cron ou
+similar) lê de uma vez as jornadas abertas que ainda não foram avisadas,
+pelo índice parcial jornada_aberta_idx, e calcula o tempo trabalhado de cada
+uma a partir dos segundos acumulados e da última batida. Quem passou de
+LIMITE_SEGUNDOS recebe uma Notificacao, assim como o contratante do serviço,
+e a jornada é marcada (alerta_8h_em) para não ser avisada de novo.
+
+Com isso a página do serviço não precisa mais consultar o status a cada 30
+segundos só para descobrir as 8 horas.
+"""
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ControleJornada, Notificacao
+
+LIMITE_SEGUNDOS = 8 * 3600
+
+
+def jornadas_abertas():
+    return ControleJornada.objects.filter(estado__in=['em_andamento', 'pausada'], alerta_8h_em__isnull=True)
+
+
+def verificar_jornadas(agora=None):
+    """Notifica trabalhador e contratante das jornadas que passaram de 8h; retorna quantas"""
+    agora = agora or timezone.now()
+    with transaction.atomic():
+        jornadas = [
+            jornada
+            for jornada in jornadas_abertas().select_for_update().select_related('servico').only(
+                'estado', 'segundos_trabalhados', 'ultimo_evento_em', 'data',
+                'servico__trabalhador_id', 'servico__contratante_id',
+            )
+            if jornada.segundos_ate(agora) >= LIMITE_SEGUNDOS
+        ]
+        if not jornadas:
+            return 0
+
+        notificacoes = []
+        for jornada in jornadas:
+            servico = jornada.servico
+            data = jornada.data.strftime('%d/%m/%Y')
+            notificacoes += [
+                Notificacao(
+                    usuario_id=servico.trabalhador_id, servico=servico, tipo='jornada_8h',
+                    mensagem=f'Você completou 8 horas de trabalho na jornada de {data}.',
+                ),
+                Notificacao(
+                    usuario_id=servico.contratante_id, servico=servico, tipo='jornada_8h',
+                    mensagem=f'A jornada de {data} do serviço #{servico.pk} passou de 8 horas.',
+                ),
+            ]
+        Notificacao.objects.bulk_create(notificacoes)
+        ControleJornada.objects.filter(pk__in=[jornada.pk for jornada in jornadas]).update(alerta_8h_em=agora)
+    return len(jornadas)
@@ -0,0 +1,47 @@
+"""
+Agregados das avaliações recebidas por usuário.
+
+User guarda o total, a soma das notas e o histograma por estrela
+(avaliacoes_1 a avaliacoes_5), além da média. Cada avaliação criada, editada
+ou excluída ajusta esses campos com um UPDATE de expressões F
+(User.ajustar_avaliacoes, chamado pelos signals). As funções abaixo refazem os
+agregados a partir das próprias avaliações, para reparo: de um usuário ou de
+todos em uma consulta agrupada (comando recalcular_avaliacoes).
+"""
+
+from decimal import Decimal
+
+from django.db.models import Count, Q, Sum
+
+
+def agregados_avaliacoes(prefixo=''):
+    """Expressões de agregação: total, soma e quantidade por nota"""
+    return {
+        'total': Count(f'{prefixo}id'),
+        'soma': Sum(f'{prefixo}nota', default=0),
+        **{f'nota_{n}': Count(f'{prefixo}id', filter=Q(**{f'{prefixo}nota': n})) for n in range(1, 6)},
+    }
+
+
+def campos_avaliacoes(agregados):
+    """Valores dos campos de User a partir do resultado de agregados_avaliacoes()"""
+    total, soma = agregados['total'], agregados['soma'] or 0
+    return {
+        'avaliacoes_total': total,
+        'avaliacoes_soma': soma,
+        'avaliacao_media': Decimal(soma / total).quantize(Decimal('0.01')) if total else Decimal('0.00'),
+        **{f'avaliacoes_{n}': agregados[f'nota_{n}'] for n in range(1, 6)},
+    }
+
+
+def recalcular_todos():
+    """Refaz os agregados de todos os usuários; retorna quantos têm avaliações"""
+    from .models import Avaliacao, User
+
+    zerados = campos_avaliacoes({'total': 0, 'soma': 0, **{f'nota_{n}': 0 for n in range(1, 6)}})
+    usuarios = []
+    for linha in Avaliacao.objects.values('avaliado_id').annotate(**agregados_avaliacoes()).order_by():
+        usuarios.append(User(pk=linha['avaliado_id'], **campos_avaliacoes(linha)))
+    User.objects.exclude(pk__in=Avaliacao.objects.values('avaliado_id')).exclude(avaliacoes_total=0, avaliacao_media=0).update(**zerados)
+    User.objects.bulk_update(usuarios, list(zerados), batch_size=500)
+    return len(usuarios)
@@ -0,0 +1,199 @@
+"""
+Busca de trabalhadores por texto.
+
+Cada usuário guarda em User.texto_busca o nome, o username, os tipos de serviço
+que oferece e a descrição da experiência, sem acentos e em minúsculas. No
+SQLite a coluna é indexada por uma tabela FTS5 (core_trabalhador_fts) com
+conteúdo externo, mantida por triggers; cada termo é buscado por prefixo e o
+resultado vem com a relevância (bm25). Em outros bancos a busca cai para
+contains sobre a coluna normalizada, sem ranking.
+"""
+
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import ExpressionWrapper, F, FloatField, Value
+from django.db.models.expressions import RawSQL
+
+TABELA_FTS = 'core_trabalhador_fts'
+
+# Quanto a pontuação de ranking (core.ranking, ~3,5 para quem não tem histórico)
+# multiplica a relevância textual
+PESO_RANKING = 0.2
+
+_SQL_CRIACAO = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA_FTS} USING fts5(
+        texto_busca,
+        content='core_user',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_ai AFTER INSERT ON core_user BEGIN
+        INSERT INTO {TABELA_FTS}(rowid, texto_busca) VALUES (new.id, new.texto_busca);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_ad AFTER DELETE ON core_user BEGIN
+        INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, texto_busca)
+        VALUES ('delete', old.id, old.texto_busca);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_au AFTER UPDATE OF texto_busca ON core_user BEGIN
+        INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, texto_busca)
+        VALUES ('delete', old.id, old.texto_busca);
+        INSERT INTO {TABELA_FTS}(rowid, texto_busca) VALUES (new.id, new.texto_busca);
+    END
+    """,
+]
+
+_SQL_REMOCAO = [
+    f'DROP TRIGGER IF EXISTS {TABELA_FTS}_ai',
+    f'DROP TRIGGER IF EXISTS {TABELA_FTS}_ad',
+    f'DROP TRIGGER IF EXISTS {TABELA_FTS}_au',
+    f'DROP TABLE IF EXISTS {TABELA_FTS}',
+]
+
+
+def normalizar(texto):
+    """Minúsculas, sem acentos e com espaços simples ("  João  DA Silva" -> "joao da silva")"""
+    decomposto = unicodedata.normalize('NFKD', texto or '')
+    sem_acentos = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return ' '.join(sem_acentos.lower().split())
+
+
+def fts_disponivel(conexao=None):
+    return (conexao or connection).vendor == 'sqlite'
+
+
+def criar_indice_busca(conexao=None):
+    """Cria a tabela FTS5 e os triggers, se ainda não existirem (idempotente)
+
+    Alterações de schema no SQLite recriam core_user e descartam os triggers;
+    por isso isto também roda no post_migrate.
+    """
+    conexao = conexao or connection
+    if not fts_disponivel(conexao):
+        return False
+    with conexao.cursor() as cursor:
+        for sql in _SQL_CRIACAO:
+            cursor.execute(sql)
+    return True
+
+
+def remover_indice_busca(conexao=None):
+    conexao = conexao or connection
+    if not fts_disponivel(conexao):
+        return
+    with conexao.cursor() as cursor:
+        for sql in _SQL_REMOCAO:
+            cursor.execute(sql)
+
+
+def reconstruir_indice_busca(conexao=None):
+    """Reindexa o texto_busca de todos os usuários"""
+    conexao = conexao or connection
+    if not criar_indice_busca(conexao):
+        return False
+    with conexao.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABELA_FTS}({TABELA_FTS}) VALUES ('rebuild')")
+    return True
+
+
+def montar_texto_busca(usuario):
+    """Texto normalizado indexado para o usuário (nome, username, serviços e experiência)"""
+    partes = [usuario.first_name, usuario.last_name, usuario.username]
+    if usuario.pk:
+        for tipo, experiencia in usuario.servicos_oferecidos.values_list(
+            'tipo_servico__nome', 'descricao_experiencia'
+        ):
+            partes += [tipo, experiencia]
+    return normalizar(' '.join(p for p in partes if p))
+
+
+def atualizar_texto_busca(usuarios_ids):
+    """Recalcula o texto_busca (e, pelos triggers, o índice) dos usuários informados"""
+    from .models import User
+
+    for usuario in User.objects.filter(pk__in=usuarios_ids):
+        User.objects.filter(pk=usuario.pk).update(texto_busca=montar_texto_busca(usuario))
+
+
+def montar_texto_oferta(oferta):
+    """Texto normalizado de uma oferta (TrabalhadorServico): nome do trabalhador, tipo e experiência"""
+    trabalhador = oferta.trabalhador
+    partes = [
+        trabalhador.first_name, trabalhador.last_name, trabalhador.username,
+        oferta.tipo_servico.nome, oferta.descricao_experiencia,
+    ]
+    return normalizar(' '.join(p for p in partes if p))
+
+
+def atualizar_texto_ofertas(ofertas):
+    """Recalcula o texto_busca das ofertas (trabalhador ou tipo de serviço renomeado)"""
+    from .models import TrabalhadorServico
+
+    ofertas = list(ofertas.select_related('trabalhador', 'tipo_servico'))
+    for oferta in ofertas:
+        oferta.texto_busca = montar_texto_oferta(oferta)
+    TrabalhadorServico.objects.bulk_update(ofertas, ['texto_busca'], batch_size=500)
+
+
+def termos(texto):
+    """Palavras normalizadas do texto digitado"""
+    return re.findall(r'\w+', normalizar(texto))
+
+
+def montar_consulta_fts(termo):
+    """Converte o texto digitado em uma consulta FTS5: todos os termos, por prefixo"""
+    return ' '.join(f'"{palavra}"*' for palavra in termos(termo))
+
+
+def ids_correspondentes(termo):
+    """Subconsulta com os ids dos usuários que casam com o termo (para filter(..__in=...))"""
+    if fts_disponivel():
+        return RawSQL(
+            f'SELECT rowid FROM {TABELA_FTS} WHERE {TABELA_FTS} MATCH %s', [montar_consulta_fts(termo)]
+        )
+    from .models import User
+
+    usuarios = User.objects.all()
+    for palavra in termos(termo):
+        usuarios = usuarios.filter(texto_busca__contains=palavra)
+    return usuarios.values('id')
+
+
+def buscar_trabalhadores(queryset, termo):
+    """Filtra o queryset de usuários pelo termo e anota a pontuação de ordenação
+
+    'relevancia' é a relevância textual (bm25 invertido, maior é melhor) e
+    'pontuacao' a combina com a pontuação de ranking. Sem termo o queryset volta
+    intacto.
+    """
+    consulta = montar_consulta_fts(termo)
+    if not consulta:
+        return queryset
+
+    if fts_disponivel():
+        tabela = queryset.model._meta.db_table
+        queryset = queryset.filter(id__in=ids_correspondentes(termo)).annotate(
+            relevancia=RawSQL(
+                f'SELECT -bm25({TABELA_FTS}) FROM {TABELA_FTS} '
+                f'WHERE {TABELA_FTS} MATCH %s AND rowid = "{tabela}"."id"',
+                [consulta],
+            )
+        )
+    else:
+        queryset = queryset.filter(id__in=ids_correspondentes(termo)).annotate(
+            relevancia=Value(1.0, output_field=FloatField())
+        )
+
+    return queryset.annotate(
+        pontuacao=ExpressionWrapper(
+            F('relevancia') * (1 + F('ranking_score') * PESO_RANKING), output_field=FloatField()
+        )
+    )
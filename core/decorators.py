@@ -1,7 +1,11 @@
 from django.shortcuts import redirect
 from django.contrib import messages
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
 from functools import wraps
 
+from . import metricas
+
 def role_required(allowed_role):
     """
     Decorator que verifica se o usuário tem a role específica
@@ -21,4 +25,32 @@ def role_required(allowed_role):
             return redirect('home')
             
         return _wrapped_view
-    return decorator
\ No newline at end of file
+    return decorator
+
+def versionado(etag_func, nome):
+    """
+    GET condicional (ETag / 304) para endpoints consultados por polling.
+
+    etag_func(request, *args, **kwargs) deve ser barata (uma consulta indexada)
+    e devolver a versão atual do recurso, ou None para pular a verificação.
+    Quando o If-None-Match do cliente bate, a view nem é executada. As
+    respostas são contadas em core.metricas sob o nome informado.
+    """
+    metricas.endpoints.add(nome)
+
+    def decorator(view_func):
+        condicional = condition(etag_func=etag_func)(view_func)
+
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            response = condicional(request, *args, **kwargs)
+            if response.status_code == 304:
+                metricas.registrar(nome, 'nao_modificado')
+            elif response.status_code == 200:
+                metricas.registrar(nome, 'completo')
+            # O navegador guarda a resposta, mas revalida a cada requisição
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+
+        return _wrapped_view
+    return decorator
@@ -0,0 +1,119 @@
+"""
+Folha de ponto: horas trabalhadas e valores por trabalhador, contratante ou
+serviço, mês a mês.
+
+Tudo é agregado no banco a partir de ControleJornada (total_horas e
+segundos_trabalhados, mantidos a cada batida). O valor acordado é do serviço
+inteiro; cada jornada recebe a parte proporcional às suas horas dentro do
+serviço (valor_rateado), assim a soma de um mês bate com o que foi trabalhado
+nele mesmo quando o serviço atravessa meses.
+
+A exportação (CSV ou JSONL) lê as jornadas com iterator(chunk_size=...) e
+gera as linhas sob demanda para um StreamingHttpResponse: um ano inteiro sai
+sem carregar tudo em memória.
+"""
+
+import csv
+import json
+
+from django.db.models import (
+    Case, Count, DecimalField, ExpressionWrapper, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Cast, Coalesce, Round, TruncMonth
+
+from .models import ControleJornada
+
+SEGUNDOS_8H = 8 * 3600
+TAMANHO_LOTE = 2000
+
+AGRUPAMENTOS = {
+    'trabalhador': ('servico__trabalhador_id', 'servico__trabalhador__first_name', 'servico__trabalhador__last_name', 'servico__trabalhador__username'),
+    'contratante': ('servico__contratante_id', 'servico__contratante__first_name', 'servico__contratante__last_name', 'servico__contratante__username'),
+    'servico': ('servico_id', 'servico__descricao', 'servico__trabalhador__username', 'servico__contratante__username'),
+}
+
+COLUNAS_EXPORTACAO = (
+    ('data', 'data'),
+    ('servico_id', 'servico_id'),
+    ('trabalhador', 'servico__trabalhador__username'),
+    ('contratante', 'servico__contratante__username'),
+    ('estado', 'estado'),
+    ('hora_inicio', 'hora_inicio'),
+    ('hora_fim', 'hora_fim'),
+    ('total_horas', 'total_horas'),
+    ('valor_acordado', 'servico__valor_acordado'),
+    ('valor_rateado', 'valor_rateado'),
+)
+
+
+def jornadas(inicio=None, fim=None, trabalhador=None, contratante=None):
+    """Jornadas do período com o valor rateado de cada uma (anotação 'valor_rateado')"""
+    segundos_servico = ControleJornada.objects.filter(servico=OuterRef('servico')).values('servico').annotate(
+        total=Sum('segundos_trabalhados')
+    ).values('total')
+    queryset = ControleJornada.objects.all()
+    if inicio:
+        queryset = queryset.filter(data__gte=inicio)
+    if fim:
+        queryset = queryset.filter(data__lte=fim)
+    if trabalhador:
+        queryset = queryset.filter(servico__trabalhador=trabalhador)
+    if contratante:
+        queryset = queryset.filter(servico__contratante=contratante)
+    return queryset.annotate(segundos_servico=Subquery(segundos_servico)).annotate(
+        valor_rateado=Case(
+            When(
+                segundos_servico__gt=0,
+                then=Round(ExpressionWrapper(
+                    # Cast evita a divisão inteira do SQLite
+                    F('servico__valor_acordado') * Cast('segundos_trabalhados', FloatField()) / F('segundos_servico'),
+                    output_field=DecimalField(max_digits=10, decimal_places=2),
+                ), 2),
+            ),
+            default=Value(0),
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        )
+    )
+
+
+def resumo(queryset, por='trabalhador'):
+    """Uma linha por (agrupamento, mês): horas, dias, dias com 8h ou mais e valor"""
+    return queryset.annotate(mes=TruncMonth('data')).values(*AGRUPAMENTOS[por], 'mes').annotate(
+        horas=Coalesce(Sum('total_horas'), Value(0), output_field=DecimalField(max_digits=10, decimal_places=2)),
+        dias=Count('id'),
+        dias_8h=Count('id', filter=Q(segundos_trabalhados__gte=SEGUNDOS_8H)),
+        valor=Sum('valor_rateado'),
+    ).order_by('mes', AGRUPAMENTOS[por][0])
+
+
+def linhas(queryset):
+    """Tuplas na ordem de COLUNAS_EXPORTACAO, lidas do banco em lotes"""
+    return queryset.order_by('data', 'servico_id').values_list(
+        *(campo for _, campo in COLUNAS_EXPORTACAO)
+    ).iterator(chunk_size=TAMANHO_LOTE)
+
+
+class _Eco:
+    """Buffer que devolve o que recebe: o csv.writer formata e o streaming envia"""
+
+    def write(self, valor):
+        return valor
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    return valor.isoformat() if hasattr(valor, 'isoformat') else str(valor)
+
+
+def exportar_csv(queryset):
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow([nome for nome, _ in COLUNAS_EXPORTACAO])
+    for linha in linhas(queryset):
+        yield escritor.writerow([_texto(valor) for valor in linha])
+
+
+def exportar_jsonl(queryset):
+    nomes = [nome for nome, _ in COLUNAS_EXPORTACAO]
+    for linha in linhas(queryset):
+        yield json.dumps(dict(zip(nomes, (_texto(valor) for valor in linha))), ensure_ascii=False) + '\n'
@@ -0,0 +1,196 @@
+"""
+Municípios (IBGE) e busca por raio para os campos de localização.
+
+As localizações de TrabalhadorServico e Demanda continuam texto livre, mas ao
+salvar são resolvidas para um Municipio: "Sao Jose", "São José - SC" e
+"sao jose/sc" caem no mesmo código IBGE. O gazetteer vem de um CSV embutido
+(core/dados/municipios.csv, um recorte) e o comando carregar_municipios
+aceita a lista completa do IBGE no mesmo formato.
+
+Enquanto só o recorte estiver carregado, um nome sem UF não resolve: "Cascavel"
+é único no recorte, mas existe no PR e no CE. Com a lista completa
+(TOTAL_MUNICIPIOS) o nome sozinho resolve quando é único no país.
+
+Para "até N km" cada município guarda a célula de uma grade de
+GRAUS_CELULA graus (Municipio.grade, indexada): a busca lista as células
+que cobrem o retângulo do raio, lê só os municípios delas e confirma a
+distância pela fórmula de haversine.
+"""
+
+import csv
+import math
+import re
+from pathlib import Path
+
+from django.apps import apps as apps_global
+from django.db.models import Q
+
+from .busca import normalizar
+
+ARQUIVO_PADRAO = Path(__file__).resolve().parent / 'dados' / 'municipios.csv'
+GRAUS_CELULA = 0.5
+RAIO_TERRA_KM = 6371.0
+KM_POR_GRAU = 111.32
+RAIOS_KM = (10, 25, 50, 100, 200)
+TOTAL_MUNICIPIOS = 5570
+
+UFS = {
+    'ac', 'al', 'am', 'ap', 'ba', 'ce', 'df', 'es', 'go', 'ma', 'mg', 'ms', 'mt', 'pa',
+    'pb', 'pe', 'pi', 'pr', 'rj', 'rn', 'ro', 'rr', 'rs', 'sc', 'se', 'sp', 'to',
+}
+
+_indice = None
+
+
+class _Indice(dict):
+    """nome normalizado -> [(uf, codigo_ibge)], montado na primeira resolução"""
+
+    # Gazetteer com todos os municípios do país: só então um nome sem UF é inequívoco
+    completo = False
+
+
+def _municipio(apps=None):
+    # As migrações passam o registro histórico; em uso normal vale o atual
+    return (apps or apps_global).get_model('core', 'Municipio')
+
+
+def celula(latitude, longitude):
+    return f'{math.floor(latitude / GRAUS_CELULA)}:{math.floor(longitude / GRAUS_CELULA)}'
+
+
+def distancia_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RAIO_TERRA_KM * math.asin(math.sqrt(a))
+
+
+def carregar_municipios(caminho=None, apps=None):
+    """Importa/atualiza municípios de um CSV (codigo_ibge,nome,uf,latitude,longitude)"""
+    global _indice
+    Municipio = _municipio(apps)
+    with open(caminho or ARQUIVO_PADRAO, encoding='utf-8') as arquivo:
+        municipios = [
+            Municipio(
+                codigo_ibge=int(linha['codigo_ibge']),
+                nome=linha['nome'].strip(),
+                uf=linha['uf'].strip().upper(),
+                nome_normalizado=normalizar(linha['nome']),
+                latitude=float(linha['latitude']),
+                longitude=float(linha['longitude']),
+                grade=celula(float(linha['latitude']), float(linha['longitude'])),
+            )
+            for linha in csv.DictReader(arquivo)
+        ]
+    Municipio.objects.bulk_create(
+        municipios,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['codigo_ibge'],
+        update_fields=['nome', 'uf', 'nome_normalizado', 'latitude', 'longitude', 'grade'],
+    )
+    _indice = None
+    return len(municipios)
+
+
+def _montar_indice(apps=None):
+    indice = _Indice()
+    total = 0
+    for nome, uf, codigo in _municipio(apps).objects.values_list('nome_normalizado', 'uf', 'codigo_ibge'):
+        indice.setdefault(nome, []).append((uf.lower(), codigo))
+        total += 1
+    indice.completo = total >= TOTAL_MUNICIPIOS
+    return indice
+
+
+def _separar_uf(texto):
+    """'sao jose - sc' -> ('sao jose', 'sc'); sem UF reconhecível -> (texto, None)"""
+    encontrado = re.match(r'^(.*?)[\s,/-]+([a-z]{2})$', texto)
+    if encontrado and encontrado.group(2) in UFS:
+        return encontrado.group(1).strip(' ,/-'), encontrado.group(2)
+    return texto, None
+
+
+def resolver(texto, indice=None):
+    """Código IBGE do município descrito no texto livre, ou None se ausente/ambíguo"""
+    global _indice
+    if indice is None:
+        if _indice is None:
+            _indice = _montar_indice()
+        indice = _indice
+
+    texto = normalizar(texto)
+    if not texto:
+        return None
+    candidatos = indice.get(texto)
+    nome, uf = (texto, None) if candidatos else _separar_uf(texto)
+    if uf is None and not indice.completo:
+        # Recorte: o nome pode ter homônimo em outro estado que não está carregado
+        return None
+    candidatos = candidatos or indice.get(nome, [])
+    if uf:
+        candidatos = [c for c in candidatos if c[0] == uf]
+        if not candidatos and indice.completo:
+            # "Sao Jose - SP": nome incompleto, mas único no estado
+            candidatos = [
+                c for chave, lista in indice.items() if chave.startswith(nome + ' ')
+                for c in lista if c[0] == uf
+            ]
+    return candidatos[0][1] if len(candidatos) == 1 else None
+
+
+def normalizar_localizacoes(apps=None):
+    """Resolve o município de todas as ofertas e demandas; retorna quantas mudaram"""
+    indice = _montar_indice(apps)
+    alteradas = 0
+    for nome_modelo in ('TrabalhadorServico', 'Demanda'):
+        modelo = (apps or apps_global).get_model('core', nome_modelo)
+        objetos = []
+        for objeto in modelo.objects.only('pk', 'localizacao', 'municipio_id').iterator():
+            municipio_id = resolver(objeto.localizacao, indice)
+            if municipio_id != objeto.municipio_id:
+                objeto.municipio_id = municipio_id
+                objetos.append(objeto)
+        modelo.objects.bulk_update(objetos, ['municipio'], batch_size=500)
+        alteradas += len(objetos)
+    return alteradas
+
+
+def municipios_no_raio(codigo_ibge, raio_km):
+    """Códigos IBGE a até raio_km do município informado (inclusive ele)"""
+    Municipio = _municipio()
+    centro = Municipio.objects.filter(pk=codigo_ibge).values('latitude', 'longitude').first()
+    if centro is None:
+        return []
+    lat, lon = centro['latitude'], centro['longitude']
+    delta_lat = raio_km / KM_POR_GRAU
+    delta_lon = raio_km / (KM_POR_GRAU * max(math.cos(math.radians(lat)), 0.01))
+    linhas = range(math.floor((lat - delta_lat) / GRAUS_CELULA), math.floor((lat + delta_lat) / GRAUS_CELULA) + 1)
+    colunas = range(math.floor((lon - delta_lon) / GRAUS_CELULA), math.floor((lon + delta_lon) / GRAUS_CELULA) + 1)
+    celulas = [f'{i}:{j}' for i in linhas for j in colunas]
+    return [
+        codigo
+        for codigo, latitude, longitude in Municipio.objects.filter(grade__in=celulas).values_list(
+            'codigo_ibge', 'latitude', 'longitude'
+        )
+        if distancia_km(lat, lon, latitude, longitude) <= raio_km
+    ]
+
+
+def ler_raio(valor):
+    return int(valor) if str(valor).isdigit() and int(valor) in RAIOS_KM else None
+
+
+def filtrar_por_localizacao(queryset, texto, raio_km=None, por_texto=None):
+    """Filtra pelo município do texto (e vizinhos até raio_km)
+
+    por_texto é o filtro textual (Q) usado quando o texto não resolve para um
+    município; sem raio ele também vale junto do município, para não perder
+    registros cuja localização não foi reconhecida.
+    """
+    por_texto = por_texto or Q(localizacao__icontains=texto)
+    codigo = resolver(texto)
+    if codigo is None:
+        return queryset.filter(por_texto)
+    if raio_km:
+        return queryset.filter(municipio_id__in=municipios_no_raio(codigo, raio_km))
+    return queryset.filter(Q(municipio_id=codigo) | por_texto)
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from core.localidades import ARQUIVO_PADRAO, carregar_municipios, normalizar_localizacoes
+
+
+class Command(BaseCommand):
+    help = 'Importa municípios do IBGE (CSV: codigo_ibge,nome,uf,latitude,longitude)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', nargs='?', default=ARQUIVO_PADRAO, help='CSV; padrão: recorte embutido')
+        parser.add_argument(
+            '--sem-normalizar', action='store_true', help='Não reprocessa as localizações existentes'
+        )
+
+    def handle(self, *args, **options):
+        total = carregar_municipios(options['arquivo'])
+        self.stdout.write(self.style.SUCCESS(f'{total} municípios carregados'))
+        if not options['sem_normalizar']:
+            self.stdout.write(f'{normalizar_localizacoes()} localizações atualizadas')
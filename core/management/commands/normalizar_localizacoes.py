@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.localidades import normalizar_localizacoes
+
+
+class Command(BaseCommand):
+    help = 'Resolve o município (IBGE) da localização de todas as ofertas e demandas'
+
+    def handle(self, *args, **options):
+        alteradas = normalizar_localizacoes()
+        self.stdout.write(self.style.SUCCESS(f'{alteradas} localizações atualizadas'))
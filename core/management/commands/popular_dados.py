@@ -181,6 +181,7 @@ class Command(BaseCommand):
                     total_inscricoes += 1
 
             # Se já preencheu vagas com aceitos, marca em andamento.
+            demanda.refresh_from_db(fields=["aceitos"])
             if demanda.vagas_disponiveis <= 0 and demanda.status == "aberta":
                 demanda.status = "em_andamento"
                 demanda.save(update_fields=["status", "data_atualizacao"])
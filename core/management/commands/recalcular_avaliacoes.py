@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.avaliacoes import recalcular_todos
+
+
+class Command(BaseCommand):
+    help = 'Refaz total, soma, histograma e média das avaliações de todos os usuários'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            avaliados = recalcular_todos()
+        self.stdout.write(self.style.SUCCESS(f'Agregados recalculados: {avaliados} usuários avaliados'))
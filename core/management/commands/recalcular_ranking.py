@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from core.ranking import recalcular_todos
+
+
+class Command(BaseCommand):
+    help = 'Recalcula a pontuação de ranking de todos os trabalhadores (rodar diariamente: a recência envelhece)'
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f'Ranking recalculado: {recalcular_todos()} trabalhadores'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core.busca import atualizar_texto_busca, reconstruir_indice_busca
+from core.models import User
+
+
+class Command(BaseCommand):
+    help = 'Recalcula o texto de busca dos usuários e recria o índice FTS5 de trabalhadores'
+
+    def handle(self, *args, **options):
+        ids = list(User.objects.values_list('id', flat=True))
+        atualizar_texto_busca(ids)
+        if reconstruir_indice_busca():
+            self.stdout.write(self.style.SUCCESS(f'Índice reconstruído: {len(ids)} usuários'))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f'Texto de busca atualizado para {len(ids)} usuários (sem FTS5 fora do SQLite)'
+            ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.matching import reconstruir_feed
+
+
+class Command(BaseCommand):
+    help = 'Recalcula o feed de demandas compatíveis de todos os trabalhadores'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            linhas = reconstruir_feed()
+        self.stdout.write(self.style.SUCCESS(f'Feed reconstruído: {linhas} linhas'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from core.alertas import verificar_jornadas
+
+
+class Command(BaseCommand):
+    help = 'Notifica as jornadas em aberto que passaram de 8 horas (agendar a cada poucos minutos)'
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f'Jornadas notificadas: {verificar_jornadas()}'))
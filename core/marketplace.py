@@ -0,0 +1,124 @@
+"""
+Busca do marketplace (TrabalhadorServico): filtros, paginação e facetas.
+
+As facetas (ofertas por tipo de serviço, por localização normalizada e
+disponíveis agora) seguem a contagem "disjuntiva": cada uma considera todos
+os filtros ativos menos o seu próprio, para mostrar quantas ofertas restariam
+ao trocar aquela opção. O resultado fica no cache por combinação de filtros;
+core.signals incrementa a versão do marketplace a cada mudança em ofertas,
+tipos ou trabalhadores, o que invalida todas as entradas de uma vez.
+"""
+
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Min, Q
+
+from . import busca, localidades
+from .models import TrabalhadorServico
+
+CHAVE_VERSAO = 'marketplace:versao'
+FILTROS = ('q', 'tipo_servico', 'localizacao', 'raio', 'disponivel_agora')
+LIMITE_LOCALIZACOES = 15
+
+
+def ler_filtros(dados):
+    """Filtros do marketplace a partir do request.GET"""
+    filtros = {nome: dados.get(nome, '').strip() for nome in FILTROS}
+    if not filtros['tipo_servico'].isdigit():
+        filtros['tipo_servico'] = ''
+    if localidades.ler_raio(filtros['raio']) is None:
+        filtros['raio'] = ''
+    return filtros
+
+
+def ofertas_visiveis():
+    return TrabalhadorServico.objects.filter(tipo_servico__ativo=True, trabalhador__is_active=True)
+
+
+def filtrar(ofertas, filtros, exceto=None):
+    if filtros['q'] and busca.montar_consulta_fts(filtros['q']):
+        # O índice de trabalhadores só pré-filtra: ele cobre todas as ofertas do
+        # trabalhador, então cada termo ainda precisa casar com o nome dele ou
+        # com o tipo/experiência desta oferta (texto_busca da oferta)
+        ofertas = ofertas.filter(trabalhador_id__in=busca.ids_correspondentes(filtros['q']))
+        for palavra in busca.termos(filtros['q']):
+            ofertas = ofertas.filter(texto_busca__contains=palavra)
+    if filtros['tipo_servico'] and exceto != 'tipo_servico':
+        ofertas = ofertas.filter(tipo_servico_id=filtros['tipo_servico'])
+    if filtros['localizacao'] and exceto != 'localizacao':
+        # Município resolvido (e vizinhos até o raio); texto normalizado como alternativa
+        ofertas = localidades.filtrar_por_localizacao(
+            ofertas, filtros['localizacao'], localidades.ler_raio(filtros['raio']),
+            Q(localizacao_normalizada__contains=busca.normalizar(filtros['localizacao'])),
+        )
+    if filtros['disponivel_agora'] == '1' and exceto != 'disponivel_agora':
+        ofertas = ofertas.filter(disponivel_agora=True)
+    return ofertas
+
+
+def buscar_ofertas(filtros):
+    return filtrar(ofertas_visiveis(), filtros).select_related('trabalhador', 'tipo_servico').order_by(
+        '-disponivel_agora', '-trabalhador__ranking_score', 'tipo_servico__e_servico_risco', 'id'
+    )
+
+
+def versao():
+    versao_atual = cache.get(CHAVE_VERSAO)
+    if versao_atual is None:
+        cache.add(CHAVE_VERSAO, 1, timeout=None)
+        versao_atual = cache.get(CHAVE_VERSAO, 1)
+    return versao_atual
+
+
+def invalidar():
+    try:
+        cache.incr(CHAVE_VERSAO)
+    except ValueError:
+        # Sem versão no cache (reinício ou expulsão): nenhuma faceta em cache vale
+        cache.add(CHAVE_VERSAO, 1, timeout=None)
+
+
+def facetas(filtros):
+    """Contagens por tipo de serviço, localização e disponibilidade, em cache"""
+    assinatura = hashlib.sha256(json.dumps(filtros, sort_keys=True).encode()).hexdigest()[:16]
+    chave = f'marketplace:facetas:{versao()}:{assinatura}'
+    resultado = cache.get(chave)
+    if resultado is None:
+        resultado = calcular_facetas(filtros)
+        cache.set(chave, resultado, settings.MARKETPLACE_FACETAS_TIMEOUT)
+    return resultado
+
+
+def calcular_facetas(filtros):
+    base = ofertas_visiveis()
+    tipos = list(
+        filtrar(base, filtros, exceto='tipo_servico')
+        .values('tipo_servico_id', 'tipo_servico__nome')
+        .annotate(total=Count('id'))
+        .order_by('tipo_servico__nome')
+    )
+    localizacoes = list(
+        filtrar(base, filtros, exceto='localizacao')
+        .exclude(localizacao_normalizada='')
+        .values('localizacao_normalizada')
+        .annotate(total=Count('id'), rotulo=Min('localizacao'))
+        .order_by('-total', 'localizacao_normalizada')[:LIMITE_LOCALIZACOES]
+    )
+    disponivel_agora = filtrar(base, filtros, exceto='disponivel_agora').aggregate(
+        total=Count('id'), disponiveis=Count('id', filter=Q(disponivel_agora=True))
+    )
+    return {
+        'tipos_servico': [
+            {'id': t['tipo_servico_id'], 'nome': t['tipo_servico__nome'], 'total': t['total']}
+            for t in tipos
+        ],
+        'localizacoes': [
+            {'valor': l['localizacao_normalizada'], 'rotulo': l['rotulo'], 'total': l['total']}
+            for l in localizacoes
+        ],
+        'disponivel_agora': disponivel_agora['disponiveis'],
+        'total': disponivel_agora['total'],
+    }
@@ -0,0 +1,159 @@
+"""
+Feed de demandas compatíveis por trabalhador.
+
+Quando uma demanda é publicada ou alterada, o matcher calcula uma única vez
+quem pode atendê-la e grava uma linha em FeedDemanda para cada trabalhador
+elegível; a lista de demandas do trabalhador passa a ser uma leitura indexada
+dessa tabela. Mudanças do lado do trabalhador (serviços oferecidos ou agenda)
+recalculam só as linhas dele.
+
+Elegível é quem está ativo, oferece o tipo de serviço da demanda e não está
+bloqueado/ocupado na data do serviço. A pontuação ordena o feed:
+
+    base                                  1
+    atua na localização da demanda       +2
+    marcou a data como disponível        +1
+    disponível agora                     +0.5
+
+Linhas de demandas que deixaram de estar abertas ou lotaram são removidas no
+próximo recálculo da demanda; a leitura também filtra por status e vagas.
+"""
+
+from django.apps import apps as apps_global
+from django.db.models import F
+
+from .busca import normalizar
+
+PESO_BASE = 1.0
+PESO_LOCALIZACAO = 2.0
+PESO_DATA_DISPONIVEL = 1.0
+PESO_DISPONIVEL_AGORA = 0.5
+
+STATUS_INDISPONIVEL = ('bloqueado', 'ocupado')
+
+
+def _modelos(apps=None):
+    # As migrações passam o registro histórico; em uso normal vale o atual
+    apps = apps or apps_global
+    return (
+        apps.get_model('core', 'Demanda'),
+        apps.get_model('core', 'FeedDemanda'),
+        apps.get_model('core', 'TrabalhadorServico'),
+        apps.get_model('disponibilidade', 'Disponibilidade'),
+    )
+
+
+def mesma_localizacao(local_demanda, local_trabalhador):
+    """Localizações normalizadas que se contêm ("ribeirao preto" x "ribeirao preto sp")"""
+    if not local_demanda or not local_trabalhador:
+        return False
+    return local_trabalhador in local_demanda or local_demanda in local_trabalhador
+
+
+def pontuar(local_demanda, oferta, data_disponivel):
+    pontuacao = PESO_BASE
+    if mesma_localizacao(local_demanda, oferta.localizacao_normalizada):
+        pontuacao += PESO_LOCALIZACAO
+    if data_disponivel:
+        pontuacao += PESO_DATA_DISPONIVEL
+    if oferta.disponivel_agora:
+        pontuacao += PESO_DISPONIVEL_AGORA
+    return pontuacao
+
+
+def _recebe_no_feed(Demanda):
+    return Demanda.objects.filter(status='aberta', aceitos__lt=F('vagas'))
+
+
+def _gravar(FeedDemanda, linhas):
+    FeedDemanda.objects.bulk_create(
+        linhas,
+        update_conflicts=True,
+        unique_fields=['trabalhador', 'demanda'],
+        update_fields=['pontuacao', 'data_servico'],
+    )
+
+
+def atualizar_feed_demanda(demanda_id, apps=None):
+    """Recalcula quem recebe a demanda no feed (demanda nova, editada ou encerrada)"""
+    Demanda, FeedDemanda, TrabalhadorServico, Disponibilidade = _modelos(apps)
+    demanda = _recebe_no_feed(Demanda).filter(pk=demanda_id).first()
+    if demanda is None:
+        FeedDemanda.objects.filter(demanda_id=demanda_id).delete()
+        return 0
+
+    ofertas = TrabalhadorServico.objects.filter(
+        tipo_servico_id=demanda.tipo_servico_id, trabalhador__is_active=True
+    ).exclude(
+        trabalhador_id__in=Disponibilidade.objects.filter(
+            data=demanda.data_servico, status__in=STATUS_INDISPONIVEL
+        ).values('trabalhador_id')
+    )
+    disponiveis_na_data = set(
+        Disponibilidade.objects.filter(data=demanda.data_servico, status='disponivel')
+        .values_list('trabalhador_id', flat=True)
+    )
+    local = normalizar(demanda.localizacao)
+    linhas = [
+        FeedDemanda(
+            trabalhador_id=oferta.trabalhador_id,
+            demanda_id=demanda.pk,
+            data_servico=demanda.data_servico,
+            pontuacao=pontuar(local, oferta, oferta.trabalhador_id in disponiveis_na_data),
+        )
+        for oferta in ofertas
+    ]
+    FeedDemanda.objects.filter(demanda_id=demanda.pk).exclude(
+        trabalhador_id__in=[linha.trabalhador_id for linha in linhas]
+    ).delete()
+    _gravar(FeedDemanda, linhas)
+    return len(linhas)
+
+
+def atualizar_feed_trabalhador(trabalhador_id, apps=None):
+    """Recalcula o feed de um trabalhador (serviços oferecidos ou agenda mudaram)"""
+    Demanda, FeedDemanda, TrabalhadorServico, Disponibilidade = _modelos(apps)
+    ofertas = {
+        oferta.tipo_servico_id: oferta
+        for oferta in TrabalhadorServico.objects.filter(
+            trabalhador_id=trabalhador_id, trabalhador__is_active=True
+        )
+    }
+    demandas = _recebe_no_feed(Demanda).filter(tipo_servico_id__in=ofertas)
+    agenda = {}
+    for data, status in Disponibilidade.objects.filter(
+        trabalhador_id=trabalhador_id, data__in=demandas.values('data_servico')
+    ).values_list('data', 'status'):
+        # Um turno bloqueado/ocupado tira o dia inteiro do feed
+        if agenda.get(data) not in STATUS_INDISPONIVEL:
+            agenda[data] = status
+
+    linhas = [
+        FeedDemanda(
+            trabalhador_id=trabalhador_id,
+            demanda_id=demanda.pk,
+            data_servico=demanda.data_servico,
+            pontuacao=pontuar(
+                normalizar(demanda.localizacao),
+                ofertas[demanda.tipo_servico_id],
+                agenda.get(demanda.data_servico) == 'disponivel',
+            ),
+        )
+        for demanda in demandas
+        if agenda.get(demanda.data_servico) not in STATUS_INDISPONIVEL
+    ]
+    FeedDemanda.objects.filter(trabalhador_id=trabalhador_id).exclude(
+        demanda_id__in=[linha.demanda_id for linha in linhas]
+    ).delete()
+    _gravar(FeedDemanda, linhas)
+    return len(linhas)
+
+
+def reconstruir_feed(apps=None):
+    """Refaz o feed inteiro a partir das demandas abertas; retorna o número de linhas"""
+    Demanda, FeedDemanda, _, _ = _modelos(apps)
+    FeedDemanda.objects.all().delete()
+    return sum(
+        atualizar_feed_demanda(demanda_id, apps)
+        for demanda_id in _recebe_no_feed(Demanda).values_list('pk', flat=True)
+    )
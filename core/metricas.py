@@ -0,0 +1,50 @@
+"""
+Contadores de uso dos endpoints consultados por polling.
+
+Cada resposta de um endpoint versionado é contada como "nao_modificado" (304,
+respondida só com a consulta de versão) ou "completo" (200, montada a partir
+das tabelas principais). Os contadores ficam no cache do Django; com o
+LocMemCache padrão são por processo e zeram a cada reinício.
+"""
+
+from django.core.cache import cache
+
+PREFIXO = 'metricas:polling'
+RESULTADOS = ('nao_modificado', 'completo')
+
+# Preenchido pelo decorator versionado ao importar as views, para que o resumo
+# liste todos os endpoints mesmo com o cache compartilhado entre processos
+endpoints = set()
+
+
+def _chave(endpoint, resultado):
+    return f'{PREFIXO}:{endpoint}:{resultado}'
+
+
+def registrar(endpoint, resultado):
+    chave = _chave(endpoint, resultado)
+    # add() só grava se a chave não existe; incr() é atômico nos backends que o suportam
+    cache.add(chave, 0, timeout=None)
+    try:
+        cache.incr(chave)
+    except ValueError:
+        # Chave expulsa do cache entre o add e o incr
+        cache.set(chave, 1, timeout=None)
+
+
+def resumo():
+    """Totais por endpoint, com a fração de polls respondidos com 304"""
+    chaves = [_chave(e, r) for e in sorted(endpoints) for r in RESULTADOS]
+    valores = cache.get_many(chaves)
+    dados = {}
+    for endpoint in sorted(endpoints):
+        nao_modificado = valores.get(_chave(endpoint, 'nao_modificado'), 0)
+        completo = valores.get(_chave(endpoint, 'completo'), 0)
+        total = nao_modificado + completo
+        dados[endpoint] = {
+            'nao_modificado': nao_modificado,
+            'completo': completo,
+            'total': total,
+            'taxa_nao_modificado': round(nao_modificado / total, 4) if total else 0.0,
+        }
+    return dados
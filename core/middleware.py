@@ -0,0 +1,52 @@
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+
+class ContadorConsultasMiddleware:
+    """
+    Informa no cabeçalho X-Consultas-BD quantas consultas SQL a requisição fez.
+
+    Usado pelo benchmark_chat para acompanhar consultas por endpoint. Só fica
+    ativo com CONTAR_CONSULTAS_BD = True (desligado por padrão).
+
+    Só conta sob WSGI (runserver, gunicorn com workers síncronos), onde a
+    cadeia de middlewares é síncrona e até as views assíncronas rodam na
+    thread da requisição. Sob ASGI a cadeia inteira é assíncrona: o middleware
+    repassa a requisição sem adaptá-la para uma thread (o long-poll do chat
+    continua sem prender threads), as consultas rodam em threads do
+    sync_to_async fora do alcance do execute_wrapper e nenhuma resposta recebe
+    o cabeçalho, em vez de um número errado.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'CONTAR_CONSULTAS_BD', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.assincrono = iscoroutinefunction(get_response)
+        if self.assincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.assincrono:
+            return self.get_response(request)
+
+        total = 0
+
+        def contar(execute, sql, params, many, context):
+            nonlocal total
+            total += 1
+            return execute(sql, params, many, context)
+
+        with ExitStack() as pilha:
+            for conexao in connections.all():
+                pilha.enter_context(conexao.execute_wrapper(contar))
+            response = self.get_response(request)
+        response['X-Consultas-BD'] = str(total)
+        return response
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:00
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_merge_20260406_2254'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='controlejornada',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Atualizado em'),
+            preserve_default=False,
+        ),
+    ]
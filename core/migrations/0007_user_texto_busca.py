@@ -0,0 +1,51 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:00
+
+from django.db import migrations, models
+
+
+def popular_texto_busca(apps, schema_editor):
+    from core.busca import normalizar
+
+    User = apps.get_model('core', 'User')
+    TrabalhadorServico = apps.get_model('core', 'TrabalhadorServico')
+
+    servicos = {}
+    for trabalhador_id, tipo, experiencia in TrabalhadorServico.objects.values_list(
+        'trabalhador_id', 'tipo_servico__nome', 'descricao_experiencia'
+    ):
+        servicos.setdefault(trabalhador_id, []).extend([tipo, experiencia])
+
+    usuarios = list(User.objects.only('id', 'first_name', 'last_name', 'username'))
+    for usuario in usuarios:
+        partes = [usuario.first_name, usuario.last_name, usuario.username, *servicos.get(usuario.id, [])]
+        usuario.texto_busca = normalizar(' '.join(p for p in partes if p))
+    User.objects.bulk_update(usuarios, ['texto_busca'], batch_size=500)
+
+
+def criar_indice(apps, schema_editor):
+    from core.busca import reconstruir_indice_busca
+
+    reconstruir_indice_busca(schema_editor.connection)
+
+
+def remover_indice(apps, schema_editor):
+    from core.busca import remover_indice_busca
+
+    remover_indice_busca(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_controlejornada_atualizado_em'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='texto_busca',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='Texto de Busca'),
+        ),
+        migrations.RunPython(popular_texto_busca, migrations.RunPython.noop),
+        migrations.RunPython(criar_indice, remover_indice),
+    ]
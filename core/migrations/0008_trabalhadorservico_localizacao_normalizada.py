@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:00
+
+from django.db import migrations, models
+
+
+def popular_localizacao_normalizada(apps, schema_editor):
+    from core.busca import normalizar
+
+    TrabalhadorServico = apps.get_model('core', 'TrabalhadorServico')
+    ofertas = list(TrabalhadorServico.objects.only('id', 'localizacao'))
+    for oferta in ofertas:
+        oferta.localizacao_normalizada = normalizar(oferta.localizacao)
+    TrabalhadorServico.objects.bulk_update(ofertas, ['localizacao_normalizada'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_user_texto_busca'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabalhadorservico',
+            name='localizacao_normalizada',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=200),
+        ),
+        migrations.RunPython(popular_localizacao_normalizada, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:00
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def popular_aceitos(apps, schema_editor):
+    Demanda = apps.get_model('core', 'Demanda')
+    InscricaoDemanda = apps.get_model('core', 'InscricaoDemanda')
+    aceitos = (
+        InscricaoDemanda.objects.filter(demanda=OuterRef('pk'), status='aceito')
+        .values('demanda')
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    Demanda.objects.update(aceitos=Coalesce(Subquery(aceitos), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_trabalhadorservico_localizacao_normalizada'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='demanda',
+            name='aceitos',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Aceitos'),
+        ),
+        migrations.RunPython(popular_aceitos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def popular_feed(apps, schema_editor):
+    from core.matching import reconstruir_feed
+
+    reconstruir_feed(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_demanda_aceitos'),
+        ('disponibilidade', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedDemanda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pontuacao', models.FloatField(default=0, verbose_name='Pontuação')),
+                ('data_servico', models.DateField(verbose_name='Data do Serviço')),
+                ('demanda', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed', to='core.demanda', verbose_name='Demanda')),
+                ('trabalhador', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_demandas', to=settings.AUTH_USER_MODEL, verbose_name='Trabalhador')),
+            ],
+            options={
+                'verbose_name': 'Feed de Demanda',
+                'verbose_name_plural': 'Feed de Demandas',
+                'indexes': [models.Index(fields=['trabalhador', '-pontuacao', 'data_servico'], name='feed_trabalhador_idx')],
+                'unique_together': {('trabalhador', 'demanda')},
+            },
+        ),
+        migrations.RunPython(popular_feed, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def carregar_e_normalizar(apps, schema_editor):
+    from core.localidades import carregar_municipios, normalizar_localizacoes
+
+    carregar_municipios(apps=apps)
+    normalizar_localizacoes(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_feeddemanda'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Municipio',
+            fields=[
+                ('codigo_ibge', models.PositiveIntegerField(primary_key=True, serialize=False, verbose_name='Código IBGE')),
+                ('nome', models.CharField(max_length=100, verbose_name='Nome')),
+                ('uf', models.CharField(max_length=2, verbose_name='UF')),
+                ('nome_normalizado', models.CharField(db_index=True, editable=False, max_length=100)),
+                ('latitude', models.FloatField(verbose_name='Latitude')),
+                ('longitude', models.FloatField(verbose_name='Longitude')),
+                ('grade', models.CharField(db_index=True, editable=False, max_length=20)),
+            ],
+            options={
+                'verbose_name': 'Município',
+                'verbose_name_plural': 'Municípios',
+                'ordering': ['nome'],
+            },
+        ),
+        migrations.AddField(
+            model_name='demanda',
+            name='municipio',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='demandas', to='core.municipio', verbose_name='Município'),
+        ),
+        migrations.AddField(
+            model_name='trabalhadorservico',
+            name='municipio',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ofertas', to='core.municipio', verbose_name='Município'),
+        ),
+        migrations.RunPython(carregar_e_normalizar, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:00
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def popular_agregados(apps, schema_editor):
+    User = apps.get_model('core', 'User')
+    Avaliacao = apps.get_model('core', 'Avaliacao')
+    usuarios = []
+    for linha in Avaliacao.objects.values('avaliado_id').annotate(
+        total=Count('id'),
+        soma=Sum('nota'),
+        **{f'nota_{n}': Count('id', filter=Q(nota=n)) for n in range(1, 6)},
+    ).order_by():
+        usuarios.append(User(
+            pk=linha['avaliado_id'],
+            avaliacoes_total=linha['total'],
+            avaliacoes_soma=linha['soma'],
+            avaliacao_media=Decimal(linha['soma'] / linha['total']).quantize(Decimal('0.01')),
+            **{f'avaliacoes_{n}': linha[f'nota_{n}'] for n in range(1, 6)},
+        ))
+    User.objects.bulk_update(
+        usuarios,
+        ['avaliacoes_total', 'avaliacoes_soma', 'avaliacao_media', *(f'avaliacoes_{n}' for n in range(1, 6))],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_municipio_e_localizacoes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='avaliacoes_total',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Avaliações Recebidas'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='avaliacoes_soma',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='avaliacoes_1',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='avaliacoes_2',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='avaliacoes_3',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='avaliacoes_4',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='avaliacoes_5',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(popular_agregados, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:00
+
+from django.db import migrations, models
+
+
+def popular_ranking(apps, schema_editor):
+    from core.ranking import recalcular_todos
+
+    recalcular_todos(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_user_agregados_avaliacoes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='ranking_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='Pontuação de Ranking'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['role', '-ranking_score'], name='user_ranking_idx'),
+        ),
+        migrations.RunPython(popular_ranking, migrations.RunPython.noop),
+    ]
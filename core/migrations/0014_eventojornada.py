@@ -0,0 +1,89 @@
+# Generated by Django 5.2.5 on 2026-10-18 20:00
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+TRANSICOES = {
+    'nao_iniciada': {'inicio': 'em_andamento'},
+    'em_andamento': {'pausa': 'pausada', 'fim': 'finalizada'},
+    'pausada': {'retorno': 'em_andamento', 'fim': 'finalizada'},
+}
+
+
+def converter_em_eventos(apps, schema_editor):
+    """Cada controle vira a sequência de batidas das colunas hora_*, reproduzida para estado e totais"""
+    ControleJornada = apps.get_model('core', 'ControleJornada')
+    EventoJornada = apps.get_model('core', 'EventoJornada')
+    eventos = []
+    for controle in ControleJornada.objects.exclude(hora_inicio=None).iterator():
+        batidas = [
+            (tipo, momento)
+            for tipo, momento in (
+                ('inicio', controle.hora_inicio), ('pausa', controle.hora_pausa),
+                ('retorno', controle.hora_retorno), ('fim', controle.hora_fim),
+            )
+            if momento is not None
+        ]
+        estado, segundos, ultimo = 'nao_iniciada', 0, None
+        for tipo, momento in batidas:
+            proximo = TRANSICOES.get(estado, {}).get(tipo)
+            if proximo is None:
+                continue
+            if estado == 'em_andamento':
+                segundos += max(int((momento - ultimo).total_seconds()), 0)
+            estado, ultimo = proximo, momento
+            eventos.append(EventoJornada(
+                controle_id=controle.pk, servico_id=controle.servico_id, data=controle.data,
+                tipo=tipo, registrado_em=momento,
+            ))
+        ControleJornada.objects.filter(pk=controle.pk).update(
+            estado=estado, segundos_trabalhados=segundos, ultimo_evento_em=ultimo,
+            total_horas=round(Decimal(segundos) / 3600, 2),
+        )
+    EventoJornada.objects.bulk_create(eventos, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_user_ranking_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='controlejornada',
+            name='estado',
+            field=models.CharField(choices=[('nao_iniciada', 'Não iniciada'), ('em_andamento', 'Em andamento'), ('pausada', 'Pausada'), ('finalizada', 'Finalizada')], default='nao_iniciada', editable=False, max_length=15, verbose_name='Estado'),
+        ),
+        migrations.AddField(
+            model_name='controlejornada',
+            name='segundos_trabalhados',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Segundos Trabalhados'),
+        ),
+        migrations.AddField(
+            model_name='controlejornada',
+            name='ultimo_evento_em',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Último Evento'),
+        ),
+        migrations.CreateModel(
+            name='EventoJornada',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(verbose_name='Data')),
+                ('tipo', models.CharField(choices=[('inicio', 'Início'), ('pausa', 'Pausa'), ('retorno', 'Retorno'), ('fim', 'Fim')], max_length=10, verbose_name='Tipo')),
+                ('registrado_em', models.DateTimeField(verbose_name='Registrado em')),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('controle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='eventos', to='core.controlejornada', verbose_name='Controle de Jornada')),
+                ('servico', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='eventos_jornada', to='core.servico', verbose_name='Serviço')),
+            ],
+            options={
+                'verbose_name': 'Evento de Jornada',
+                'verbose_name_plural': 'Eventos de Jornada',
+                'ordering': ['registrado_em', 'id'],
+                'indexes': [models.Index(fields=['servico', 'data', 'registrado_em'], name='evento_jornada_idx')],
+            },
+        ),
+        migrations.RunPython(converter_em_eventos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 21:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_eventojornada'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventojornada',
+            name='chave_idempotencia',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True, verbose_name='Chave de Idempotência'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-18 22:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_eventojornada_chave_idempotencia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='controlejornada',
+            name='alerta_8h_em',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Alerta de 8h Enviado em'),
+        ),
+        migrations.AddIndex(
+            model_name='controlejornada',
+            index=models.Index(condition=models.Q(('alerta_8h_em__isnull', True), ('estado__in', ['em_andamento', 'pausada'])), fields=['estado'], name='jornada_aberta_idx'),
+        ),
+        migrations.CreateModel(
+            name='Notificacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('jornada_8h', 'Jornada de 8 horas')], max_length=20, verbose_name='Tipo')),
+                ('mensagem', models.CharField(max_length=255, verbose_name='Mensagem')),
+                ('lida', models.BooleanField(default=False, verbose_name='Lida')),
+                ('criada_em', models.DateTimeField(auto_now_add=True, verbose_name='Criada em')),
+                ('servico', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notificacoes', to='core.servico', verbose_name='Serviço')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notificacoes', to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Notificação',
+                'verbose_name_plural': 'Notificações',
+                'ordering': ['-criada_em'],
+                'indexes': [models.Index(fields=['usuario', 'lida', '-criada_em'], name='notificacao_usuario_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:00
+
+from django.db import migrations, models
+
+from core.busca import montar_texto_oferta
+
+
+def preencher_texto_busca(apps, schema_editor):
+    TrabalhadorServico = apps.get_model('core', 'TrabalhadorServico')
+    ofertas = list(TrabalhadorServico.objects.select_related('trabalhador', 'tipo_servico'))
+    for oferta in ofertas:
+        oferta.texto_busca = montar_texto_oferta(oferta)
+    TrabalhadorServico.objects.bulk_update(ofertas, ['texto_busca'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_notificacao_alerta_8h'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabalhadorservico',
+            name='texto_busca',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(preencher_texto_busca, migrations.RunPython.noop),
+    ]
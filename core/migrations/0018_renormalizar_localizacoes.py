@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:00
+
+from django.db import migrations
+
+
+def renormalizar(apps, schema_editor):
+    # Localizações sem UF resolvidas pelo recorte podem apontar para o homônimo errado
+    from core.localidades import normalizar_localizacoes
+
+    normalizar_localizacoes(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_trabalhadorservico_texto_busca'),
+    ]
+
+    operations = [
+        migrations.RunPython(renormalizar, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,20 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Value, When
+from django.db.models.functions import Cast, Greatest, Round
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from decimal import Decimal
 
+from disponibilidade.models import Disponibilidade, dias_do_periodo
+
+from .avaliacoes import agregados_avaliacoes, campos_avaliacoes
+from .busca import montar_texto_busca, montar_texto_oferta, normalizar
+from .localidades import resolver as resolver_municipio
+from .matching import atualizar_feed_demanda, atualizar_feed_trabalhador
+from .ranking import calcular as calcular_ranking
+
 # Create your models here.
 
 class User(AbstractUser):
@@ -42,6 +52,14 @@ class User(AbstractUser):
             MaxValueValidator(Decimal('5.00'))
         ]
     )
+    # Agregados das avaliações recebidas, ajustados a cada avaliação (ajustar_avaliacoes)
+    avaliacoes_total = models.PositiveIntegerField(default=0, editable=False, verbose_name='Avaliações Recebidas')
+    avaliacoes_soma = models.PositiveIntegerField(default=0, editable=False)
+    avaliacoes_1 = models.PositiveIntegerField(default=0, editable=False)
+    avaliacoes_2 = models.PositiveIntegerField(default=0, editable=False)
+    avaliacoes_3 = models.PositiveIntegerField(default=0, editable=False)
+    avaliacoes_4 = models.PositiveIntegerField(default=0, editable=False)
+    avaliacoes_5 = models.PositiveIntegerField(default=0, editable=False)
 
     cpf = models.CharField(
         max_length=14, 
@@ -50,25 +68,99 @@ class User(AbstractUser):
         blank=False,
         verbose_name='CPF'
     )
+    # Média bayesiana + volume + recência (core.ranking): ordem das listagens de trabalhadores
+    ranking_score = models.FloatField(default=0, editable=False, verbose_name='Pontuação de Ranking')
+    # Nome, username, serviços oferecidos e experiência, normalizados (core.busca)
+    texto_busca = models.TextField(
+        blank=True,
+        default='',
+        editable=False,
+        verbose_name='Texto de Busca'
+    )
     
+    # Mantidos por UPDATE direto no banco (ajustar_avaliacoes, core.ranking): um
+    # save() completo de uma instância lida antes gravaria de volta os valores antigos
+    CAMPOS_AGREGADOS = (
+        'avaliacao_media', 'avaliacoes_total', 'avaliacoes_soma',
+        'avaliacoes_1', 'avaliacoes_2', 'avaliacoes_3', 'avaliacoes_4', 'avaliacoes_5',
+        'ranking_score',
+    )
+
     def __str__(self):
         return f"{self.get_full_name() or self.username} ({self.get_role_display()})"
     
+    @property
+    def distribuicao_avaliacoes(self):
+        """[(estrelas, quantidade, percentual)] de 5 a 1, sem consultar as avaliações"""
+        return [
+            (
+                estrelas,
+                getattr(self, f'avaliacoes_{estrelas}'),
+                round(100 * getattr(self, f'avaliacoes_{estrelas}') / self.avaliacoes_total) if self.avaliacoes_total else 0,
+            )
+            for estrelas in range(5, 0, -1)
+        ]
+
+    @classmethod
+    def ajustar_avaliacoes(cls, usuario_id, nota_removida=None, nota_adicionada=None):
+        """Aplica uma avaliação nova, excluída ou com nota alterada aos agregados, em um UPDATE"""
+        delta_total = (nota_adicionada is not None) - (nota_removida is not None)
+        delta_soma = (nota_adicionada or 0) - (nota_removida or 0)
+        campos = {}
+        if delta_total:
+            campos['avaliacoes_total'] = models.F('avaliacoes_total') + delta_total
+        if delta_soma:
+            campos['avaliacoes_soma'] = models.F('avaliacoes_soma') + delta_soma
+        for nota, delta in ((nota_removida, -1), (nota_adicionada, 1)):
+            if nota is not None:
+                campo = f'avaliacoes_{nota}'
+                campos[campo] = campos.get(campo, models.F(campo)) + delta
+        if not campos:
+            return
+        # A média usa os valores já ajustados (o UPDATE enxerga os antigos)
+        novo_total = models.F('avaliacoes_total') + delta_total
+        campos['avaliacao_media'] = Case(
+            When(avaliacoes_total=-delta_total, then=Value(0.0)),
+            default=Round(Cast(models.F('avaliacoes_soma') + delta_soma, models.FloatField()) / novo_total, 2),
+            output_field=models.FloatField(),
+        )
+        cls.objects.filter(pk=usuario_id).update(**campos)
+
     def recalcular_avaliacao_media(self):
-        """Recalcula a avaliação média baseada nas avaliações recebidas"""
-        avaliacoes = self.avaliacoes_recebidas.all()
-        if avaliacoes.exists():
-            total = sum(av.nota for av in avaliacoes)
-            self.avaliacao_media = Decimal(total / avaliacoes.count())
-            self.save()
+        """Refaz os agregados de avaliação a partir das avaliações recebidas (reparo)"""
+        campos = campos_avaliacoes(self.avaliacoes_recebidas.aggregate(**agregados_avaliacoes()))
+        User.objects.filter(pk=self.pk).update(**campos)
+        for campo, valor in campos.items():
+            setattr(self, campo, valor)
     
     class Meta:
         verbose_name = 'Usuário'
         verbose_name_plural = 'Usuários'
+        indexes = [
+            models.Index(fields=['role', '-ranking_score'], name='user_ranking_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if self.is_superuser:
             self.role = 'admin'
+        if self._state.adding and self.role == 'trabalhador':
+            # Sem histórico: só a nota a priori da média bayesiana
+            self.ranking_score = calcular_ranking(self.avaliacoes_total, self.avaliacoes_soma, 0, None)
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None and not self._state.adding and not kwargs.get('force_insert'):
+            # Edição (perfil, admin): grava tudo menos os agregados e os campos não carregados
+            deferidos = self.get_deferred_fields()
+            update_fields = kwargs['update_fields'] = [
+                campo.name for campo in self._meta.concrete_fields
+                if not campo.primary_key and campo.name not in self.CAMPOS_AGREGADOS and campo.attname not in deferidos
+            ]
+
+        # Saves parciais (ex.: last_login no login) só recalculam se o nome mudou
+        if update_fields is None or {'first_name', 'last_name', 'username'} & set(update_fields):
+            self.texto_busca = montar_texto_busca(self)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'texto_busca'}
             
         super().save(*args, **kwargs)
 
@@ -148,10 +240,31 @@ class Servico(models.Model):
     @property
     def jornada_ativa(self):
         """Retorna a jornada ativa se existir"""
-        return self.controles_jornada.filter(
-            hora_inicio__isnull=False,
-            hora_fim__isnull=True
-        ).first()
+        return self.controles_jornada.filter(estado__in=['em_andamento', 'pausada']).first()
+
+    def save(self, *args, **kwargs):
+        # Status gravado antes deste save (não o da instância, que pode estar desatualizada):
+        # só a passagem aceito -> cancelado devolve a agenda (signal liberar_agenda_cancelado)
+        self._status_anterior = None
+        update_fields = kwargs.get('update_fields')
+        if self.status == 'cancelado' and not self._state.adding and (update_fields is None or 'status' in update_fields):
+            self._status_anterior = Servico.objects.filter(pk=self.pk).values_list('status', flat=True).first()
+        super().save(*args, **kwargs)
+
+    def bloquear_agenda(self):
+        """Marca todos os turnos do período do serviço como ocupados na agenda do trabalhador"""
+        Disponibilidade.objects.marcar_periodo(self.trabalhador_id, self.data_servico, self.data_fim)
+        atualizar_feed_trabalhador(self.trabalhador_id)
+
+    def liberar_agenda(self):
+        """Desfaz o bloqueio, mantendo os dias ocupados por outro serviço aceito do trabalhador"""
+        fim = self.data_fim or self.data_servico
+        outros = Servico.objects.filter(
+            trabalhador_id=self.trabalhador_id, status='aceito', data_servico__lte=fim
+        ).exclude(pk=self.pk).values_list('data_servico', 'data_fim')
+        ocupados = {dia for inicio, termino in outros for dia in dias_do_periodo(inicio, termino)}
+        Disponibilidade.objects.liberar_periodo(self.trabalhador_id, self.data_servico, fim, exceto_datas=ocupados)
+        atualizar_feed_trabalhador(self.trabalhador_id)
     
     class Meta:
         verbose_name = 'Serviço'
@@ -195,6 +308,13 @@ class Avaliacao(models.Model):
     def __str__(self):
         return f"Avaliação de {self.avaliador.get_full_name()} para {self.avaliado.get_full_name()} - {self.nota} estrelas"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Guarda a nota e o avaliado gravados: o signal ajusta os agregados pela diferença
+        instancia = super().from_db(db, field_names, values)
+        instancia._gravada = (instancia.__dict__.get('avaliado_id'), instancia.__dict__.get('nota'))
+        return instancia
+
     def save(self, *args, **kwargs):
         # Define automaticamente o avaliado baseado no serviço e avaliador
         if self.avaliador == self.servico.contratante:
@@ -203,7 +323,7 @@ class Avaliacao(models.Model):
             self.avaliado = self.servico.contratante
 
         super().save(*args, **kwargs)
-        # Recálculo da média é feito pelo signal post_save em signals.py
+        # Agregados do avaliado são ajustados pelo signal post_save em signals.py
     
     class Meta:
         verbose_name = 'Avaliação'
@@ -212,6 +332,23 @@ class Avaliacao(models.Model):
 
 
 class ControleJornada(models.Model):
+    ESTADO_CHOICES = [
+        ('nao_iniciada', 'Não iniciada'),
+        ('em_andamento', 'Em andamento'),
+        ('pausada', 'Pausada'),
+        ('finalizada', 'Finalizada'),
+    ]
+    # estado -> {tipo de batida aceita: estado seguinte}
+    TRANSICOES = {
+        'nao_iniciada': {'inicio': 'em_andamento'},
+        'em_andamento': {'pausa': 'pausada', 'fim': 'finalizada'},
+        'pausada': {'retorno': 'em_andamento', 'fim': 'finalizada'},
+    }
+    CAMPOS_EVENTO = [
+        'estado', 'segundos_trabalhados', 'ultimo_evento_em', 'total_horas',
+        'hora_inicio', 'hora_pausa', 'hora_retorno', 'hora_fim', 'atualizado_em',
+    ]
+
     servico = models.ForeignKey(
         Servico,
         on_delete=models.CASCADE,
@@ -253,75 +390,206 @@ class ControleJornada(models.Model):
         null=True,
         verbose_name='Observações'
     )
+    # Estado e segundos trabalhados até ultimo_evento_em, mantidos por registrar_evento();
+    # os campos hora_* acima são só uma projeção de compatibilidade dos eventos
+    estado = models.CharField(
+        max_length=15,
+        choices=ESTADO_CHOICES,
+        default='nao_iniciada',
+        editable=False,
+        verbose_name='Estado'
+    )
+    segundos_trabalhados = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Segundos Trabalhados'
+    )
+    ultimo_evento_em = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Último Evento'
+    )
+    # Versão da linha, usada no ETag do status_jornada_ajax
+    atualizado_em = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Atualizado em'
+    )
+    # Preenchido pelo comando verificar_jornadas ao notificar as 8 horas
+    alerta_8h_em = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Alerta de 8h Enviado em'
+    )
     
     def __str__(self):
         return f"Jornada de {self.servico.trabalhador.get_full_name()} - {self.data} - {self.total_horas}h"
-    
+
+    def registrar_evento(self, tipo, momento=None, chave=None):
+        """Acrescenta uma batida (inicio, pausa, retorno, fim) e atualiza estado e totais
+
+        A linha do controle fica travada durante a gravação; a batida só é
+        aceita se for uma transição válida a partir do estado gravado e não
+        for anterior à última. chave é a chave de idempotência enviada pelo
+        cliente (batidas offline). Retorna o EventoJornada ou None se recusada.
+        """
+        momento = momento or timezone.now()
+        with transaction.atomic():
+            atual = ControleJornada.objects.select_for_update().get(pk=self.pk)
+            novo_estado = self.TRANSICOES.get(atual.estado, {}).get(tipo)
+            if novo_estado is None or (atual.ultimo_evento_em and momento < atual.ultimo_evento_em):
+                return None
+            if atual.estado == 'em_andamento':
+                atual.segundos_trabalhados += int((momento - atual.ultimo_evento_em).total_seconds())
+            atual.estado, atual.ultimo_evento_em = novo_estado, momento
+            atual.total_horas = round(Decimal(atual.segundos_trabalhados) / 3600, 2)
+            # Projeção nas colunas antigas: início e fim do dia, última pausa/retorno
+            if tipo == 'inicio':
+                atual.hora_inicio = momento
+            elif tipo == 'pausa':
+                atual.hora_pausa, atual.hora_retorno = momento, None
+            elif tipo == 'retorno':
+                atual.hora_retorno = momento
+            else:
+                atual.hora_fim = momento
+            evento = EventoJornada.objects.create(
+                controle=atual, servico_id=atual.servico_id, data=atual.data, tipo=tipo, registrado_em=momento,
+                chave_idempotencia=chave,
+            )
+            atual.save()
+        for campo in self.CAMPOS_EVENTO:
+            setattr(self, campo, getattr(atual, campo))
+        return evento
+
+    def segundos_ate(self, momento=None):
+        """Segundos trabalhados contando o trecho em andamento até o momento"""
+        if self.estado != 'em_andamento':
+            return self.segundos_trabalhados
+        momento = momento or timezone.now()
+        return self.segundos_trabalhados + max(int((momento - self.ultimo_evento_em).total_seconds()), 0)
+
     def calcular_total_horas(self):
         """Calcula o total de horas trabalhadas"""
-        if not self.hora_inicio or not self.hora_fim:
-            return Decimal('0.00')
-        
-        # Calcula tempo total
-        tempo_total = self.hora_fim - self.hora_inicio
-        
-        # Se houve pausa, subtrai o tempo da pausa
-        if self.hora_pausa and self.hora_retorno:
-            tempo_pausa = self.hora_retorno - self.hora_pausa
-            tempo_total -= tempo_pausa
-        
-        # Converte para horas decimais
-        horas = Decimal(tempo_total.total_seconds() / 3600)
-        return round(horas, 2)
-    
-    def save(self, *args, **kwargs):
-        # Calcula automaticamente o total de horas se a jornada foi finalizada
-        if self.hora_inicio and self.hora_fim:
-            self.total_horas = self.calcular_total_horas()
-        
-        super().save(*args, **kwargs)
-    
+        return round(Decimal(self.segundos_ate()) / 3600, 2)
+
     @property
     def status_jornada(self):
         """Retorna o status atual da jornada"""
-        if not self.hora_inicio:
-            return 'nao_iniciada'
-        elif self.hora_pausa and not self.hora_retorno:
-            return 'pausada'
-        elif not self.hora_fim:
-            return 'em_andamento'
-        else:
-            return 'finalizada'
-    
+        return self.estado
+
     @property
     def alerta_8_horas(self):
         """Verifica se atingiu 8 horas trabalhadas"""
-        if self.status_jornada in ['em_andamento', 'pausada']:
-            # Calcula horas já trabalhadas até agora
-            agora = timezone.now()
-            if self.status_jornada == 'pausada':
-                tempo_ate_pausa = self.hora_pausa - self.hora_inicio
-                horas_trabalhadas = Decimal(tempo_ate_pausa.total_seconds() / 3600)
-            else:
-                tempo_total = agora - self.hora_inicio
-                if self.hora_pausa and self.hora_retorno:
-                    tempo_pausa = self.hora_retorno - self.hora_pausa
-                    tempo_total -= tempo_pausa
-                elif self.hora_pausa and not self.hora_retorno:
-                    # Está pausado, calcular só até a pausa
-                    tempo_total = self.hora_pausa - self.hora_inicio
-                horas_trabalhadas = Decimal(tempo_total.total_seconds() / 3600)
-            
-            return horas_trabalhadas >= 8
-        elif self.status_jornada == 'finalizada':
-            return self.total_horas >= 8
-        return False
+        return self.estado != 'nao_iniciada' and self.segundos_ate() >= 8 * 3600
     
     class Meta:
         verbose_name = 'Controle de Jornada'
         verbose_name_plural = 'Controles de Jornada'
         ordering = ['-data', '-hora_inicio']
         unique_together = ['servico', 'data']
+        indexes = [
+            # Só as jornadas abertas ainda sem alerta: o que verificar_jornadas percorre
+            models.Index(
+                fields=['estado'],
+                name='jornada_aberta_idx',
+                condition=models.Q(estado__in=['em_andamento', 'pausada'], alerta_8h_em__isnull=True),
+            ),
+        ]
+
+
+class EventoJornada(models.Model):
+    """Batida de ponto; registro somente de inclusão (ControleJornada.registrar_evento)"""
+
+    TIPO_CHOICES = [
+        ('inicio', 'Início'),
+        ('pausa', 'Pausa'),
+        ('retorno', 'Retorno'),
+        ('fim', 'Fim'),
+    ]
+
+    controle = models.ForeignKey(
+        ControleJornada,
+        on_delete=models.CASCADE,
+        related_name='eventos',
+        verbose_name='Controle de Jornada'
+    )
+    servico = models.ForeignKey(
+        Servico,
+        on_delete=models.CASCADE,
+        related_name='eventos_jornada',
+        verbose_name='Serviço'
+    )
+    data = models.DateField(verbose_name='Data')
+    tipo = models.CharField(max_length=10, choices=TIPO_CHOICES, verbose_name='Tipo')
+    registrado_em = models.DateTimeField(verbose_name='Registrado em')
+    # Gerada pelo cliente para batidas enviadas em lote: reenvios não duplicam o evento
+    chave_idempotencia = models.CharField(
+        max_length=64, null=True, blank=True, unique=True, verbose_name='Chave de Idempotência'
+    )
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} — {self.registrado_em:%d/%m/%Y %H:%M}"
+
+    class Meta:
+        verbose_name = 'Evento de Jornada'
+        verbose_name_plural = 'Eventos de Jornada'
+        ordering = ['registrado_em', 'id']
+        indexes = [
+            models.Index(fields=['servico', 'data', 'registrado_em'], name='evento_jornada_idx'),
+        ]
+
+
+class Notificacao(models.Model):
+    """Aviso gerado pelo sistema para um usuário (exibido nos painéis)"""
+
+    TIPO_CHOICES = [
+        ('jornada_8h', 'Jornada de 8 horas'),
+    ]
+
+    usuario = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='notificacoes',
+        verbose_name='Usuário'
+    )
+    servico = models.ForeignKey(
+        Servico,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='notificacoes',
+        verbose_name='Serviço'
+    )
+    tipo = models.CharField(
+        max_length=20,
+        choices=TIPO_CHOICES,
+        verbose_name='Tipo'
+    )
+    mensagem = models.CharField(
+        max_length=255,
+        verbose_name='Mensagem'
+    )
+    lida = models.BooleanField(
+        default=False,
+        verbose_name='Lida'
+    )
+    criada_em = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Criada em'
+    )
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} para {self.usuario.username}"
+
+    class Meta:
+        verbose_name = 'Notificação'
+        verbose_name_plural = 'Notificações'
+        ordering = ['-criada_em']
+        indexes = [
+            models.Index(fields=['usuario', 'lida', '-criada_em'], name='notificacao_usuario_idx'),
+        ]
 
 
 class Mensagem(models.Model):
@@ -358,6 +626,27 @@ class Mensagem(models.Model):
         ordering = ['data_envio']
 
 
+class Municipio(models.Model):
+    """Município do IBGE; carregado por core.localidades (comando carregar_municipios)"""
+
+    codigo_ibge = models.PositiveIntegerField(primary_key=True, verbose_name='Código IBGE')
+    nome = models.CharField(max_length=100, verbose_name='Nome')
+    uf = models.CharField(max_length=2, verbose_name='UF')
+    nome_normalizado = models.CharField(max_length=100, db_index=True, editable=False)
+    latitude = models.FloatField(verbose_name='Latitude')
+    longitude = models.FloatField(verbose_name='Longitude')
+    # Célula da grade usada na busca por raio (localidades.celula)
+    grade = models.CharField(max_length=20, db_index=True, editable=False)
+
+    def __str__(self):
+        return f"{self.nome} - {self.uf}"
+
+    class Meta:
+        verbose_name = 'Município'
+        verbose_name_plural = 'Municípios'
+        ordering = ['nome']
+
+
 class TipoServico(models.Model):
     nome = models.CharField(max_length=100, verbose_name='Nome')
     descricao = models.TextField(blank=True, verbose_name='Descrição')
@@ -412,11 +701,43 @@ class TrabalhadorServico(models.Model):
         blank=True,
         verbose_name='Descrição da Experiência',
     )
+    # localizacao sem acentos/maiúsculas: agrupa "São Paulo" e "sao paulo" nas facetas
+    localizacao_normalizada = models.CharField(
+        max_length=200,
+        blank=True,
+        editable=False,
+        db_index=True,
+    )
+    municipio = models.ForeignKey(
+        Municipio,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='ofertas',
+        verbose_name='Município',
+    )
+    # Nome do trabalhador, tipo e experiência desta oferta, sem acentos (busca do marketplace)
+    texto_busca = models.TextField(
+        blank=True,
+        editable=False,
+    )
     data_cadastro = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"{self.trabalhador.get_full_name()} — {self.tipo_servico.nome}"
 
+    def save(self, *args, **kwargs):
+        self.localizacao_normalizada = normalizar(self.localizacao)
+        self.municipio_id = resolver_municipio(self.localizacao)
+        self.texto_busca = montar_texto_oferta(self)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'localizacao' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'localizacao_normalizada', 'municipio'}
+        if update_fields is not None and {'tipo_servico', 'descricao_experiencia'} & set(update_fields):
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'texto_busca'}
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = 'Trabalhador por Serviço'
         verbose_name_plural = 'Trabalhadores por Serviço'
@@ -456,27 +777,122 @@ class Demanda(models.Model):
     )
     vagas = models.PositiveIntegerField(default=1, verbose_name='Número de Vagas')
     localizacao = models.CharField(max_length=200, blank=True, verbose_name='Localização')
+    municipio = models.ForeignKey(
+        Municipio,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='demandas',
+        verbose_name='Município',
+    )
     status = models.CharField(
         max_length=15,
         choices=STATUS_CHOICES,
         default='aberta',
         verbose_name='Status',
     )
+    # Inscrições com status 'aceito', mantido por InscricaoDemanda.save() e pelo post_delete
+    aceitos = models.PositiveIntegerField(default=0, editable=False, verbose_name='Aceitos')
     data_criacao = models.DateTimeField(auto_now_add=True)
     data_atualizacao = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.titulo} — {self.get_status_display()}"
 
+    def save(self, *args, **kwargs):
+        self.municipio_id = resolver_municipio(self.localizacao)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'localizacao' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'municipio'}
+        super().save(*args, **kwargs)
+
     @property
     def vagas_disponiveis(self):
-        aceitos = self.inscricoes.filter(status='aceito').count()
-        return self.vagas - aceitos
+        return self.vagas - self.aceitos
 
     @property
     def esta_aberta(self):
         return self.status == 'aberta' and self.vagas_disponiveis > 0
 
+    def aceitar_inscricoes(self, inscricoes_ids):
+        """Aceita as inscrições pendentes informadas enquanto houver vaga
+
+        O limite é garantido pelo próprio banco: as vagas são reservadas com um
+        UPDATE condicional (aceitos + n <= vagas, demanda aberta), que não
+        depende de trava de linha (o SQLite ignora select_for_update). Se
+        outro aceite ocupou as vagas no meio tempo, nenhuma linha é alterada e
+        o lote inteiro fica sem vaga. As inscrições mais antigas têm
+        prioridade. Retorna (ids aceitos, ids que ficaram sem vaga).
+        """
+        with transaction.atomic():
+            demanda = Demanda.objects.only('vagas', 'aceitos', 'status').get(pk=self.pk)
+            pendentes = list(
+                demanda.inscricoes.filter(pk__in=inscricoes_ids, status='pendente')
+                .order_by('data_inscricao', 'id').values_list('pk', flat=True)
+            )
+            livres = max(demanda.vagas - demanda.aceitos, 0) if demanda.status == 'aberta' else 0
+            aceitas, sem_vaga = pendentes[:livres], pendentes[livres:]
+            if aceitas and not self._reservar_vagas(len(aceitas)):
+                aceitas, sem_vaga = [], pendentes
+                demanda = Demanda.objects.only('vagas', 'aceitos', 'status').get(pk=self.pk)
+            elif aceitas:
+                agora = timezone.now()
+                aceitas_agora = InscricaoDemanda.objects.filter(pk__in=aceitas, status='pendente').update(
+                    status='aceito', data_atualizacao=agora
+                )
+                if aceitas_agora < len(aceitas):
+                    # Parte já tinha sido aceita por outra requisição: devolve as vagas a mais
+                    self._liberar_vagas(len(aceitas) - aceitas_agora)
+                demanda = Demanda.objects.only('vagas', 'aceitos', 'status').get(pk=self.pk)
+                if demanda.status != 'aberta':
+                    # Lotou: sai do feed dos trabalhadores
+                    transaction.on_commit(lambda: atualizar_feed_demanda(self.pk))
+        self.aceitos, self.status = demanda.aceitos, demanda.status
+        return aceitas, sem_vaga
+
+    def rejeitar_inscricoes(self, inscricoes_ids):
+        """Rejeita as inscrições informadas; as que estavam aceitas devolvem a vaga
+
+        Uma demanda que tinha lotado volta a ficar aberta e a aparecer no feed.
+        """
+        with transaction.atomic():
+            inscricoes = self.inscricoes.filter(pk__in=inscricoes_ids)
+            agora = timezone.now()
+            # Contagens pelas linhas alteradas, não por uma leitura anterior
+            liberadas = inscricoes.filter(status='aceito').update(status='rejeitado', data_atualizacao=agora)
+            rejeitadas = liberadas + inscricoes.filter(status='pendente').update(
+                status='rejeitado', data_atualizacao=agora
+            )
+            if liberadas:
+                self._liberar_vagas(liberadas)
+                transaction.on_commit(lambda: atualizar_feed_demanda(self.pk))
+            demanda = Demanda.objects.only('aceitos', 'status').get(pk=self.pk)
+        self.aceitos, self.status = demanda.aceitos, demanda.status
+        return rejeitadas
+
+    def _reservar_vagas(self, quantidade):
+        """Soma ``quantidade`` a aceitos só se couber nas vagas; lotando, passa a em_andamento"""
+        return Demanda.objects.filter(
+            pk=self.pk, status='aberta', aceitos__lte=models.F('vagas') - quantidade
+        ).update(
+            aceitos=models.F('aceitos') + quantidade,
+            # O UPDATE enxerga os valores antigos: lota quando aceitos + quantidade >= vagas
+            status=Case(
+                When(aceitos__gte=models.F('vagas') - quantidade, then=Value('em_andamento')),
+                default=models.F('status'),
+            ),
+            data_atualizacao=timezone.now(),
+        )
+
+    def _liberar_vagas(self, quantidade):
+        """Devolve vagas; uma demanda que tinha lotado (em_andamento) volta a aberta"""
+        Demanda.objects.filter(pk=self.pk).update(
+            aceitos=Greatest(models.F('aceitos') - quantidade, Value(0), output_field=models.PositiveIntegerField()),
+            status=Case(When(status='em_andamento', then=Value('aberta')), default=models.F('status')),
+            data_atualizacao=timezone.now(),
+        )
+
     class Meta:
         verbose_name = 'Demanda'
         verbose_name_plural = 'Demandas'
@@ -519,8 +935,56 @@ class InscricaoDemanda(models.Model):
     def __str__(self):
         return f"{self.trabalhador.get_full_name()} → {self.demanda.titulo}"
 
+    def save(self, *args, **kwargs):
+        """Salva e ajusta Demanda.aceitos: +1 ao entrar em 'aceito', -1 ao sair"""
+        update_fields = kwargs.get('update_fields')
+        with transaction.atomic():
+            anterior = None
+            if not self._state.adding:
+                # Status gravado no banco, não o da instância (que pode estar desatualizada)
+                anterior = InscricaoDemanda.objects.select_for_update().filter(pk=self.pk).values_list(
+                    'status', flat=True
+                ).first()
+            super().save(*args, **kwargs)
+            if update_fields is not None and 'status' not in update_fields:
+                return
+            delta = (self.status == 'aceito') - (anterior == 'aceito')
+            if delta:
+                Demanda.objects.filter(pk=self.demanda_id).update(aceitos=models.F('aceitos') + delta)
+
     class Meta:
         verbose_name = 'Inscrição em Demanda'
         verbose_name_plural = 'Inscrições em Demandas'
         unique_together = ['demanda', 'trabalhador']
         ordering = ['-data_inscricao']
+
+
+class FeedDemanda(models.Model):
+    """Demanda aberta compatível com um trabalhador, gravada pelo matcher (core.matching)"""
+
+    trabalhador = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='feed_demandas',
+        verbose_name='Trabalhador',
+    )
+    demanda = models.ForeignKey(
+        Demanda,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Demanda',
+    )
+    pontuacao = models.FloatField(default=0, verbose_name='Pontuação')
+    # Cópia de Demanda.data_servico para ordenar o feed pelo próprio índice
+    data_servico = models.DateField(verbose_name='Data do Serviço')
+
+    def __str__(self):
+        return f"{self.trabalhador} ← {self.demanda.titulo} ({self.pontuacao})"
+
+    class Meta:
+        verbose_name = 'Feed de Demanda'
+        verbose_name_plural = 'Feed de Demandas'
+        unique_together = ['trabalhador', 'demanda']
+        indexes = [
+            models.Index(fields=['trabalhador', '-pontuacao', 'data_servico'], name='feed_trabalhador_idx'),
+        ]
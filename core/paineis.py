@@ -0,0 +1,36 @@
+"""
+Totais de serviços por status exibidos nos painéis do contratante e do trabalhador.
+
+Calculados com um único aggregate condicional e guardados no cache por
+PAINEL_CACHE_TIMEOUT segundos. core.signals apaga as chaves dos dois lados
+sempre que um Serviço é salvo ou excluído.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .models import Servico
+
+
+def chave(usuario_id, papel):
+    return f'painel:{papel}:{usuario_id}'
+
+
+def totais_servicos(usuario, papel):
+    """Dict com 'total' e um total por status; papel é 'contratante' ou 'trabalhador'"""
+    totais = cache.get(chave(usuario.id, papel))
+    if totais is None:
+        totais = Servico.objects.filter(**{papel: usuario}).aggregate(
+            total=Count('id'),
+            **{status: Count('id', filter=Q(status=status)) for status, _ in Servico.STATUS_CHOICES}
+        )
+        cache.set(chave(usuario.id, papel), totais, settings.PAINEL_CACHE_TIMEOUT)
+    return totais
+
+
+def invalidar(servico):
+    cache.delete_many([
+        chave(servico.contratante_id, 'contratante'),
+        chave(servico.trabalhador_id, 'trabalhador'),
+    ])
@@ -0,0 +1,73 @@
+"""
+Quadro "quem está trabalhando agora" do contratante.
+
+Lista as jornadas abertas (em andamento ou pausadas) de todos os serviços do
+contratante em uma única consulta com os joins de serviço e trabalhador; o
+tempo do trecho em andamento (agora - última batida) é calculado no banco e
+somado aos segundos já acumulados na linha.
+
+A página consulta um único endpoint JSON para o quadro inteiro, com ETag
+(versao): sem batidas novas e sem jornada correndo a resposta é 304.
+"""
+
+from datetime import timedelta
+
+from django.db.models import Case, Count, DurationField, ExpressionWrapper, F, Max, Q, Value, When
+from django.utils import timezone
+
+from .models import ControleJornada
+
+ESTADOS_ABERTOS = ('em_andamento', 'pausada')
+LIMITE_SEGUNDOS = 8 * 3600
+
+
+def jornadas_abertas(contratante_id):
+    return ControleJornada.objects.filter(servico__contratante_id=contratante_id, estado__in=ESTADOS_ABERTOS)
+
+
+def jornadas_ativas(contratante_id, agora=None):
+    """Uma linha (dict) por jornada aberta, com os segundos trabalhados até agora"""
+    agora = agora or timezone.now()
+    linhas = jornadas_abertas(contratante_id).annotate(
+        decorrido=Case(
+            When(
+                estado='em_andamento',
+                then=ExpressionWrapper(Value(agora) - F('ultimo_evento_em'), output_field=DurationField()),
+            ),
+            default=Value(timedelta(0)),
+            output_field=DurationField(),
+        )
+    ).values(
+        'id', 'data', 'estado', 'hora_inicio', 'segundos_trabalhados', 'decorrido', 'servico_id', 'servico__descricao',
+        'servico__trabalhador__first_name', 'servico__trabalhador__last_name', 'servico__trabalhador__username',
+    ).order_by('servico__trabalhador__first_name', 'servico__trabalhador__username', 'data')
+
+    jornadas = []
+    for linha in linhas:
+        segundos = linha['segundos_trabalhados'] + max(int(linha['decorrido'].total_seconds()), 0)
+        nome = f"{linha['servico__trabalhador__first_name']} {linha['servico__trabalhador__last_name']}".strip()
+        jornadas.append({
+            'id': linha['id'],
+            'servico_id': linha['servico_id'],
+            'servico': linha['servico__descricao'],
+            'trabalhador': nome or linha['servico__trabalhador__username'],
+            'data': linha['data'],
+            'estado': linha['estado'],
+            'hora_inicio': linha['hora_inicio'],
+            'horas': round(segundos / 3600, 2),
+            'alerta_8h': segundos >= LIMITE_SEGUNDOS,
+        })
+    return jornadas
+
+
+def versao(contratante_id):
+    """ETag do quadro: jornadas abertas, última batida e, com alguém trabalhando, o minuto atual"""
+    resumo = jornadas_abertas(contratante_id).aggregate(
+        total=Count('id'),
+        correndo=Count('id', filter=Q(estado='em_andamento')),
+        ultima=Max('atualizado_em'),
+    )
+    # Com jornada correndo as horas mudam sozinhas; a versão vira a cada minuto
+    minuto = int(timezone.now().timestamp() // 60) if resumo['correndo'] else 0
+    ultima = resumo['ultima'].timestamp() if resumo['ultima'] else 0
+    return f"quadro-{contratante_id}-{resumo['total']}-{ultima}-{minuto}"
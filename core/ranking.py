@@ -0,0 +1,69 @@
+"""
+Pontuação de ordenação dos trabalhadores (User.ranking_score, indexada).
+
+A média simples põe um trabalhador com uma única nota 5 à frente de um
+veterano com 200 avaliações e média 4,8. A pontuação combina:
+
+    média bayesiana   (PESO_PRIOR * NOTA_PRIOR + soma) / (PESO_PRIOR + total)
+    volume            PESO_VOLUME * ln(1 + serviços concluídos)
+    recência          PESO_RECENCIA * 0,5 ^ (dias desde o último serviço / MEIA_VIDA_DIAS)
+
+Ela é gravada a cada avaliação e a cada serviço concluído (core.signals); o
+comando recalcular_ranking refaz todos em uma consulta agrupada. Como a
+recência envelhece sem nenhum evento, o comando deve rodar periodicamente
+(diariamente basta).
+"""
+
+import math
+
+from django.apps import apps as apps_global
+from django.db.models import Count, Max, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+NOTA_PRIOR = 3.5
+PESO_PRIOR = 5
+PESO_VOLUME = 0.3
+PESO_RECENCIA = 0.5
+MEIA_VIDA_DIAS = 90
+
+_CONCLUIDOS = Q(servicos_trabalhados__status='concluido')
+
+
+def calcular(total, soma, concluidos, ultimo_servico, hoje=None):
+    media = (PESO_PRIOR * NOTA_PRIOR + soma) / (PESO_PRIOR + total)
+    volume = PESO_VOLUME * math.log1p(concluidos)
+    recencia = 0.0
+    if ultimo_servico is not None:
+        dias = max(((hoje or timezone.localdate()) - ultimo_servico).days, 0)
+        recencia = PESO_RECENCIA * 0.5 ** (dias / MEIA_VIDA_DIAS)
+    return round(media + volume + recencia, 6)
+
+
+def _com_servicos(usuarios):
+    return usuarios.annotate(
+        concluidos=Count('servicos_trabalhados', filter=_CONCLUIDOS),
+        ultimo_servico=Max(
+            Coalesce('servicos_trabalhados__data_fim', 'servicos_trabalhados__data_servico'), filter=_CONCLUIDOS
+        ),
+    ).values_list('pk', 'avaliacoes_total', 'avaliacoes_soma', 'concluidos', 'ultimo_servico')
+
+
+def atualizar(usuario_id):
+    """Recalcula a pontuação de um trabalhador (sem efeito para outros papéis)"""
+    User = apps_global.get_model('core', 'User')
+    linha = _com_servicos(User.objects.filter(pk=usuario_id, role='trabalhador')).first()
+    if linha is not None:
+        User.objects.filter(pk=usuario_id).update(ranking_score=calcular(*linha[1:]))
+
+
+def recalcular_todos(apps=None):
+    """Recalcula a pontuação de todos os trabalhadores; retorna quantos"""
+    User = (apps or apps_global).get_model('core', 'User')
+    hoje = timezone.localdate()
+    usuarios = [
+        User(pk=pk, ranking_score=calcular(total, soma, concluidos, ultimo, hoje))
+        for pk, total, soma, concluidos, ultimo in _com_servicos(User.objects.filter(role='trabalhador')).iterator()
+    ]
+    User.objects.bulk_update(usuarios, ['ranking_score'], batch_size=500)
+    return len(usuarios)
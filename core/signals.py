@@ -1,9 +1,117 @@
-from django.db.models.signals import post_save, post_delete
+from django.db import connections
+from django.db.models.signals import post_save, post_delete, post_migrate
 from django.dispatch import receiver
-from .models import Avaliacao
+from django.db.models import F
+from disponibilidade.models import Disponibilidade
+from .models import Avaliacao, Demanda, InscricaoDemanda, Servico, TipoServico, TrabalhadorServico, User
+from . import busca, marketplace, matching, paineis, ranking
 
 @receiver(post_save, sender=Avaliacao)
+def ajustar_avaliacoes_salva(sender, instance, created, **kwargs):
+    """Avaliação nova ou com nota alterada: ajusta total, soma, histograma e média do avaliado"""
+    avaliado_anterior, nota_anterior = (None, None) if created else getattr(instance, '_gravada', (None, None))
+    if avaliado_anterior is None and not created:
+        # Instância sem o estado gravado (não veio do banco): reparo completo
+        instance.avaliado.recalcular_avaliacao_media()
+    elif avaliado_anterior not in (None, instance.avaliado_id):
+        User.ajustar_avaliacoes(avaliado_anterior, nota_removida=nota_anterior)
+        User.ajustar_avaliacoes(instance.avaliado_id, nota_adicionada=instance.nota)
+    elif nota_anterior != instance.nota:
+        User.ajustar_avaliacoes(instance.avaliado_id, nota_removida=nota_anterior, nota_adicionada=instance.nota)
+    instance._gravada = (instance.avaliado_id, instance.nota)
+    ranking.atualizar(instance.avaliado_id)
+    if avaliado_anterior not in (None, instance.avaliado_id):
+        ranking.atualizar(avaliado_anterior)
+
 @receiver(post_delete, sender=Avaliacao)
-def recalcular_avaliacao_media(sender, instance, **kwargs):
-    """Recalcula a avaliação média quando uma avaliação é criada, atualizada ou deletada"""
-    instance.avaliado.recalcular_avaliacao_media()
+def ajustar_avaliacoes_excluida(sender, instance, **kwargs):
+    avaliado, nota = getattr(instance, '_gravada', (instance.avaliado_id, instance.nota))
+    User.ajustar_avaliacoes(avaliado, nota_removida=nota)
+    ranking.atualizar(avaliado)
+
+@receiver(post_save, sender=Servico)
+@receiver(post_delete, sender=Servico)
+def invalidar_totais_painel(sender, instance, **kwargs):
+    """Mudança de status (ou serviço novo/excluído) desatualiza os totais dos painéis"""
+    paineis.invalidar(instance)
+
+@receiver(post_save, sender=Servico)
+def liberar_agenda_cancelado(sender, instance, **kwargs):
+    """Serviço aceito e depois cancelado devolve à agenda os dias que ocupava
+
+    Um pendente recusado nunca bloqueou a agenda: liberar o período apagaria
+    dias marcados como ocupados pelo próprio trabalhador.
+    """
+    if instance.status == 'cancelado' and getattr(instance, '_status_anterior', None) == 'aceito':
+        instance.liberar_agenda()
+
+@receiver(post_save, sender=Servico)
+@receiver(post_delete, sender=Servico)
+def atualizar_ranking_trabalhador(sender, instance, **kwargs):
+    """Serviço concluído conta no volume e na recência da pontuação do trabalhador"""
+    if instance.status == 'concluido':
+        ranking.atualizar(instance.trabalhador_id)
+
+@receiver(post_save, sender=TrabalhadorServico)
+@receiver(post_delete, sender=TrabalhadorServico)
+def atualizar_busca_trabalhador(sender, instance, **kwargs):
+    """Serviços oferecidos e experiência fazem parte do texto de busca do trabalhador"""
+    busca.atualizar_texto_busca([instance.trabalhador_id])
+
+@receiver(post_save, sender=TipoServico)
+def atualizar_busca_tipo_servico(sender, instance, created, **kwargs):
+    """Tipo renomeado: reindexa quem oferece o serviço e as ofertas dele"""
+    if not created:
+        busca.atualizar_texto_busca(instance.trabalhadores.values_list('trabalhador_id', flat=True))
+        busca.atualizar_texto_ofertas(instance.trabalhadores.all())
+
+@receiver(post_save, sender=User)
+def atualizar_busca_ofertas(sender, instance, created, update_fields=None, **kwargs):
+    """Nome do trabalhador faz parte do texto de busca de cada oferta dele"""
+    campos_nome = {'first_name', 'last_name', 'username'}
+    if not created and instance.role == 'trabalhador' and (update_fields is None or campos_nome & set(update_fields)):
+        busca.atualizar_texto_ofertas(instance.servicos_oferecidos.all())
+
+@receiver(post_save, sender=TrabalhadorServico)
+@receiver(post_delete, sender=TrabalhadorServico)
+@receiver(post_save, sender=TipoServico)
+@receiver(post_delete, sender=TipoServico)
+def invalidar_facetas_marketplace(sender, **kwargs):
+    marketplace.invalidar()
+
+@receiver(post_save, sender=User)
+def invalidar_facetas_trabalhador(sender, instance, update_fields=None, **kwargs):
+    """Só ativar/desativar um trabalhador muda as facetas (login grava last_login)"""
+    if instance.role == 'trabalhador' and (update_fields is None or 'is_active' in update_fields):
+        marketplace.invalidar()
+
+@receiver(post_delete, sender=InscricaoDemanda)
+def liberar_vaga(sender, instance, **kwargs):
+    """Inscrição aceita excluída devolve a vaga da demanda"""
+    if instance.status == 'aceito':
+        Demanda.objects.filter(pk=instance.demanda_id, aceitos__gt=0).update(aceitos=F('aceitos') - 1)
+
+@receiver(post_save, sender=Demanda)
+def atualizar_feed_demanda(sender, instance, **kwargs):
+    """Demanda publicada ou alterada: recalcula quem a recebe no feed"""
+    matching.atualizar_feed_demanda(instance.pk)
+
+@receiver(post_save, sender=TrabalhadorServico)
+@receiver(post_delete, sender=TrabalhadorServico)
+@receiver(post_save, sender=Disponibilidade)
+@receiver(post_delete, sender=Disponibilidade)
+def atualizar_feed_trabalhador(sender, instance, **kwargs):
+    """Serviços oferecidos ou agenda do trabalhador mudaram"""
+    matching.atualizar_feed_trabalhador(instance.trabalhador_id)
+
+@receiver(post_save, sender=User)
+def atualizar_feed_trabalhador_ativo(sender, instance, created, update_fields=None, **kwargs):
+    if instance.role == 'trabalhador' and not created and (update_fields is None or 'is_active' in update_fields):
+        matching.atualizar_feed_trabalhador(instance.pk)
+
+@receiver(post_migrate)
+def garantir_indice_busca(sender, using, **kwargs):
+    """Recria os triggers da busca caso uma migração tenha recriado core_user"""
+    if sender.name != 'core':
+        return
+    busca.criar_indice_busca(connections[using])
@@ -1,3 +1,851 @@
-from django.test import TestCase
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from contratos.models import Contrato
+from disponibilidade.models import Disponibilidade
+
+from . import alertas, busca, folha, localidades, marketplace, quadro, ranking
+from .avaliacoes import recalcular_todos
+from .localidades import municipios_no_raio, resolver
+from .middleware import ContadorConsultasMiddleware
+from .models import (
+    Avaliacao, ControleJornada, Demanda, FeedDemanda, InscricaoDemanda, Notificacao, Servico, TipoServico,
+    TrabalhadorServico, User,
+)
+
+
+class PainelConsultasTest(TestCase):
+    """Os painéis são a página inicial após o login: o número de consultas fica fixo"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.contratante = User.objects.create_user('contratante', password='x', role='contratante')
+        cls.trabalhador = User.objects.create_user('trabalhador', password='x', role='trabalhador')
+        for status in ('pendente', 'pendente', 'concluido', 'cancelado', 'aceito'):
+            servico = Servico.objects.create(
+                contratante=cls.contratante, trabalhador=cls.trabalhador, descricao='Colheita',
+                data_servico=date.today(), valor_acordado=150, status=status,
+            )
+        ControleJornada.objects.create(servico=servico).registrar_evento('inicio', servico.data_criacao)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_painel_contratante_numero_de_consultas(self):
+        self.client.force_login(self.contratante)
+        url = reverse('painel_contratante')
+        self.client.get(url)
+        # sessão, usuário, lista de serviços e notificações; totais e badge vêm do cache
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual(response.context['total_servicos'], 5)
+        self.assertEqual(response.context['servicos_pendentes'], 2)
+        self.assertEqual(response.context['servicos_aceitos'], 1)
+        self.assertEqual(response.context['servicos_concluidos'], 1)
+
+    def test_painel_trabalhador_numero_de_consultas(self):
+        self.client.force_login(self.trabalhador)
+        url = reverse('painel_trabalhador')
+        self.client.get(url)
+        # sessão, usuário, lista de serviços, serviço ativo com a jornada aberta e notificações
+        with self.assertNumQueries(5):
+            response = self.client.get(url)
+        self.assertEqual(response.context['servico_ativo'].status, 'aceito')
+        self.assertEqual(response.context['jornada_ativa'].status_jornada, 'em_andamento')
+        self.assertEqual(response.context['total_servicos'], 5)
+
+    def test_totais_invalidados_quando_servico_muda_de_status(self):
+        self.client.force_login(self.contratante)
+        url = reverse('painel_contratante')
+        self.assertEqual(self.client.get(url).context['servicos_pendentes'], 2)
+
+        servico = Servico.objects.filter(status='pendente').first()
+        servico.status = 'aceito'
+        servico.save()
+
+        response = self.client.get(url)
+        self.assertEqual(response.context['servicos_pendentes'], 1)
+        self.assertEqual(response.context['servicos_aceitos'], 2)
+
+
+class BuscaTrabalhadoresTest(TestCase):
+    """Índice FTS5: sem acentos, por prefixo, em nome, serviços e experiência"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.contratante = User.objects.create(username='contratante', role='contratante')
+        cls.joao = User.objects.create(username='jsilva', first_name='João', last_name='Conceição', role='trabalhador')
+        cls.maria = User.objects.create(username='maria', first_name='Maria', role='trabalhador')
+        colheita = TipoServico.objects.create(nome='Colheita de Café')
+        TrabalhadorServico.objects.create(
+            trabalhador=cls.maria, tipo_servico=colheita, valor_diario=150, descricao_experiencia='Poda e adubação',
+        )
+
+    def buscar(self, termo):
+        return list(busca.buscar_trabalhadores(User.objects.filter(role='trabalhador'), termo).values_list(
+            'username', flat=True
+        ))
+
+    def test_sem_acentos_e_por_prefixo(self):
+        self.assertEqual(self.buscar('joao'), ['jsilva'])
+        self.assertEqual(self.buscar('CONCEICAO'), ['jsilva'])
+        self.assertEqual(self.buscar('conc'), ['jsilva'])
+        self.assertEqual(self.buscar('cafe'), ['maria'])
+        self.assertEqual(self.buscar('adub'), ['maria'])
+        # Todos os termos precisam casar
+        self.assertEqual(self.buscar('maria cafe'), ['maria'])
+        self.assertEqual(self.buscar('joao cafe'), [])
+
+    def test_view_ordena_por_relevancia(self):
+        self.client.force_login(self.contratante)
+        resposta = self.client.get(reverse('buscar_trabalhadores'), {'q': 'Conceicão'})
+        self.assertEqual([t.username for t in resposta.context['trabalhadores']], ['jsilva'])
+        self.assertGreater(resposta.context['trabalhadores'][0].relevancia, 0)
+
+
+class BuscaMarketplaceTest(TestCase):
+    """Tipo e experiência casam com a própria oferta, não com as outras do trabalhador"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.joao = User.objects.create(username='jsilva', first_name='João', role='trabalhador')
+        cls.poda = TipoServico.objects.create(nome='Poda')
+        cls.colheita = TipoServico.objects.create(nome='Colheita')
+        TrabalhadorServico.objects.create(trabalhador=cls.joao, tipo_servico=cls.poda, valor_diario=120)
+        TrabalhadorServico.objects.create(
+            trabalhador=cls.joao, tipo_servico=cls.colheita, valor_diario=150, descricao_experiencia='Café arábica',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def filtros(self, **valores):
+        return marketplace.ler_filtros(valores)
+
+    def tipos(self, q):
+        return list(marketplace.buscar_ofertas(self.filtros(q=q)).values_list('tipo_servico__nome', flat=True))
+
+    def test_termo_casa_com_a_oferta(self):
+        self.assertEqual(self.tipos('poda'), ['Poda'])
+        self.assertEqual(self.tipos('cafe'), ['Colheita'])
+        self.assertEqual(self.tipos('poda cafe'), [])
+        # Nome do trabalhador vale para todas as ofertas dele
+        self.assertEqual(sorted(self.tipos('joao')), ['Colheita', 'Poda'])
+        self.assertEqual(self.tipos('joao poda'), ['Poda'])
+
+    def test_facetas_contam_so_ofertas_que_casam(self):
+        facetas = marketplace.calcular_facetas(self.filtros(q='poda'))
+        self.assertEqual(facetas['tipos_servico'], [{'id': self.poda.pk, 'nome': 'Poda', 'total': 1}])
+        self.assertEqual(facetas['total'], 1)
+
+    def test_renomear_trabalhador_e_tipo_atualiza_ofertas(self):
+        self.joao.first_name = 'Joaquim'
+        self.joao.save()
+        self.assertEqual(sorted(self.tipos('joaquim')), ['Colheita', 'Poda'])
+        self.poda.nome = 'Desbaste'
+        self.poda.save()
+        self.assertEqual(self.tipos('desbaste'), ['Desbaste'])
+        self.assertEqual(self.tipos('poda'), [])
+
+
+class AceiteInscricoesConcorrenteTest(TestCase):
+    """Vários aceites simultâneos nunca ocupam mais vagas do que a demanda oferece"""
+
+    def setUp(self):
+        contratante = User.objects.create_user('contratante', password='x', role='contratante')
+        self.demanda = Demanda.objects.create(
+            contratante=contratante, tipo_servico=TipoServico.objects.create(nome='Colheita'),
+            titulo='Colheita de café', descricao='Turma', data_servico=date.today(),
+            valor_oferecido=120, vagas=5,
+        )
+        self.inscricoes = [
+            InscricaoDemanda.objects.create(
+                demanda=self.demanda,
+                trabalhador=User.objects.create(username=f'trabalhador{i}', role='trabalhador'),
+            ).id
+            for i in range(20)
+        ]
+
+    def test_reserva_condicional_recusa_lote_sem_vaga(self):
+        Demanda.objects.filter(pk=self.demanda.pk).update(aceitos=4)
+        self.assertEqual(self.demanda._reservar_vagas(2), 0)
+        self.assertEqual(self.demanda._reservar_vagas(1), 1)
+
+        self.demanda.refresh_from_db()
+        self.assertEqual(self.demanda.aceitos, 5)
+        self.assertEqual(self.demanda.status, 'em_andamento')
+
+    def test_aceite_com_leitura_desatualizada_respeita_vagas(self):
+        # Outro aceite lota a demanda entre a leitura das vagas e a reserva
+        reservar = Demanda._reservar_vagas
+
+        def concorrente(demanda, quantidade):
+            Demanda.objects.filter(pk=demanda.pk).update(aceitos=5)
+            return reservar(demanda, quantidade)
+
+        with mock.patch.object(Demanda, '_reservar_vagas', concorrente):
+            aceitas, sem_vaga = self.demanda.aceitar_inscricoes(self.inscricoes[:3])
+
+        self.assertEqual(aceitas, [])
+        self.assertEqual(sem_vaga, self.inscricoes[:3])
+        self.assertEqual(self.demanda.aceitos, 5)
+        self.assertFalse(InscricaoDemanda.objects.filter(status='aceito').exists())
+
+    def test_aceite_em_lote(self):
+        contratante = self.demanda.contratante
+        self.client.force_login(contratante)
+        self.client.post(
+            reverse('atualizar_inscricoes_lote', args=[self.demanda.id]),
+            {'acao': 'aceitar', 'inscricoes': self.inscricoes[:8]},
+        )
+        self.demanda.refresh_from_db()
+        self.assertEqual(self.demanda.aceitos, 5)
+        self.assertEqual(InscricaoDemanda.objects.filter(status='aceito').count(), 5)
+
+        self.client.post(
+            reverse('atualizar_inscricoes_lote', args=[self.demanda.id]),
+            {'acao': 'rejeitar', 'inscricoes': self.inscricoes[:2]},
+        )
+        self.demanda.refresh_from_db()
+        self.assertEqual(self.demanda.aceitos, 3)
+
+
+class ContadorAceitosTest(TestCase):
+    """Demanda.aceitos acompanha InscricaoDemanda.save() e a exclusão de inscrições"""
+
+    def setUp(self):
+        contratante = User.objects.create(username='contratante', role='contratante')
+        self.demanda = Demanda.objects.create(
+            contratante=contratante, tipo_servico=TipoServico.objects.create(nome='Colheita'),
+            titulo='Colheita de café', descricao='Turma', data_servico=date.today(),
+            valor_oferecido=120, vagas=3,
+        )
+        self.inscricao = InscricaoDemanda.objects.create(
+            demanda=self.demanda, trabalhador=User.objects.create(username='trabalhador', role='trabalhador'),
+        )
+
+    def aceitos(self):
+        self.demanda.refresh_from_db()
+        return self.demanda.aceitos
+
+    def test_save_ajusta_ao_entrar_e_sair_de_aceito(self):
+        self.inscricao.status = 'aceito'
+        self.inscricao.save()
+        self.assertEqual(self.aceitos(), 1)
+
+        # Salvar de novo, mesmo por uma instância desatualizada, não conta duas vezes
+        self.inscricao.save()
+        copia = InscricaoDemanda.objects.get(pk=self.inscricao.pk)
+        copia.save()
+        self.assertEqual(self.aceitos(), 1)
+
+        self.inscricao.mensagem = 'Olá'
+        self.inscricao.save(update_fields=['mensagem'])
+        self.assertEqual(self.aceitos(), 1)
+
+        self.inscricao.status = 'rejeitado'
+        self.inscricao.save(update_fields=['status'])
+        self.assertEqual(self.aceitos(), 0)
+
+    def test_excluir_inscricao_aceita_libera_vaga(self):
+        self.inscricao.status = 'aceito'
+        self.inscricao.save()
+        self.assertEqual(self.aceitos(), 1)
+        self.inscricao.delete()
+        self.assertEqual(self.aceitos(), 0)
+
+    def test_excluir_inscricao_pendente_nao_altera(self):
+        self.inscricao.delete()
+        self.assertEqual(self.aceitos(), 0)
+
+
+class FeedDemandaTest(TestCase):
+    """O matcher grava o feed na publicação; a lista do trabalhador só o lê"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.contratante = User.objects.create_user('contratante', password='x', role='contratante')
+        cls.trabalhador = User.objects.create_user('trabalhador', password='x', role='trabalhador')
+        cls.colheita = TipoServico.objects.create(nome='Colheita')
+        cls.poda = TipoServico.objects.create(nome='Poda')
+        TrabalhadorServico.objects.create(
+            trabalhador=cls.trabalhador, tipo_servico=cls.colheita, valor_diario=100, localizacao='Ribeirão Preto',
+        )
+
+    def publicar(self, tipo, localizacao='', data=None):
+        return Demanda.objects.create(
+            contratante=self.contratante, tipo_servico=tipo, titulo=f'{tipo.nome} {localizacao}',
+            descricao='Turma', data_servico=data or date.today(), valor_oferecido=120, localizacao=localizacao,
+        )
+
+    def test_feed_ordenado_por_compatibilidade(self):
+        longe = self.publicar(self.colheita, 'Franca')
+        perto = self.publicar(self.colheita, 'ribeirao preto')
+        self.publicar(self.poda, 'Ribeirão Preto')
+
+        feed = FeedDemanda.objects.filter(trabalhador=self.trabalhador)
+        self.assertEqual({linha.demanda_id for linha in feed}, {longe.id, perto.id})
+
+        self.client.force_login(self.trabalhador)
+        resposta = self.client.get(reverse('lista_demandas'))
+        self.assertEqual([d.id for d in resposta.context['demandas']], [perto.id, longe.id])
+
+    def test_agenda_bloqueada_e_demanda_lotada_saem_do_feed(self):
+        amanha = date.today() + timedelta(days=1)
+        demanda = self.publicar(self.colheita, data=amanha)
+        bloqueio = Disponibilidade.objects.create(trabalhador=self.trabalhador, data=amanha, status='bloqueado')
+        self.assertFalse(FeedDemanda.objects.filter(demanda=demanda).exists())
+
+        bloqueio.delete()
+        inscricao = InscricaoDemanda.objects.create(demanda=demanda, trabalhador=self.trabalhador)
+        with self.captureOnCommitCallbacks(execute=True):
+            demanda.aceitar_inscricoes([inscricao.id])
+        self.assertFalse(FeedDemanda.objects.filter(demanda=demanda).exists())
+
+    def test_rejeitar_aceito_reabre_demanda_lotada(self):
+        demanda = self.publicar(self.colheita)
+        inscricao = InscricaoDemanda.objects.create(
+            demanda=demanda, trabalhador=User.objects.create(username='outro', role='trabalhador'),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            demanda.aceitar_inscricoes([inscricao.id])
+        self.assertEqual(demanda.status, 'em_andamento')
+        self.assertFalse(FeedDemanda.objects.filter(demanda=demanda).exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            demanda.rejeitar_inscricoes([inscricao.id])
+        demanda.refresh_from_db()
+        self.assertEqual((demanda.aceitos, demanda.status), (0, 'aberta'))
+        self.assertTrue(FeedDemanda.objects.filter(demanda=demanda, trabalhador=self.trabalhador).exists())
+
+
+class LocalidadesTest(TestCase):
+    """Localizações em texto livre resolvem para o município do IBGE (recorte embutido)"""
+
+    def test_resolver_variacoes_de_escrita(self):
+        for texto in ('ribeirao preto - SP', 'RIBEIRAO PRETO/sp', 'Ribeirão Preto, SP'):
+            self.assertEqual(resolver(texto), 3543402, texto)
+        self.assertEqual(resolver('Sao Jose - SC'), 4216602)
+        self.assertIsNone(resolver('São José - SP'))  # dos Campos ou do Rio Preto: ambíguo
+        self.assertIsNone(resolver('Fazenda Boa Vista - MG'))
+
+    def test_recorte_so_resolve_com_uf(self):
+        # Cascavel (CE), Santa Maria (RN) e Campo Grande (RN) não estão no recorte
+        for texto, codigo in (('Cascavel', 4104808), ('Santa Maria', 4316907), ('Campo Grande', 5002704)):
+            self.assertIsNone(resolver(texto), texto)
+        self.assertEqual(resolver('Cascavel - PR'), 4104808)
+        self.assertIsNone(resolver('Cascavel - CE'))
+        self.assertIsNone(resolver('Ribeirão Preto'))
+
+    def test_lista_completa_resolve_nome_unico(self):
+        # Recorte completado até o total do IBGE com municípios fictícios de nomes únicos
+        with open(localidades.ARQUIVO_PADRAO, encoding='utf-8') as arquivo:
+            linhas = arquivo.read().splitlines()
+        linhas += [
+            f'{9000000 + i},Localidade {i},TO,-10.0,-48.0'
+            for i in range(localidades.TOTAL_MUNICIPIOS - (len(linhas) - 1))
+        ]
+        with tempfile.TemporaryDirectory() as pasta:
+            caminho = Path(pasta) / 'municipios.csv'
+            caminho.write_text('\n'.join(linhas), encoding='utf-8')
+            call_command('carregar_municipios', str(caminho), '--sem-normalizar', stdout=StringIO())
+        # Volta ao recorte (a transação do teste desfaz as linhas fictícias)
+        self.addCleanup(call_command, 'carregar_municipios', '--sem-normalizar', stdout=StringIO())
+
+        self.assertEqual(resolver('Ribeirão Preto'), 3543402)
+        self.assertEqual(resolver('Sao Jose - SP'), None)
+        self.assertEqual(resolver('Sao Jose dos Pinhais'), 4125506)
+
+    def test_municipios_no_raio(self):
+        vizinhos = set(municipios_no_raio(3543402, 50))
+        self.assertIn(3551702, vizinhos)  # Sertãozinho
+        self.assertNotIn(3550308, vizinhos)  # São Paulo
+
+    def test_busca_de_trabalhadores_por_raio(self):
+        contratante = User.objects.create_user('contratante', password='x', role='contratante')
+        colheita = TipoServico.objects.create(nome='Colheita')
+        for i, local in enumerate(('Sertãozinho - SP', 'São Paulo - SP')):
+            oferta = TrabalhadorServico.objects.create(
+                trabalhador=User.objects.create(username=f'trabalhador{i}', role='trabalhador'),
+                tipo_servico=colheita, valor_diario=100, localizacao=local,
+            )
+        self.assertEqual(oferta.municipio_id, 3550308)
+
+        self.client.force_login(contratante)
+        resposta = self.client.get(reverse('lista_trabalhadores'), {'localizacao': 'Ribeirao Preto - SP', 'raio': '50'})
+        self.assertEqual([o.localizacao for o in resposta.context['ofertas']], ['Sertãozinho - SP'])
+
+
+class AgregadosAvaliacoesTest(TestCase):
+    """Total, soma, histograma e média acompanham cada avaliação sem recontar as demais"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.trabalhador = User.objects.create(username='trabalhador', role='trabalhador')
+        cls.contratantes = [User.objects.create(username=f'contratante{i}', role='contratante') for i in range(3)]
+
+    def avaliar(self, contratante, nota):
+        servico = Servico.objects.create(
+            contratante=contratante, trabalhador=self.trabalhador, descricao='Colheita',
+            data_servico=date.today(), valor_acordado=150, status='concluido',
+        )
+        return Avaliacao.objects.create(servico=servico, avaliador=contratante, nota=nota)
+
+    def assertAgregados(self, total, soma, media, histograma):
+        self.trabalhador.refresh_from_db()
+        self.assertEqual(self.trabalhador.avaliacoes_total, total)
+        self.assertEqual(self.trabalhador.avaliacoes_soma, soma)
+        self.assertEqual(float(self.trabalhador.avaliacao_media), media)
+        self.assertEqual([q for _, q, _ in self.trabalhador.distribuicao_avaliacoes], histograma)
+
+    def test_criar_editar_excluir(self):
+        avaliacoes = [self.avaliar(c, nota) for c, nota in zip(self.contratantes, (5, 4, 4))]
+        self.assertAgregados(3, 13, 4.33, [1, 2, 0, 0, 0])
+
+        editada = Avaliacao.objects.get(pk=avaliacoes[1].pk)
+        editada.nota = 1
+        editada.save()
+        self.assertAgregados(3, 10, 3.33, [1, 1, 0, 0, 1])
+
+        Avaliacao.objects.get(pk=avaliacoes[0].pk).delete()
+        self.assertAgregados(2, 5, 2.5, [0, 1, 0, 0, 1])
+
+        Avaliacao.objects.all().delete()
+        self.assertAgregados(0, 0, 0, [0, 0, 0, 0, 0])
+
+    def test_recalcular_todos_repara_agregados(self):
+        for c, nota in zip(self.contratantes, (5, 3, 2)):
+            self.avaliar(c, nota)
+        User.objects.filter(pk=self.trabalhador.pk).update(avaliacoes_total=0, avaliacoes_soma=0, avaliacoes_5=7)
+        with self.assertNumQueries(3):
+            self.assertEqual(recalcular_todos(), 1)
+        self.assertAgregados(3, 10, 3.33, [1, 0, 1, 1, 0])
+
+    def test_salvar_perfil_nao_sobrescreve_agregados(self):
+        # Instância lida antes da avaliação, como a de request.user na edição do perfil
+        self.client.force_login(self.trabalhador)
+        desatualizado = User.objects.get(pk=self.trabalhador.pk)
+        self.avaliar(self.contratantes[0], 4)
+
+        desatualizado.telefone = '16999990000'
+        desatualizado.save()
+        self.assertAgregados(1, 4, 4.0, [0, 1, 0, 0, 0])
+
+        self.avaliar(self.contratantes[1], 2)
+        resposta = self.client.post(reverse('perfil'), {
+            'username': 'trabalhador', 'first_name': 'Zé', 'last_name': '', 'cpf': '529.982.247-25',
+            'email': '', 'telefone': '', 'valor_diario': '120.00',
+        })
+        self.assertRedirects(resposta, reverse('perfil'))
+        self.assertAgregados(2, 6, 3.0, [0, 1, 0, 1, 0])
+        self.assertEqual(self.trabalhador.first_name, 'Zé')
+
+    def test_admin_exibe_agregados_somente_leitura(self):
+        self.avaliar(self.contratantes[0], 4)
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        resposta = self.client.get(reverse('admin:core_user_change', args=[self.trabalhador.pk]))
+        self.assertEqual(resposta.status_code, 200)
+        campos = resposta.context['adminform'].form.fields
+        for campo in ('avaliacao_media', 'avaliacoes_total', 'ranking_score'):
+            self.assertNotIn(campo, campos)
+        self.assertContains(resposta, '4,00')
+
+
+class RankingTest(TestCase):
+    """Um veterano bem avaliado fica à frente de quem tem uma única nota 5"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.contratante = User.objects.create_user('contratante', password='x', role='contratante')
+        cls.novato = User.objects.create(username='novato', role='trabalhador')
+        cls.veterano = User.objects.create(username='veterano', role='trabalhador')
+        cls.sem_historico = User.objects.create(username='sem_historico', role='trabalhador')
+
+    def concluir(self, trabalhador, nota):
+        servico = Servico.objects.create(
+            contratante=self.contratante, trabalhador=trabalhador, descricao='Colheita',
+            data_servico=date.today(), valor_acordado=150, status='concluido',
+        )
+        Avaliacao.objects.create(servico=servico, avaliador=self.contratante, nota=nota)
+
+    def test_ordem_da_busca(self):
+        self.concluir(self.novato, 5)
+        for nota in (5, 5, 5, 4, 5, 5, 4, 5, 5, 5):
+            self.concluir(self.veterano, nota)
+
+        self.client.force_login(self.contratante)
+        resposta = self.client.get(reverse('buscar_trabalhadores'))
+        self.assertEqual(
+            [t.username for t in resposta.context['trabalhadores']], ['veterano', 'novato', 'sem_historico']
+        )
+
+        # O recálculo em lote chega aos mesmos valores do incremental
+        antes = dict(User.objects.filter(role='trabalhador').values_list('username', 'ranking_score'))
+        User.objects.update(ranking_score=0)
+        ranking.recalcular_todos()
+        self.assertEqual(dict(User.objects.filter(role='trabalhador').values_list('username', 'ranking_score')), antes)
+
+    def test_salvar_trabalhador_nao_sobrescreve_ranking(self):
+        desatualizado = User.objects.get(pk=self.novato.pk)
+        inicial = desatualizado.ranking_score
+        self.assertGreater(inicial, 0)  # nota a priori gravada na criação
+
+        self.concluir(self.novato, 5)
+        atual = User.objects.get(pk=self.novato.pk).ranking_score
+        self.assertNotEqual(atual, inicial)
+
+        desatualizado.first_name = 'Novato'
+        desatualizado.save()
+        self.assertEqual(User.objects.get(pk=self.novato.pk).ranking_score, atual)
+
+
+class BloqueioAgendaTest(TestCase):
+    """Aceitar um serviço bloqueia a agenda em número fixo de consultas, qualquer que seja o período"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.contratante = User.objects.create(username='contratante', role='contratante')
+
+    def aceitar(self, dias):
+        trabalhador = User.objects.create(username=f'trabalhador{dias}', role='trabalhador')
+        servico = Servico.objects.create(
+            contratante=self.contratante, trabalhador=trabalhador, descricao='Colheita',
+            data_servico=date.today(), data_fim=date.today() + timedelta(days=dias - 1), valor_acordado=150,
+        )
+        self.client.force_login(trabalhador)
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(reverse('aceitar_servico', args=[servico.id]))
+        servico.refresh_from_db()
+        self.assertEqual(servico.status, 'aceito')
+        return servico, len(consultas)
+
+    def test_numero_de_consultas_nao_depende_do_periodo(self):
+        _, consultas_um_dia = self.aceitar(1)
+        servico, consultas_colheita = self.aceitar(30)
+        self.assertEqual(consultas_um_dia, consultas_colheita)
+        self.assertEqual(Disponibilidade.objects.filter(trabalhador=servico.trabalhador, status='ocupado').count(), 90)
+
+    def test_cancelamento_libera_agenda(self):
+        servico, _ = self.aceitar(5)
+        Disponibilidade.objects.create(
+            trabalhador=servico.trabalhador, data=date.today() + timedelta(days=10), status='bloqueado'
+        )
+        servico.status = 'cancelado'
+        servico.save()
+        self.assertEqual(list(servico.trabalhador.disponibilidades.values_list('status', flat=True)), ['bloqueado'])
+
+        # Salvar de novo o serviço já cancelado não mexe na agenda
+        Disponibilidade.objects.marcar_periodo(servico.trabalhador, date.today())
+        servico.save()
+        self.assertEqual(servico.trabalhador.disponibilidades.filter(status='ocupado').count(), 3)
+
+    def test_cancelamento_nao_depende_do_periodo(self):
+        consultas = []
+        for dias in (1, 30):
+            servico, _ = self.aceitar(dias)
+            servico.status = 'cancelado'
+            with CaptureQueriesContext(connection) as cancelamento:
+                servico.save()
+            self.assertFalse(servico.trabalhador.disponibilidades.exists())
+            consultas.append(len(cancelamento))
+        self.assertEqual(consultas[0], consultas[1])
+
+    def test_recusar_pendente_mantem_dias_ocupados(self):
+        trabalhador = User.objects.create(username='trabalhador', role='trabalhador')
+        servico = Servico.objects.create(
+            contratante=self.contratante, trabalhador=trabalhador, descricao='Colheita',
+            data_servico=date.today(), valor_acordado=150,
+        )
+        # Dia marcado como ocupado pelo próprio trabalhador na agenda
+        Disponibilidade.objects.create(trabalhador=trabalhador, data=date.today(), status='ocupado')
+        self.client.force_login(trabalhador)
+        self.client.get(reverse('recusar_servico', args=[servico.id]))
+        servico.refresh_from_db()
+        self.assertEqual(servico.status, 'cancelado')
+        self.assertEqual(list(trabalhador.disponibilidades.values_list('status', flat=True)), ['ocupado'])
+
+
+class EventosJornadaTest(TestCase):
+    """Batidas de ponto: várias pausas por dia, totais mantidos a cada evento"""
+
+    @classmethod
+    def setUpTestData(cls):
+        contratante = User.objects.create(username='contratante', role='contratante')
+        cls.trabalhador = User.objects.create(username='trabalhador', role='trabalhador')
+        cls.servico = Servico.objects.create(
+            contratante=contratante, trabalhador=cls.trabalhador, descricao='Colheita',
+            data_servico=date.today(), valor_acordado=150, status='aceito',
+        )
+
+    def test_varias_pausas(self):
+        controle = ControleJornada.objects.create(servico=self.servico)
+        inicio = timezone.now() - timedelta(hours=10)
+        for tipo, minutos in (('inicio', 0), ('pausa', 180), ('retorno', 240), ('pausa', 420), ('retorno', 430), ('fim', 550)):
+            self.assertIsNotNone(controle.registrar_evento(tipo, inicio + timedelta(minutes=minutos)), tipo)
+
+        controle.refresh_from_db()
+        self.assertEqual(controle.estado, 'finalizada')
+        self.assertEqual(controle.segundos_trabalhados, (180 + 180 + 120) * 60)
+        self.assertEqual(controle.total_horas, Decimal('8.00'))
+        self.assertTrue(controle.alerta_8_horas)
+        self.assertEqual(controle.eventos.count(), 6)
+        self.assertEqual(controle.hora_retorno, inicio + timedelta(minutes=430))
+
+    def test_transicoes_invalidas_sao_recusadas(self):
+        controle = ControleJornada.objects.create(servico=self.servico)
+        self.assertIsNone(controle.registrar_evento('pausa'))
+        agora = timezone.now()
+        controle.registrar_evento('inicio', agora)
+        self.assertIsNone(controle.registrar_evento('inicio'))
+        self.assertIsNone(controle.registrar_evento('pausa', agora - timedelta(minutes=1)))
+        self.assertEqual(controle.eventos.count(), 1)
+
+    def test_status_ajax_le_uma_linha(self):
+        controle = ControleJornada.objects.create(servico=self.servico)
+        controle.registrar_evento('inicio', timezone.now() - timedelta(hours=2))
+        self.client.force_login(self.trabalhador)
+        dados = self.client.get(reverse('status_jornada_ajax', args=[self.servico.id])).json()
+        self.assertEqual(dados['status'], 'em_andamento')
+        self.assertAlmostEqual(dados['total_horas'], 2, places=1)
+
+    def test_lote_offline_idempotente(self):
+        Contrato.objects.create(
+            servico=self.servico, contratante=self.servico.contratante, trabalhador=self.trabalhador,
+            status='vigente', valor=150, data_inicio=date.today(), descricao_servico='Colheita',
+        )
+        inicio = timezone.now() - timedelta(hours=3)
+        lote = {'acoes': [
+            # Fora de ordem: o servidor ordena pelo horário do aparelho
+            {'chave': 'b', 'acao': 'pausar', 'momento': (inicio + timedelta(hours=1)).isoformat()},
+            {'chave': 'a', 'acao': 'iniciar', 'momento': inicio.isoformat()},
+            {'chave': 'c', 'acao': 'retomar', 'momento': (inicio + timedelta(hours=2)).isoformat()},
+            {'chave': 'd', 'acao': 'pausar', 'momento': (timezone.now() + timedelta(hours=1)).isoformat()},
+        ]}
+        url = reverse('sincronizar_jornada', args=[self.servico.id])
+        self.client.force_login(self.trabalhador)
+
+        resposta = self.client.post(url, lote, content_type='application/json').json()
+        resultados = {r['chave']: r['resultado'] for r in resposta['resultados']}
+        self.assertEqual(resultados, {'a': 'aplicada', 'b': 'aplicada', 'c': 'aplicada', 'd': 'recusada'})
+        self.assertEqual(ControleJornada.objects.get(servico=self.servico).estado, 'em_andamento')
+
+        # Reenvio após uma resposta perdida: nada é aplicado de novo
+        resposta = self.client.post(url, lote, content_type='application/json').json()
+        self.assertEqual([r['resultado'] for r in resposta['resultados'][:3]], ['duplicada'] * 3)
+        controle = ControleJornada.objects.get(servico=self.servico)
+        self.assertEqual(controle.eventos.count(), 3)
+        self.assertEqual(controle.segundos_ate(inicio + timedelta(hours=3)), 2 * 3600)
+
+    def test_lote_com_acao_invalida_ou_chave_repetida(self):
+        Contrato.objects.create(
+            servico=self.servico, contratante=self.servico.contratante, trabalhador=self.trabalhador,
+            status='vigente', valor=150, data_inicio=date.today(), descricao_servico='Colheita',
+        )
+        inicio = timezone.now() - timedelta(hours=2)
+        lote = {'acoes': [
+            {'chave': 'a', 'acao': 'iniciar', 'momento': inicio.isoformat()},
+            # Bem formado, mas não é uma data válida: recusa só esta ação
+            {'chave': 'b', 'acao': 'pausar', 'momento': '2026-02-30T10:00:00'},
+            {'chave': 'a', 'acao': 'iniciar', 'momento': inicio.isoformat()},
+            {'chave': 'c', 'acao': 'pausar'},
+            'lixo',
+            {'chave': 'd', 'acao': 'pausar', 'momento': (inicio + timedelta(hours=1)).isoformat()},
+        ]}
+        self.client.force_login(self.trabalhador)
+        resposta = self.client.post(
+            reverse('sincronizar_jornada', args=[self.servico.id]), lote, content_type='application/json'
+        )
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(
+            [(r['chave'], r['resultado']) for r in resposta.json()['resultados']],
+            [('a', 'aplicada'), ('b', 'recusada'), ('a', 'duplicada'), ('c', 'recusada'), ('', 'recusada'),
+             ('d', 'aplicada')],
+        )
+        self.assertEqual(ControleJornada.objects.get(servico=self.servico).eventos.count(), 2)
+
+    def test_lote_recusado_para_servico_concluido(self):
+        Servico.objects.filter(pk=self.servico.pk).update(status='concluido')
+        lote = {'acoes': [{'chave': 'a', 'acao': 'iniciar', 'momento': timezone.now().isoformat()}]}
+        self.client.force_login(self.trabalhador)
+        resposta = self.client.post(
+            reverse('sincronizar_jornada', args=[self.servico.id]), lote, content_type='application/json'
+        )
+        self.assertEqual(resposta.status_code, 404)
+        self.assertFalse(ControleJornada.objects.filter(servico=self.servico).exists())
+
+
+class FolhaPontoTest(TestCase):
+    """Horas e valores agregados no banco; exportação em streaming"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.contratante = User.objects.create(username='contratante', role='contratante')
+        cls.trabalhador = User.objects.create(username='trabalhador', role='trabalhador', is_staff=True)
+        servico = Servico.objects.create(
+            contratante=cls.contratante, trabalhador=cls.trabalhador, descricao='Colheita',
+            data_servico=date(2025, 1, 31), valor_acordado=300, status='concluido',
+        )
+        # Serviço atravessando o mês: o valor é rateado pelas horas de cada jornada
+        ControleJornada.objects.create(
+            servico=servico, data=date(2025, 1, 31), estado='finalizada', segundos_trabalhados=8 * 3600, total_horas=8,
+        )
+        ControleJornada.objects.create(
+            servico=servico, data=date(2025, 2, 1), estado='finalizada', segundos_trabalhados=4 * 3600, total_horas=4,
+        )
+
+    def test_resumo_por_trabalhador_e_mes(self):
+        linhas = list(folha.resumo(folha.jornadas(date(2025, 1, 1), date(2025, 12, 31))))
+        self.assertEqual([(l['mes'], l['dias'], l['dias_8h'], l['horas'], l['valor']) for l in linhas], [
+            (date(2025, 1, 1), 1, 1, Decimal('8'), Decimal('200')),
+            (date(2025, 2, 1), 1, 0, Decimal('4'), Decimal('100')),
+        ])
+
+        self.client.force_login(self.contratante)
+        resposta = self.client.get(reverse('folha_ponto'), {'inicio': '2025-01-01', 'fim': '2025-12-31', 'por': 'servico'})
+        self.assertContains(resposta, '200,00')
+
+    def test_exportacao_em_streaming(self):
+        self.client.force_login(self.trabalhador)
+        resposta = self.client.get(
+            reverse('exportar_folha_ponto', args=['csv']), {'inicio': '2025-01-01', 'fim': '2025-12-31'}
+        )
+        self.assertTrue(resposta.streaming)
+        conteudo = b''.join(resposta.streaming_content).decode().splitlines()
+        self.assertEqual(conteudo[0].split(',')[:3], ['data', 'servico_id', 'trabalhador'])
+        self.assertEqual(len(conteudo), 3)
+        self.assertTrue(conteudo[1].startswith('2025-01-31,'))
+
+        # Fora da equipe, cada um só exporta os próprios serviços
+        outro = User.objects.create(username='outro', role='contratante')
+        self.client.force_login(outro)
+        resposta = self.client.get(
+            reverse('exportar_folha_ponto', args=['jsonl']), {'inicio': '2025-01-01', 'fim': '2025-12-31'}
+        )
+        self.assertEqual(b''.join(resposta.streaming_content), b'')
+
+    def test_escopo_por_perfil(self):
+        url = reverse('folha_ponto')
+        periodo = {'inicio': '2025-01-01', 'fim': '2025-12-31'}
+        admin = User.objects.create(username='admin', role='admin')
+        self.client.force_login(admin)
+        self.assertEqual(len(self.client.get(url, periodo).context['linhas']), 2)
+
+        # Perfil fora dos conhecidos não vê nada, nem na exportação
+        estranho = User.objects.create(username='estranho', role='contratante')
+        User.objects.filter(pk=estranho.pk).update(role='')
+        self.client.force_login(estranho)
+        self.assertEqual(self.client.get(url, periodo).status_code, 403)
+        self.assertEqual(self.client.get(reverse('exportar_folha_ponto', args=['csv']), periodo).status_code, 403)
+
+
+class AlertaJornadaTest(TestCase):
+    """verificar_jornadas avisa os dois lados uma única vez, sem depender da página aberta"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.contratante = User.objects.create(username='contratante', role='contratante')
+        cls.trabalhador = User.objects.create(username='trabalhador', role='trabalhador')
+        cls.servico = Servico.objects.create(
+            contratante=cls.contratante, trabalhador=cls.trabalhador, descricao='Colheita',
+            data_servico=date.today(), valor_acordado=150, status='aceito',
+        )
+
+    def test_notifica_uma_vez_ao_passar_de_8_horas(self):
+        agora = timezone.now()
+        controle = ControleJornada.objects.create(servico=self.servico)
+        controle.registrar_evento('inicio', agora - timedelta(hours=7, minutes=50))
+        self.assertEqual(alertas.verificar_jornadas(agora), 0)
+
+        with self.assertNumQueries(5):
+            # savepoint, jornadas abertas, notificações, marcação e release
+            self.assertEqual(alertas.verificar_jornadas(agora + timedelta(minutes=15)), 1)
+        self.assertEqual(
+            sorted(Notificacao.objects.values_list('usuario__username', flat=True)), ['contratante', 'trabalhador']
+        )
+        self.assertEqual(alertas.verificar_jornadas(agora + timedelta(minutes=30)), 0)
+        self.assertEqual(Notificacao.objects.count(), 2)
+
+        self.client.force_login(self.contratante)
+        self.assertEqual(len(self.client.get(reverse('painel_contratante')).context['notificacoes']), 1)
+        self.client.post(reverse('marcar_notificacoes_lidas'))
+        self.assertEqual(len(self.client.get(reverse('painel_contratante')).context['notificacoes']), 0)
+
+
+class QuadroJornadasTest(TestCase):
+    """Quadro do contratante: todas as jornadas abertas em uma consulta, com ETag"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.contratante = User.objects.create(username='contratante', role='contratante')
+        agora = timezone.now()
+        for nome, horas, pausar in (('ana', 3, False), ('bruno', 9, False), ('carla', 2, True)):
+            trabalhador = User.objects.create(username=nome, first_name=nome.title(), role='trabalhador')
+            servico = Servico.objects.create(
+                contratante=cls.contratante, trabalhador=trabalhador, descricao='Colheita',
+                data_servico=date.today(), valor_acordado=150, status='aceito',
+            )
+            controle = ControleJornada.objects.create(servico=servico)
+            controle.registrar_evento('inicio', agora - timedelta(hours=horas))
+            if pausar:
+                controle.registrar_evento('pausa', agora - timedelta(hours=1))
+
+    def test_jornadas_ativas_em_uma_consulta(self):
+        with self.assertNumQueries(1):
+            jornadas = quadro.jornadas_ativas(self.contratante.id)
+        self.assertEqual(
+            [(j['trabalhador'], j['estado'], j['alerta_8h']) for j in jornadas],
+            [('Ana', 'em_andamento', False), ('Bruno', 'em_andamento', True), ('Carla', 'pausada', False)],
+        )
+        self.assertAlmostEqual(jornadas[0]['horas'], 3, places=1)
+        # Pausada: só o que foi acumulado até a pausa
+        self.assertAlmostEqual(jornadas[2]['horas'], 1, places=1)
+
+    def test_json_com_etag(self):
+        self.client.force_login(self.contratante)
+        self.assertContains(self.client.get(reverse('quadro_jornadas')), 'Bruno')
+        url = reverse('quadro_jornadas_json')
+        resposta = self.client.get(url)
+        self.assertEqual(len(resposta.json()['jornadas']), 3)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=resposta['ETag']).status_code, 304)
+
+        self.client.force_login(User.objects.get(username='ana'))
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+class ContadorConsultasTest(TestCase):
+    """X-Consultas-BD só quando ligado, e sem forçar views assíncronas para uma thread"""
+
+    def test_desligado_por_padrao(self):
+        self.assertNotIn('X-Consultas-BD', self.client.get(reverse('login')))
+
+    @override_settings(CONTAR_CONSULTAS_BD=True)
+    def test_cabecalho_em_views_sincronas(self):
+        User.objects.create(username='contratante', role='contratante')
+        self.client.force_login(User.objects.get())
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(reverse('painel_contratante'))
+        self.assertEqual(resposta['X-Consultas-BD'], str(len(consultas)))
+
+    @override_settings(CONTAR_CONSULTAS_BD=True)
+    def test_cadeia_assincrona_continua_assincrona(self):
+        async def view(request):
+            return HttpResponse()
+
+        middleware = ContadorConsultasMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        resposta = async_to_sync(middleware)(RequestFactory().get('/'))
+        self.assertNotIn('X-Consultas-BD', resposta)
@@ -39,6 +39,7 @@ urlpatterns = [
     path('demandas/abertas/', views.lista_demandas, name='lista_demandas'),
     path('demandas/<int:demanda_id>/', views.detalhe_demanda, name='detalhe_demanda'),
     path('demandas/inscricao/<int:inscricao_id>/<str:acao>/', views.atualizar_inscricao, name='atualizar_inscricao'),
+    path('demandas/<int:demanda_id>/inscricoes/lote/', views.atualizar_inscricoes_lote, name='atualizar_inscricoes_lote'),
     path('demandas/minhas/', views.minhas_demandas, name='minhas_demandas'),
     path('demandas/minhas-inscricoes/', views.minhas_inscricoes, name='minhas_inscricoes'),
     
@@ -49,5 +50,20 @@ urlpatterns = [
     
     # Controle de jornada
     path('jornada/<int:servico_id>/status/', views.status_jornada_ajax, name='status_jornada_ajax'),
+    path('jornada/<int:servico_id>/sincronizar/', views.sincronizar_jornada, name='sincronizar_jornada'),
     path('jornada/<int:servico_id>/<str:acao>/', views.controle_jornada, name='controle_jornada'),
+
+    # Quadro de jornadas do contratante
+    path('jornadas/quadro/', views.quadro_jornadas, name='quadro_jornadas'),
+    path('jornadas/quadro/dados/', views.quadro_jornadas_json, name='quadro_jornadas_json'),
+
+    # Notificações
+    path('notificacoes/lidas/', views.marcar_notificacoes_lidas, name='marcar_notificacoes_lidas'),
+
+    # Folha de ponto
+    path('folha-ponto/', views.folha_ponto, name='folha_ponto'),
+    path('folha-ponto/exportar/<str:formato>/', views.exportar_folha_ponto, name='exportar_folha_ponto'),
+
+    # Métricas (staff)
+    path('metricas/polling/', views.metricas_polling, name='metricas_polling'),
 ]
@@ -2,15 +2,19 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_POST
 from django.utils import timezone
-from django.db.models import Q, Avg
+from django.utils.dateparse import parse_date, parse_datetime
+from django.db import transaction
+from django.db.models import Q, Avg, Exists, F, FilteredRelation, OuterRef, Subquery
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import PermissionDenied
 from django.core.paginator import Paginator
-from datetime import timedelta, date
+from datetime import date, timedelta
 
 from .models import (
-    User, Servico, Avaliacao, ControleJornada, Mensagem, TipoServico,
+    User, Servico, Avaliacao, ControleJornada, EventoJornada, Mensagem, TipoServico,
     TrabalhadorServico, Demanda, InscricaoDemanda,
 )
 from .forms import (
@@ -21,7 +25,8 @@ from decimal import Decimal
 import json
 
 # --- IMPORTAÇÃO DO DECORATOR ---
-from .decorators import role_required
+from .decorators import role_required, versionado
+from . import busca, folha, localidades, marketplace, metricas, paineis, quadro
 
 # --- VIEWS PÚBLICAS E AUTENTICAÇÃO ---
 
@@ -104,13 +109,17 @@ def perfil_view(request):
 @login_required
 @role_required('contratante')
 def painel_contratante(request):
-    servicos = request.user.servicos_contratados.all()[:10]
+    servicos = request.user.servicos_contratados.select_related('trabalhador')[:10]
+    totais = paineis.totais_servicos(request.user, 'contratante')
+    # Alertas gerados por verificar_jornadas (core.alertas)
+    notificacoes = request.user.notificacoes.filter(lida=False)[:5]
     context = {
         'servicos': servicos,
-        'total_servicos': request.user.servicos_contratados.count(),
-        'servicos_pendentes': request.user.servicos_contratados.filter(status='pendente').count(),
-        'servicos_aceitos': request.user.servicos_contratados.filter(status='aceito').count(),
-        'servicos_concluidos': request.user.servicos_contratados.filter(status='concluido').count(),
+        'notificacoes': notificacoes,
+        'total_servicos': totais['total'],
+        'servicos_pendentes': totais['pendente'],
+        'servicos_aceitos': totais['aceito'],
+        'servicos_concluidos': totais['concluido'],
     }
     return render(request, 'core/painel_contratante.html', context)
 
@@ -122,10 +131,8 @@ def buscar_trabalhadores(request):
     valor_max = request.GET.get('valor_max', '')
     
     trabalhadores = User.objects.filter(role='trabalhador', is_active=True)
-    if query:
-        trabalhadores = trabalhadores.filter(
-            Q(first_name__icontains=query) | Q(last_name__icontains=query) | Q(username__icontains=query)
-        )
+    # Índice sem acentos, por prefixo, em nome, username, serviços e experiência
+    trabalhadores = busca.buscar_trabalhadores(trabalhadores, query)
     if valor_min:
         try: trabalhadores = trabalhadores.filter(valor_diario__gte=Decimal(valor_min))
         except: pass
@@ -133,7 +140,10 @@ def buscar_trabalhadores(request):
         try: trabalhadores = trabalhadores.filter(valor_diario__lte=Decimal(valor_max))
         except: pass
     
-    trabalhadores = trabalhadores.order_by('-avaliacao_media', 'valor_diario')
+    if busca.montar_consulta_fts(query):
+        trabalhadores = trabalhadores.order_by('-pontuacao', '-ranking_score', 'valor_diario')
+    else:
+        trabalhadores = trabalhadores.order_by('-ranking_score', 'valor_diario')
     paginator = Paginator(trabalhadores, 12)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
@@ -203,30 +213,16 @@ def excluir_tipo_servico(request, tipo_id):
 @login_required
 @role_required('contratante')
 def lista_trabalhadores(request):
-    query = request.GET.get('q', '').strip()
-    tipo_id = request.GET.get('tipo_servico', '').strip()
-    localizacao = request.GET.get('localizacao', '').strip()
-    disponivel_agora = request.GET.get('disponivel_agora', '').strip()
-
-    ofertas = TrabalhadorServico.objects.select_related('trabalhador', 'tipo_servico').filter(
-        tipo_servico__ativo=True, trabalhador__is_active=True
-    )
+    filtros = marketplace.ler_filtros(request.GET)
+    paginator = Paginator(marketplace.buscar_ofertas(filtros), 24)
+    ofertas = paginator.get_page(request.GET.get('page'))
 
-    if query:
-        ofertas = ofertas.filter(
-            Q(trabalhador__first_name__icontains=query) | Q(trabalhador__last_name__icontains=query) |
-            Q(trabalhador__username__icontains=query) | Q(tipo_servico__nome__icontains=query) |
-            Q(descricao_experiencia__icontains=query)
-        )
-    if tipo_id: ofertas = ofertas.filter(tipo_servico_id=tipo_id)
-    if localizacao: ofertas = ofertas.filter(localizacao__icontains=localizacao)
-    if disponivel_agora == '1': ofertas = ofertas.filter(disponivel_agora=True)
-
-    ofertas = ofertas.order_by('-disponivel_agora', 'tipo_servico__e_servico_risco', 'trabalhador__first_name')
     context = {
         'ofertas': ofertas,
+        'facetas': marketplace.facetas(filtros),
         'tipos_servico': TipoServico.objects.filter(ativo=True).order_by('nome'),
-        'filtros': {'q': query, 'tipo_servico': tipo_id, 'localizacao': localizacao, 'disponivel_agora': disponivel_agora},
+        'filtros': filtros,
+        'raios': localidades.RAIOS_KM,
     }
     return render(request, 'core/lista_trabalhadores.html', context)
 
@@ -272,38 +268,63 @@ def atualizar_inscricao(request, inscricao_id, acao):
     inscricao = get_object_or_404(InscricaoDemanda.objects.select_related('demanda', 'trabalhador'), id=inscricao_id, demanda__contratante=request.user)
 
     if acao == 'aceitar':
-        if not inscricao.demanda.esta_aberta:
+        aceitas, _ = inscricao.demanda.aceitar_inscricoes([inscricao.id])
+        if not aceitas:
             messages.error(request, 'Demanda sem vagas disponíveis para novo aceite.')
             return redirect('detalhe_demanda', demanda_id=inscricao.demanda_id)
-        inscricao.status = 'aceito'
-        inscricao.save(update_fields=['status', 'data_atualizacao'])
-        if inscricao.demanda.vagas_disponiveis <= 0:
-            inscricao.demanda.status = 'em_andamento'
-            inscricao.demanda.save(update_fields=['status', 'data_atualizacao'])
         messages.success(request, f"Inscrição de {inscricao.trabalhador.get_full_name() or inscricao.trabalhador.username} aceita.")
     elif acao == 'rejeitar':
-        inscricao.status = 'rejeitado'
-        inscricao.save(update_fields=['status', 'data_atualizacao'])
+        inscricao.demanda.rejeitar_inscricoes([inscricao.id])
         messages.info(request, 'Inscrição rejeitada.')
     return redirect('detalhe_demanda', demanda_id=inscricao.demanda_id)
 
+@login_required
+@require_POST
+@role_required('contratante')
+def atualizar_inscricoes_lote(request, demanda_id):
+    # Aceite/rejeição de uma turma inteira em uma requisição (e uma transação)
+    demanda = get_object_or_404(Demanda, id=demanda_id, contratante=request.user)
+    ids = [int(i) for i in request.POST.getlist('inscricoes') if i.isdigit()]
+    acao = request.POST.get('acao')
+
+    if not ids:
+        messages.warning(request, 'Selecione ao menos uma inscrição.')
+    elif acao == 'aceitar':
+        aceitas, sem_vaga = demanda.aceitar_inscricoes(ids)
+        if aceitas: messages.success(request, f'{len(aceitas)} inscrição(ões) aceita(s).')
+        if sem_vaga: messages.error(request, f'{len(sem_vaga)} inscrição(ões) não aceita(s): vagas esgotadas.')
+        if not aceitas and not sem_vaga: messages.info(request, 'Nenhuma inscrição pendente selecionada.')
+    elif acao == 'rejeitar':
+        rejeitadas = demanda.rejeitar_inscricoes(ids)
+        messages.info(request, f'{rejeitadas} inscrição(ões) rejeitada(s).')
+    return redirect('detalhe_demanda', demanda_id=demanda.id)
+
 
 # --- ROTAS EXCLUSIVAS DE TRABALHADOR ---
 
 @login_required
 @role_required('trabalhador')
 def painel_trabalhador(request):
-    servicos = request.user.servicos_trabalhados.all()[:10]
-    servico_ativo = request.user.servicos_trabalhados.filter(status='aceito').first()
-    jornada_ativa = servico_ativo.jornada_ativa if servico_ativo else None
+    servicos = request.user.servicos_trabalhados.select_related('contratante')[:10]
+    # Serviço ativo e sua jornada aberta (mesmo critério de Servico.jornada_ativa) em uma consulta
+    servico_ativo = request.user.servicos_trabalhados.filter(status='aceito').annotate(
+        jornada=FilteredRelation('controles_jornada', condition=Q(
+            controles_jornada__estado__in=['em_andamento', 'pausada']
+        ))
+    ).select_related('contratante', 'jornada').order_by('-data_criacao', '-jornada__data').first()
+    jornada_ativa = servico_ativo.jornada if servico_ativo else None
+    totais = paineis.totais_servicos(request.user, 'trabalhador')
+    # Alertas gerados por verificar_jornadas (core.alertas)
+    notificacoes = request.user.notificacoes.filter(lida=False)[:5]
     
     context = {
         'servicos': servicos,
         'servico_ativo': servico_ativo,
         'jornada_ativa': jornada_ativa,
-        'total_servicos': request.user.servicos_trabalhados.count(),
-        'servicos_pendentes': request.user.servicos_trabalhados.filter(status='pendente').count(),
-        'servicos_concluidos': request.user.servicos_trabalhados.filter(status='concluido').count(),
+        'notificacoes': notificacoes,
+        'total_servicos': totais['total'],
+        'servicos_pendentes': totais['pendente'],
+        'servicos_concluidos': totais['concluido'],
     }
     return render(request, 'core/painel_trabalhador.html', context)
 
@@ -318,17 +339,8 @@ def aceitar_servico(request, servico_id):
         else:
             servico.status = 'aceito'
             servico.save()
-            # Bloqueio de agenda [ETAPA 6]
-            from disponibilidade.models import Disponibilidade
-            data_ini = servico.data_servico
-            data_fim = servico.data_fim or data_ini
-            atual = data_ini
-            while atual <= data_fim:
-                for turno in ['manha', 'tarde', 'integral']:
-                    Disponibilidade.objects.update_or_create(
-                        trabalhador=servico.trabalhador, data=atual, turno=turno, defaults={'status': 'ocupado'}
-                    )
-                atual += timedelta(days=1)
+            # Bloqueio de agenda [ETAPA 6]: período inteiro em um único upsert
+            servico.bloquear_agenda()
             messages.success(request, 'Serviço aceito! Preencha os dados básicos para gerar o contrato.')
             return redirect('contratos:gerar_contrato', servico_id=servico.id)
     else:
@@ -359,30 +371,19 @@ def controle_jornada(request, servico_id, acao):
         if not servico.pode_iniciar_jornada:
             messages.error(request, 'Não é possível iniciar antes que o contrato esteja assinado e vigente.')
             return redirect('detalhes_servico', servico_id=servico.id)
-        if not controle.hora_inicio:
-            controle.hora_inicio = agora
-            controle.save()
-            messages.success(request, 'Jornada de trabalho iniciada!')
+        if controle.registrar_evento('inicio', agora): messages.success(request, 'Jornada de trabalho iniciada!')
         else: messages.warning(request, 'Jornada já foi iniciada hoje.')
     
     elif acao == 'pausar':
-        if controle.hora_inicio and not controle.hora_pausa:
-            controle.hora_pausa = agora
-            controle.save()
-            messages.success(request, 'Pausa para almoço iniciada!')
+        if controle.registrar_evento('pausa', agora): messages.success(request, 'Pausa iniciada!')
         else: messages.warning(request, 'Não é possível pausar agora.')
     
     elif acao == 'retomar':
-        if controle.hora_pausa and not controle.hora_retorno:
-            controle.hora_retorno = agora
-            controle.save()
-            messages.success(request, 'Trabalho retomado!')
+        if controle.registrar_evento('retorno', agora): messages.success(request, 'Trabalho retomado!')
         else: messages.warning(request, 'Não é possível retomar agora.')
     
     elif acao == 'finalizar':
-        if controle.hora_inicio and not controle.hora_fim:
-            controle.hora_fim = agora
-            controle.save()
+        if controle.registrar_evento('fim', agora):
             servico.status = 'concluido'
             servico.save()
             total_horas = controle.total_horas
@@ -391,6 +392,88 @@ def controle_jornada(request, servico_id, acao):
         else: messages.warning(request, 'Não é possível finalizar agora.')
     return redirect('detalhes_servico', servico_id=servico.id)
 
+# Batidas enviadas em lote (fila offline da página do serviço)
+ACOES_JORNADA = {'iniciar': 'inicio', 'pausar': 'pausa', 'retomar': 'retorno', 'finalizar': 'fim'}
+TOLERANCIA_FUTURO = timedelta(minutes=5)
+PRAZO_SINCRONIZACAO = timedelta(days=7)
+LIMITE_LOTE_JORNADA = 50
+
+def _ler_acao_jornada(dados):
+    """Uma ação do lote; campo ausente ou inválido vira None e só esta ação é recusada"""
+    if not isinstance(dados, dict):
+        dados = {}
+    acao, momento = dados.get('acao'), dados.get('momento')
+    try:
+        # Bem formado mas impossível ("2026-02-30T10:00") levanta ValueError
+        momento = parse_datetime(momento) if isinstance(momento, str) else None
+    except ValueError:
+        momento = None
+    if momento is not None and timezone.is_naive(momento):
+        momento = timezone.make_aware(momento)
+    return {
+        'chave': str(dados.get('chave') or '')[:64],
+        'tipo': ACOES_JORNADA.get(acao) if isinstance(acao, str) else None,
+        'momento': momento,
+    }
+
+@login_required
+@require_POST
+@role_required('trabalhador')
+def sincronizar_jornada(request, servico_id):
+    """Aplica em uma transação as batidas registradas offline, na ordem do horário do aparelho
+
+    Corpo: {"acoes": [{"chave": "<uuid>", "acao": "iniciar|pausar|retomar|finalizar",
+    "momento": "<ISO 8601>"}]}. Cada ação volta, na ordem enviada, como aplicada,
+    duplicada (chave já recebida, inclusive antes no mesmo lote) ou recusada, junto
+    com o estado reconciliado da jornada do dia. Só serviços aceitos recebem
+    lotes: depois do fim da jornada (serviço concluído) o ponto está fechado.
+    """
+    servico = get_object_or_404(Servico, id=servico_id, trabalhador=request.user, status='aceito')
+    try:
+        acoes = json.loads(request.body)['acoes']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'erro': 'Lote inválido.'}, status=400)
+    if not isinstance(acoes, list):
+        return JsonResponse({'erro': 'Lote inválido.'}, status=400)
+    acoes = [_ler_acao_jornada(dados) for dados in acoes[:LIMITE_LOTE_JORNADA]]
+
+    agora = timezone.now()
+    with transaction.atomic():
+        recebidas = set(EventoJornada.objects.filter(
+            chave_idempotencia__in=[a['chave'] for a in acoes if a['chave']]
+        ).values_list('chave_idempotencia', flat=True))
+        validas = []
+        for acao in acoes:
+            momento = acao['momento']
+            if acao['chave'] in recebidas:
+                acao['resultado'] = 'duplicada'
+            elif not acao['chave'] or acao['tipo'] is None or momento is None or not (agora - PRAZO_SINCRONIZACAO <= momento <= agora + TOLERANCIA_FUTURO):
+                acao['resultado'] = 'recusada'
+            else:
+                validas.append(acao)
+                recebidas.add(acao['chave'])
+
+        for acao in sorted(validas, key=lambda a: a['momento']):
+            momento = min(acao['momento'], agora)
+            dia = timezone.localdate(momento)
+            if acao['tipo'] == 'inicio':
+                controle = None
+                if servico.pode_iniciar_jornada:
+                    controle, _ = ControleJornada.objects.get_or_create(servico=servico, data=dia)
+            else:
+                # Pausa/retorno/fim continuam a jornada aberta, mesmo que ela tenha começado na véspera
+                controle = ControleJornada.objects.filter(servico=servico, data__lte=dia).order_by('-data').first()
+            evento = controle.registrar_evento(acao['tipo'], momento, chave=acao['chave']) if controle else None
+            acao['resultado'] = 'aplicada' if evento else 'recusada'
+            if evento and acao['tipo'] == 'fim' and servico.status != 'concluido':
+                servico.status = 'concluido'
+                servico.save()
+
+    return JsonResponse({
+        'resultados': [{'chave': a['chave'], 'resultado': a['resultado']} for a in acoes],
+        'jornada': status_jornada_json(servico),
+    })
+
 @login_required
 @role_required('trabalhador')
 def meus_servicos(request):
@@ -436,21 +519,29 @@ def lista_demandas(request):
     q = request.GET.get('q', '').strip()
     tipo_servico = request.GET.get('tipo_servico', '').strip()
     localizacao = request.GET.get('localizacao', '').strip()
+    raio = localidades.ler_raio(request.GET.get('raio', ''))
     somente_compativeis = request.GET.get('somente_compativeis', '1')
 
     tipo_ids_trabalhador = list(request.user.servicos_oferecidos.values_list('tipo_servico_id', flat=True))
     demandas = Demanda.objects.select_related('tipo_servico', 'contratante').filter(status='aberta')
 
-    if somente_compativeis == '1': demandas = demandas.filter(tipo_servico_id__in=tipo_ids_trabalhador)
+    if somente_compativeis == '1':
+        # Feed pré-calculado pelo matcher (core.matching): leitura pelo índice do trabalhador
+        demandas = demandas.filter(feed__trabalhador=request.user).annotate(compatibilidade=F('feed__pontuacao'))
+        ordenacao = ('-compatibilidade', 'data_servico', '-data_criacao', 'id')
+    else:
+        ordenacao = ('data_servico', '-data_criacao', 'id')
     if q:
         demandas = demandas.filter(
             Q(titulo__icontains=q) | Q(descricao__icontains=q) | Q(tipo_servico__nome__icontains=q) |
             Q(contratante__first_name__icontains=q) | Q(contratante__last_name__icontains=q)
         )
     if tipo_servico: demandas = demandas.filter(tipo_servico_id=tipo_servico)
-    if localizacao: demandas = demandas.filter(localizacao__icontains=localizacao)
+    if localizacao: demandas = localidades.filtrar_por_localizacao(demandas, localizacao, raio)
 
-    demandas = [d for d in demandas.order_by('data_servico', '-data_criacao') if d.vagas_disponiveis > 0]
+    # Vagas livres pelo contador Demanda.aceitos, direto no SQL
+    demandas = demandas.filter(aceitos__lt=F('vagas')).order_by(*ordenacao)
+    demandas = Paginator(demandas, 20).get_page(request.GET.get('page'))
     inscricoes_ids = set(request.user.inscricoes_demandas.values_list('demanda_id', flat=True))
 
     context = {
@@ -458,7 +549,8 @@ def lista_demandas(request):
         'tipo_ids_trabalhador': tipo_ids_trabalhador,
         'inscricoes_ids': inscricoes_ids,
         'tipos_servico': request.user.servicos_oferecidos.select_related('tipo_servico').values_list('tipo_servico__id', 'tipo_servico__nome').distinct(),
-        'filtros': {'q': q, 'tipo_servico': tipo_servico, 'localizacao': localizacao, 'somente_compativeis': somente_compativeis},
+        'filtros': {'q': q, 'tipo_servico': tipo_servico, 'localizacao': localizacao, 'raio': raio, 'somente_compativeis': somente_compativeis},
+        'raios': localidades.RAIOS_KM,
     }
     return render(request, 'core/lista_demandas.html', context)
 
@@ -557,46 +649,47 @@ def lista_tipos_servico(request):
     tipos = TipoServico.objects.all().order_by('nome')
     return render(request, 'core/tipos_servico_lista.html', {'tipos': tipos})
 
+def versao_status_jornada(request, servico_id):
+    """Versão do status da jornada em uma consulta: serviço, contrato e controle do dia"""
+    hoje = timezone.now().date()
+    controle = ControleJornada.objects.filter(servico=OuterRef('pk'), data=hoje)
+    correndo = controle.filter(estado='em_andamento')
+    versao = Servico.objects.filter(id=servico_id, trabalhador=request.user).annotate(
+        jornada_atualizada=Subquery(controle.values('atualizado_em')[:1]), jornada_correndo=Exists(correndo)
+    ).values_list('status', 'contrato_formal__status', 'jornada_atualizada', 'jornada_correndo').first()
+    if versao is None:
+        return None
+    status, status_contrato, atualizada, jornada_correndo = versao
+    # Com a jornada correndo o total de horas muda sozinho; a versão vira a cada minuto
+    minuto = int(timezone.now().timestamp() // 60) if jornada_correndo else 0
+    atualizada = atualizada.timestamp() if atualizada else 0
+    return f'jornada-{servico_id}-{hoje}-{status}-{status_contrato}-{atualizada}-{minuto}'
+
 @login_required
+@versionado(versao_status_jornada, 'status_jornada')
 def status_jornada_ajax(request, servico_id):
     # AQUI ADICIONADO NOT IS_SUPERUSER (Retorna JSON)
     if request.user.role != 'trabalhador' and not request.user.is_superuser:
         return JsonResponse({'error': 'Acesso negado'}, status=403)
     
     servico = get_object_or_404(Servico, id=servico_id, trabalhador=request.user)
-    hoje = timezone.now().date()
-    try:
-        controle = ControleJornada.objects.get(servico=servico, data=hoje)
-        horas_atuais = 0
-        if controle.status_jornada in ['em_andamento', 'pausada']:
-            agora = timezone.now()
-            if controle.status_jornada == 'pausada':
-                tempo_ate_pausa = controle.hora_pausa - controle.hora_inicio
-                horas_atuais = float(Decimal(tempo_ate_pausa.total_seconds() / 3600))
-            else:
-                tempo_total = agora - controle.hora_inicio
-                if controle.hora_pausa and controle.hora_retorno:
-                    tempo_pausa = controle.hora_retorno - controle.hora_pausa
-                    tempo_total -= tempo_pausa
-                elif controle.hora_pausa and not controle.hora_retorno:
-                    tempo_total = controle.hora_pausa - controle.hora_inicio
-                horas_atuais = float(Decimal(tempo_total.total_seconds() / 3600))
-        elif controle.status_jornada == 'finalizada':
-            horas_atuais = float(controle.total_horas)
-        
-        return JsonResponse({
-            'status': controle.status_jornada, 'alerta_8h': controle.alerta_8_horas, 'total_horas': horas_atuais,
-            'hora_inicio': controle.hora_inicio.strftime('%H:%M') if controle.hora_inicio else None,
-            'hora_pausa': controle.hora_pausa.strftime('%H:%M') if controle.hora_pausa else None,
-            'hora_retorno': controle.hora_retorno.strftime('%H:%M') if controle.hora_retorno else None,
-            'hora_fim': controle.hora_fim.strftime('%H:%M') if controle.hora_fim else None,
-            'pode_iniciar': servico.pode_iniciar_jornada, 'contrato_pendente': not servico.pode_iniciar_jornada
-        })
-    except ControleJornada.DoesNotExist:
-        return JsonResponse({
-            'status': 'nao_iniciada', 'alerta_8h': False, 'total_horas': 0,
-            'pode_iniciar': servico.pode_iniciar_jornada, 'contrato_pendente': not servico.pode_iniciar_jornada
-        })
+    return JsonResponse(status_jornada_json(servico))
+
+def status_jornada_json(servico):
+    controle = ControleJornada.objects.filter(servico=servico, data=timezone.now().date()).first()
+    # Estado e segundos acumulados vêm prontos da linha (mantidos a cada batida)
+    dados = controle_jornada_json(controle) if controle else {'status': 'nao_iniciada', 'alerta_8h': False, 'total_horas': 0}
+    dados.update({'pode_iniciar': servico.pode_iniciar_jornada, 'contrato_pendente': not servico.pode_iniciar_jornada})
+    return dados
+
+def controle_jornada_json(controle):
+    def hora(momento): return momento.strftime('%H:%M') if momento else None
+    return {
+        'status': controle.estado, 'alerta_8h': controle.alerta_8_horas,
+        'total_horas': round(controle.segundos_ate() / 3600, 2),
+        'hora_inicio': hora(controle.hora_inicio), 'hora_pausa': hora(controle.hora_pausa),
+        'hora_retorno': hora(controle.hora_retorno), 'hora_fim': hora(controle.hora_fim),
+    }
 
 @login_required
 @require_POST
@@ -611,4 +704,89 @@ def toggle_disponivel_agora(request, servico_id):
 
     return JsonResponse({
         'ok': True, 'disponivel_agora': servico_oferecido.disponivel_agora, 'mensagem': 'Disponibilidade atualizada.'
-    })
\ No newline at end of file
+    })
+
+# --- QUADRO DE JORNADAS (CONTRATANTE) ---
+
+@login_required
+@role_required('contratante')
+def quadro_jornadas(request):
+    return render(request, 'core/quadro_jornadas.html', {'jornadas': quadro.jornadas_ativas(request.user.id)})
+
+def versao_quadro_jornadas(request):
+    if not request.user.is_authenticated:
+        return None
+    return quadro.versao(request.user.id)
+
+@login_required
+@versionado(versao_quadro_jornadas, 'quadro_jornadas')
+def quadro_jornadas_json(request):
+    """Todas as jornadas abertas do contratante em uma resposta (um único polling por página)"""
+    if request.user.role != 'contratante' and not request.user.is_superuser:
+        return JsonResponse({'error': 'Acesso negado'}, status=403)
+
+    jornadas = quadro.jornadas_ativas(request.user.id)
+    for jornada in jornadas:
+        jornada['data'] = jornada['data'].isoformat()
+        jornada['hora_inicio'] = timezone.localtime(jornada['hora_inicio']).strftime('%H:%M') if jornada['hora_inicio'] else None
+    return JsonResponse({'jornadas': jornadas})
+
+@login_required
+@require_POST
+def marcar_notificacoes_lidas(request):
+    request.user.notificacoes.filter(lida=False).update(lida=True)
+    return redirect('home')
+
+# --- FOLHA DE PONTO ---
+
+def _ler_data(valor):
+    try:
+        return parse_date(valor or '')
+    except ValueError:
+        return None
+
+def _jornadas_folha(request):
+    """Jornadas do período pedido
+
+    Administradores e equipe veem todas; contratantes e trabalhadores, só os
+    próprios serviços; qualquer outro perfil recebe 403.
+    """
+    usuario = request.user
+    if usuario.role == 'admin' or usuario.is_staff:
+        escopo = {}
+    elif usuario.role in ('contratante', 'trabalhador'):
+        escopo = {usuario.role: usuario}
+    else:
+        raise PermissionDenied
+    hoje = timezone.localdate()
+    inicio = _ler_data(request.GET.get('inicio')) or hoje.replace(day=1)
+    fim = _ler_data(request.GET.get('fim')) or hoje
+    return folha.jornadas(inicio, fim, **escopo), inicio, fim
+
+@login_required
+def folha_ponto(request):
+    jornadas, inicio, fim = _jornadas_folha(request)
+    padrao = 'servico' if request.user.role == 'trabalhador' and not request.user.is_staff else 'trabalhador'
+    por = request.GET.get('por') if request.GET.get('por') in folha.AGRUPAMENTOS else padrao
+    context = {
+        'linhas': folha.resumo(jornadas, por), 'por': por, 'agrupamentos': folha.AGRUPAMENTOS,
+        'inicio': inicio, 'fim': fim,
+    }
+    return render(request, 'core/folha_ponto.html', context)
+
+@login_required
+def exportar_folha_ponto(request, formato):
+    if formato not in ('csv', 'jsonl'):
+        raise Http404
+    jornadas, inicio, fim = _jornadas_folha(request)
+    if formato == 'csv':
+        resposta = StreamingHttpResponse(folha.exportar_csv(jornadas), content_type='text/csv; charset=utf-8')
+    else:
+        resposta = StreamingHttpResponse(folha.exportar_jsonl(jornadas), content_type='application/x-ndjson')
+    resposta['Content-Disposition'] = f'attachment; filename="folha-ponto-{inicio}-{fim}.{formato}"'
+    return resposta
+
+@staff_member_required
+def metricas_polling(request):
+    """Contadores de 304 x 200 dos endpoints de polling (core.metricas)"""
+    return JsonResponse(metricas.resumo())
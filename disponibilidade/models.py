@@ -1,4 +1,44 @@
-from django.db import models
+from datetime import timedelta
+
+from django.db import models, transaction
+
+
+def dias_do_periodo(inicio, fim=None):
+    """Datas de inicio a fim (inclusive); sem fim, só o dia de início"""
+    return [inicio + timedelta(days=n) for n in range(((fim or inicio) - inicio).days + 1)]
+
+
+class DisponibilidadeManager(models.Manager):
+    """Operações em lote sobre a agenda: um período inteiro em poucas consultas"""
+
+    def marcar_periodo(self, trabalhador, inicio, fim=None, status='ocupado', turnos=None):
+        """Grava o status em todos os dias × turnos do período em um único INSERT ... ON CONFLICT"""
+        turnos = turnos or [turno for turno, _ in Disponibilidade.TURNO_CHOICES]
+        registros = [
+            Disponibilidade(trabalhador_id=getattr(trabalhador, 'pk', trabalhador), data=dia, turno=turno, status=status)
+            for dia in dias_do_periodo(inicio, fim)
+            for turno in turnos
+        ]
+        with transaction.atomic():
+            self.bulk_create(
+                registros,
+                update_conflicts=True,
+                unique_fields=['trabalhador', 'data', 'turno'],
+                update_fields=['status'],
+            )
+        return len(registros)
+
+    def liberar_periodo(self, trabalhador, inicio, fim=None, status='ocupado', exceto_datas=()):
+        """Remove os registros com o status no período (voltam a ser dias livres)
+
+        Um único DELETE, sem post_delete por linha (como o bulk_create de
+        marcar_periodo não dispara post_save): quem chama atualiza o feed do
+        trabalhador uma vez ao final.
+        """
+        registros = self.filter(
+            trabalhador=trabalhador, data__range=(inicio, fim or inicio), status=status
+        ).exclude(data__in=exceto_datas)
+        return registros._raw_delete(registros.db)
 
 
 class Disponibilidade(models.Model):
@@ -42,6 +82,8 @@ class Disponibilidade(models.Model):
         verbose_name='Motivo do Bloqueio'
     )
 
+    objects = DisponibilidadeManager()
+
     def __str__(self):
         return (
             f"{self.trabalhador.get_full_name()} — "